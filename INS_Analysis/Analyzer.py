@@ -1,91 +1,313 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+
+import numpy as np
+
 from .Spectrum import read
 from .areas import calcPeakAreas
+from .areas import fitGeb
+from .areas.configs import windowlabellist
+from .areas.fitCache import resolve_cache
+from .areas.warmStart import WarmStarts
 from .calibration import calibrate
 from .calibration import applyCalibrationAreas
+from .calibration import crossValidateCalibration
+from .calibration import IncrementalCalibration
+from .calibration import saveCalibration
+from .calibration import loadCalibration
+from .areas.calculatePeakAreas import window_weights
+from .areas.fitPlan import compile_config, compile_fit_plan
 from .process import apply
 from .process import applyFromFile
+from .spectrumStore import MappedSpectrumStore, SpectrumStore, SpectrumsView
+from .tools import instrument
+from .tools.cache import hash_key
+from .tools.parallel import chunked, default_chunksize, resolve_n_jobs
+from .tools.sharedArrays import SharedArrays
+
+# how spectra and results travel to and from worker processes
+transports = ('pickle', 'shared_memory')
+
+
+def _calcPeakAreaOrNone(bins, vals, returnFits=False, **kwargs):
+    # a failed fit is recorded on the spectrum rather than raised
+    # returns (areas, fits or None, final weights)
+    try:
+        res = calcPeakAreas(bins, vals, returnFits=returnFits, returnWeights=True, **kwargs)
+    except:
+        return None
+    if res is None:
+        return None
+    if returnFits:
+        return res
+    return res[0], None, res[1]
+
+
+def _warmCalcPeakArea(label, bins, vals, returnFits, kwargs, warmStarts=None):
+    # _calcPeakAreaOrNone started from warmStarts' pick, which it learns the result
+    if warmStarts is None:
+        return _calcPeakAreaOrNone(bins, vals, returnFits=returnFits, **kwargs)
+    res = _calcPeakAreaOrNone(
+        bins, vals, returnFits=returnFits,
+        startingWeights=warmStarts.starting_weights(label, vals), **kwargs)
+    if res is not None:
+        warmStarts.add(label, vals, res[2])
+    return res
+
+
+def _calcPeakAreaChunk(chunk, returnFits, kwargs, record=False, warmStarts=None):
+    # with record, the worker's instrument records go back with the results
+    # with warmStarts, the chunk's spectra are warm started one after another
+    if not record:
+        return [
+            (label, _warmCalcPeakArea(label, bins, vals, returnFits, kwargs, warmStarts))
+            for label, bins, vals in chunk
+        ], None
+    results = []
+    with instrument.record() as recorder:
+        for label, bins, vals in chunk:
+            with instrument.tags(spectrum=label):
+                results.append((label, _warmCalcPeakArea(label, bins, vals, returnFits, kwargs, warmStarts)))
+    return results, recorder.records
+
+
+def _fitSharedRows(shared, spec, start, labels, returnFits, kwargs, warmStarts=None):
+    # fits spectra start, start+1, ... of spec's shared arrays, writing the
+    # results into them, returns the fits (with returnFits) as (label, fits)
+    if spec['countsPath'] is None:
+        counts = shared['counts']
+    else:
+        counts = np.load(spec['countsPath'], mmap_mode='r')
+    offsets, grid = shared['offsets'], shared['grid']
+    areas, weights, failed = shared['areas'], shared['weights'], shared['failed']
+    windowOffsets = spec['offsets']
+    fits = []
+    for i, label in enumerate(labels, start):
+        bins = spec['grids'][grid[i]]
+        # a copy, warm starts keep the vals they learn from
+        vals = np.array(counts[offsets[i]:offsets[i] + len(bins)])
+        with instrument.tags(spectrum=label):
+            res = _warmCalcPeakArea(label, bins, vals, returnFits, kwargs, warmStarts)
+        if res is None:
+            failed[i] = True
+            continue
+        for j, window in enumerate(spec['windows']):
+            if window in res[0]:
+                areas[i, j] = res[0][window]
+                weights[i, windowOffsets[j]:windowOffsets[j+1]] = window_weights(res[2][window])
+        if returnFits:
+            fits.append((label, res[1]))
+    return fits
+
+
+def _sharedPeakAreaChunk(spec, start, labels, returnFits, kwargs, record=False, warmStarts=None):
+    # _calcPeakAreaChunk on shared arrays: only the fits (with returnFits)
+    # and instrument records go back, everything else is written in place
+    shared = SharedArrays.attach(spec['arrays'])
+    try:
+        if not record:
+            return _fitSharedRows(shared, spec, start, labels, returnFits, kwargs, warmStarts), None
+        with instrument.record() as recorder:
+            fits = _fitSharedRows(shared, spec, start, labels, returnFits, kwargs, warmStarts)
+        return fits, recorder.records
+    finally:
+        shared.close()
 
 
 class Analyzer():
-    def __init__(self):
+    def __init__(self, store=None):
+        """
+        store: SpectrumStore to keep the spectra in, a new one in memory by default
+        """
         self.calibration = None
-        self.spectrums = {}
+        self.incrementalCalibration = None
+        self.store = SpectrumStore() if store is None else store
+        self.spectrums = SpectrumsView(self.store)
+        self.recorder = None
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Analyzer on the spectra stored in directory (made if missing), memory
+        mapped rather than read in, results are written back in place and
+        kept from one session to the next by flush (see MappedSpectrumStore)
+        """
+        return cls(store=MappedSpectrumStore(directory))
+
+    def flush(self):
+        self.store.flush()
 
     def addSpectrum(self, spec, label, **kwargs):
         
         if isinstance(spec, str):
             spec = read(spec, **kwargs)
 
-        self.spectrums[label] = {
-            'bins': spec[0], 
-            'vals': spec[1],
-            'areas': {
-                'Si1': None,
-                'Si2C1': None,
-            },
-            'fits': {
-                'Si1': {
-                    'bins': None,
-                    'baseline': None,
-                    'peak': None,
-                },
-                'Si2C1': {
-                    'bins': None,
-                    'baseline': None,
-                    'peak': None,
-                },
-            },
-            'true_comp': {
-                'Si1': None,
-                'Si2C1': None,
-            },
-            'pred_comp': {
-                'Si1': None,
-                'Si2C1': None,
-            },
-            'for_calib': False,
-            'area_calc_failed': False,
-        }
+        self.store.add(label, spec[0], spec[1])
 
     def addSpectrums(self, specs, labels, **kwargs):
+        specs = list(specs)
+        self.store.reserve(len(self.store) + len(specs))
         for spec, label in zip(specs, labels):
             self.addSpectrum(spec, label, **kwargs)
 
-    def toDataFrame(self):
+    def toDataFrame(self, timings=False, spectra=False):
+        """
+        a row per spectrum, label then a float column per area and
+        concentration ({areas,true_comp,pred_comp}_{window}) and the flags,
+        all views of the store (NaN where not set)
+        timings: add the per stage seconds, nfev and convergence of each spectrum
+            from the last record() block
+        spectra: add bins, vals, fits and weights (object columns)
+        """
         import pandas as pd
-        df = pd.DataFrame(self.spectrums).T
-        return df.reset_index().rename(columns={'index':'label'})
+        df = pd.DataFrame(self.store.frame(), index=pd.Index(self.store.labels, name='label'), copy=False)
+        if spectra:
+            df = df.assign(
+                bins=[self.store.bins(row) for row in range(len(self.store))],
+                vals=[self.store.vals(row) for row in range(len(self.store))],
+                fits=[self.spectrums[label]['fits'] for label in self.store.labels],
+                weights=[self.spectrums[label]['weights'] for label in self.store.labels],
+            )
+        if timings and self.recorder is not None:
+            df = df.join(self.recorder.per_spectrum())
+        return df.reset_index()
+
+    @contextmanager
+    def record(self, hooks=()):
+        """
+        with analyzer.record() as recorder: records the stages of the analysis
+        run inside the block (see tools.instrument), recorder.summary() sums them up
+        """
+        with instrument.record(hooks) as recorder:
+            self.recorder = recorder
+            yield recorder
     
-    def calcPeakArea(self, label, returnFits=False, **kwargs):
-        self.spectrums[label]['area_calc_failed'] = False
-        bins = self.spectrums[label]['bins']
-        vals = self.spectrums[label]['vals']
-        try:
-            res = calcPeakAreas(bins, vals, returnFits=returnFits, **kwargs)
-        except:
-            self.spectrums[label]['area_calc_failed'] = True
+    def _storePeakAreaResult(self, label, res):
+        # res as _calcPeakAreaOrNone
+        store = self.store
+        row = store.index[label]
+        if res is None:
+            store.flags['area_calc_failed'][row] = True
+            return
+        store.flags['area_calc_failed'][row] = False
+        areas, fits, weights = res
+        for window, area in areas.items():
+            store.column('areas', window)[row] = area
+        store.weights.setdefault(row, {}).update(weights)
+        if fits is not None:
+            spectrum_fits = self.spectrums[label]['fits']
+            for window, fit in fits.items():
+                spectrum_fits[window] = {
+                    'bins': fit['bins'],
+                    'baseline': fit['baseline'],
+                    'peak': fit['peak'],
+                }
+
+    def _warmStarts(self, warmStart):
+        # the spectra fitted so far, to warm start others from
+        store = self.store
+        warmStarts = WarmStarts(warmStart)
+        failed = store.flag('area_calc_failed')
+        for row, weights in store.weights.items():
+            if weights and not failed[row]:
+                warmStarts.add(store.labels[row], store.vals(row), weights)
+        return warmStarts
+
+    def calcPeakArea(self, label, returnFits=False, warmStart=None, **kwargs):
+        """
+        warmStart: see calcPeakAreas, or a WarmStarts to pick from and add to
+        """
+        row = self.store.index[label]
+        bins = self.store.bins(row)
+        vals = self.store.vals(row)
+        if warmStart is not None and not isinstance(warmStart, WarmStarts):
+            warmStart = self._warmStarts(warmStart)
+        with instrument.tags(spectrum=label):
+            res = _warmCalcPeakArea(label, bins, vals, returnFits, kwargs, warmStart)
+            with instrument.stage('store'):
+                self._storePeakAreaResult(label, res)
+        if res is None:
             return None
-        areas = res
-        fits = None
-        if returnFits:
-            areas, fits = areas
-        self.spectrums[label]['areas']['Si1'] = areas['Si1']
-        self.spectrums[label]['areas']['Si2C1'] = areas['Si2C1']
         if returnFits:
-            self.spectrums[label]['fits']['Si1']['bins'] = fits['Si1']['bins']
-            self.spectrums[label]['fits']['Si1']['baseline'] = fits['Si1']['baseline']
-            self.spectrums[label]['fits']['Si1']['peak'] = fits['Si1']['peak']
-            self.spectrums[label]['fits']['Si2C1']['bins'] = fits['Si2C1']['bins']
-            self.spectrums[label]['fits']['Si2C1']['baseline'] = fits['Si2C1']['baseline']
-            self.spectrums[label]['fits']['Si2C1']['peak'] = fits['Si2C1']['peak']
-        return res
+            return res[0], res[1]
+        return res[0]
+
+    def calcPeakAreas(self, labels, returnFits=False, n_jobs=None, executor=None, chunksize=None, warmStart=None, transport='pickle', **kwargs):
+        """
+        n_jobs: worker processes to spread labels over, -1 for every core
+        executor: a concurrent.futures executor to use instead of a new process pool
+        chunksize: labels sent to a worker at a time
+        warmStart: start each fit from the final weights of a spectrum fitted
+            before it, 'previous' the one fitted last (labels are fit in
+            order, so give the time bins of a run one after another),
+            'nearest' the one closest in shape, or a function
+            (label, fitted labels) -> label; a warm start that does not
+            converge starts over from the usual starting weights
+        transport: 'pickle' sends each spectrum to the workers and its results
+            back, 'shared_memory' puts the counts (unless the store maps
+            them from a file already) and the results in shared memory, so
+            workers get row ranges and write areas, final weights and flags
+            in place, only fits (with returnFits) come back pickled
+
+        with n_jobs or executor set, peakFunctions and baselineFunction
+        must be picklable (named functions, not lambdas) and a compiled
+        plan only goes to thread executors, spectra whose fits
+        are all in the cache (see calcPeakAreas) are served here and only
+        the rest are sent to workers, which share the cache's disk tier;
+        each worker warm starts a chunk in order, its first spectrum from
+        the one picked among those fitted here
+        """
+        if transport not in transports:
+            raise ValueError(f'unknown transport {transport}, one of {transports}')
+        labels = list(labels)
+        n_jobs = resolve_n_jobs(n_jobs)
+        warmStarts = None if warmStart is None else self._warmStarts(warmStart)
+        if executor is None and n_jobs == 1:
+            for label in labels:
+                self.calcPeakArea(label, returnFits=returnFits, warmStart=warmStarts, **kwargs)
+        else:
+            # resolved here so workers get the same cache (or none) as this process
+            kwargs['cache'] = resolve_cache(kwargs.get('cache')) or False
+            missing = []
+            for label in labels:
+                res = None
+                if kwargs['cache']:
+                    with instrument.tags(spectrum=label):
+                        row = self.store.index[label]
+                        res = _calcPeakAreaOrNone(
+                            self.store.bins(row), self.store.vals(row),
+                            returnFits=returnFits, cachedOnly=True, **kwargs)
+                if res is None:
+                    missing.append(label)
+                else:
+                    self._storePeakAreaResult(label, res)
+                    if warmStarts is not None:
+                        warmStarts.add(label, self.store.vals(self.store.index[label]), res[2])
+            if chunksize is None:
+                chunksize = default_chunksize(len(missing), n_jobs)
+            labelChunks = chunked(missing, chunksize)
+            chunkWarmStarts = [None] * len(labelChunks)
+            if warmStarts is not None:
+                chunkWarmStarts = [
+                    warmStarts.subset([warmStarts.choose(chunk[0], self.store.vals(self.store.index[chunk[0]]))])
+                    for chunk in labelChunks
+                ]
+            own_executor = executor is None and len(labelChunks) > 0
+            if own_executor:
+                executor = ProcessPoolExecutor(max_workers=n_jobs)
+            try:
+                if labelChunks and transport == 'shared_memory':
+                    self._calcPeakAreasShared(executor, labelChunks, returnFits, kwargs, chunkWarmStarts)
+                elif labelChunks:
+                    self._calcPeakAreasPickled(executor, labelChunks, returnFits, kwargs, chunkWarmStarts)
+            finally:
+                if own_executor:
+                    executor.shutdown()
 
-    def calcPeakAreas(self, labels, returnFits=False, **kwargs):
-        for label in labels:
-            self.calcPeakArea(label, returnFits=returnFits, **kwargs)
         ret = {}
         for label in labels:
-            ret[label] = self.spectrums[label]['areas']
+            ret[label] = dict(self.spectrums[label]['areas'])
         if returnFits:
             ret_fits = {}
             for label in labels:
@@ -93,6 +315,164 @@ class Analyzer():
             return ret, ret_fits
         return ret
     
+    def _calcPeakAreasPickled(self, executor, labelChunks, returnFits, kwargs, chunkWarmStarts):
+        chunks = [
+            [(label, self.store.bins(row), self.store.vals(row)) for label, row in zip(chunk, self.store.rows(chunk))]
+            for chunk in labelChunks
+        ]
+        recorder = instrument.active_recorder()
+        results = executor.map(
+            _calcPeakAreaChunk, chunks, repeat(returnFits), repeat(kwargs),
+            repeat(recorder is not None), chunkWarmStarts)
+        for chunk_results, records in results:
+            if records is not None:
+                recorder.extend(records)
+            for label, res in chunk_results:
+                with instrument.tags(spectrum=label), instrument.stage('store'):
+                    self._storePeakAreaResult(label, res)
+
+    def _calcPeakAreasShared(self, executor, labelChunks, returnFits, kwargs, chunkWarmStarts):
+        store = self.store
+        labels = [label for chunk in labelChunks for label in chunk]
+        rows = store.rows(labels)
+        # the windows the workers fit, the caller's plan when given
+        plan = kwargs.get('plan')
+        if plan is None:
+            plan = compile_fit_plan(**{k: v for k, v in kwargs.items() if k not in ('cache', 'cachedOnly')})
+        elif isinstance(plan, dict):
+            plan = compile_config(plan)
+        windows = [window.label for window in plan.windows]
+        baselines = [window.baseline_n_weights for window in plan.windows]
+        offsets = np.cumsum([0] + [window.n_weights for window in plan.windows]).tolist()
+
+        lengths = np.array([len(store.bins(row)) for row in rows], dtype=np.int64)
+        layout = {
+            'offsets': ((len(rows),), np.int64, 0),
+            'grid': ((len(rows),), int, 0),
+            'areas': ((len(rows), len(windows)), float, np.nan),
+            'weights': ((len(rows), offsets[-1]), float, np.nan),
+            'failed': ((len(rows),), bool, False),
+        }
+        countsPath = None
+        if isinstance(store.counts, np.memmap):
+            # workers map the store's own file
+            store.counts.flush()
+            countsPath = store.counts.filename
+        else:
+            # the rows' counts one after another
+            layout['counts'] = ((int(lengths.sum()),), store.counts.dtype, 0)
+
+        with SharedArrays.create(layout) as shared:
+            if countsPath is None:
+                countOffsets = np.cumsum(lengths) - lengths
+                for row, offset, length in zip(rows, countOffsets, lengths):
+                    shared['counts'][offset:offset + length] = store.vals(row)
+                shared['offsets'][...] = countOffsets
+            else:
+                shared['offsets'][...] = store.offsets[rows]
+            shared['grid'][...] = store.grid[rows]
+            spec = {
+                'arrays': shared.spec,
+                'countsPath': countsPath,
+                'grids': store.grids,
+                'windows': windows,
+                'offsets': offsets,
+            }
+            starts = np.cumsum([0] + [len(chunk) for chunk in labelChunks[:-1]]).tolist()
+
+            recorder = instrument.active_recorder()
+            results = executor.map(
+                _sharedPeakAreaChunk, repeat(spec), starts, labelChunks, repeat(returnFits),
+                repeat(kwargs), repeat(recorder is not None), chunkWarmStarts)
+            fits = []
+            for chunk_fits, records in results:
+                if records is not None:
+                    recorder.extend(records)
+                fits.extend(chunk_fits)
+            with instrument.stage('store'):
+                self._storeSharedResults(shared, rows, windows, baselines, offsets)
+        for label, spectrum_fits in fits:
+            self.spectrums[label]['fits'].update(spectrum_fits)
+
+    def _storeSharedResults(self, shared, rows, windows, baselines, offsets):
+        # the results workers wrote into shared, copied into the store
+        store = self.store
+        failed = shared['failed']
+        store.flags['area_calc_failed'][rows] = failed
+        areas = shared['areas']
+        found = ~failed[:, None] & ~np.isnan(areas)
+        for j, window in enumerate(windows):
+            store.column('areas', window)[rows[found[:, j]]] = areas[found[:, j], j]
+        weights = shared['weights']
+        for i in np.flatnonzero(found.any(axis=1)):
+            spectrum_weights = store.weights.setdefault(int(rows[i]), {})
+            for j, window in enumerate(windows):
+                if found[i, j]:
+                    start, middle, stop = offsets[j], offsets[j] + baselines[j], offsets[j+1]
+                    spectrum_weights[window] = {
+                        'baseline': weights[i, start:middle].copy(),
+                        'peak': weights[i, middle:stop].copy(),
+                    }
+
+    def calcPeakAreasInChunks(self, labels=None, chunksize=1024, checkpoint='calcPeakAreas', **kwargs):
+        """
+        calcPeakAreas over labels (every spectrum by default) chunksize at a
+        time, the store flushed after each chunk with the chunks done recorded
+        under checkpoint, so calling it again with the same labels and
+        chunksize after a stopped run resumes after the last chunk done
+        (None starts over every time)
+        kwargs: as calcPeakAreas (n_jobs, warmStart, fit settings, ...), a
+            run with other fit settings or warm starts starts over
+        returns the number of spectra fit by this call
+        """
+        if labels is None:
+            labels = self.store.labels
+        labels = list(labels)
+        chunks = chunked(labels, chunksize)
+        plan = kwargs.get('plan')
+        if plan is None:
+            plan = compile_fit_plan(**kwargs)
+        key = hash_key(labels, chunksize, plan.fingerprint, kwargs.get('warmStart'))
+        done = 0
+        state = self.store.checkpoints.get(checkpoint) if checkpoint is not None else None
+        if state is not None and state['key'] == key:
+            done = state['done']
+
+        fitted = 0
+        for i in range(done, len(chunks)):
+            self.calcPeakAreas(chunks[i], **kwargs)
+            fitted += len(chunks[i])
+            if checkpoint is not None:
+                self.store.checkpoints[checkpoint] = {'key': key, 'done': i + 1, 'chunks': len(chunks)}
+            self.store.flush()
+        return fitted
+
+    def _calibrationData(self, labels, concentrations=None):
+        rows = self.store.rows(labels)
+        if concentrations is None:
+            concentrations = self.store.matrix('true_comp', windowlabellist, rows)
+        elif isinstance(concentrations[0], dict):
+            concentrations = [[c['Si1'], c['Si2C1']] for c in concentrations]
+        areas = self.store.matrix('areas', windowlabellist, rows)
+        return areas, concentrations
+
+    def _setTrueComp(self, labels, concentrations):
+        rows = self.store.rows(labels)
+        concentrations = np.asarray(concentrations, dtype=float)
+        for i, window in enumerate(windowlabellist):
+            self.store.column('true_comp', window)[rows] = concentrations[:, i]
+        return rows
+
+    def fitGeb(self, geb, labels=None, **kwargs):
+        """
+        detector resolution fit jointly to the spectra of labels (all by default),
+        see areas.fitGeb, pass it on as calcPeakAreas(labels, geb=..., fixWidths=True)
+        """
+        if labels is None:
+            labels = self.store.labels
+        spectra = [[self.store.bins(row), self.store.vals(row)] for row in self.store.rows(labels)]
+        return fitGeb(spectra, geb, **kwargs)
+
     def calibrate(
             self, 
             labels: list,
@@ -103,18 +483,9 @@ class Analyzer():
             Si2C1_p0=None,
             **kwargs):
         
-        for spectrum in self.spectrums.values():
-            spectrum['for_calib'] = False
+        self.store.flag('for_calib')[:] = False
         
-        if concentrations is None:
-            concentrations = []
-            for label in labels:
-                concentrations.append(self.spectrums[label]['true_comp'])
-        if isinstance(concentrations[0], dict):
-            concentrations = [[c['Si1'], c['Si2C1']] for c in concentrations]
-        
-        areas = [self.spectrums[label]['areas'] for label in labels]
-        areas = [[a['Si1'], a['Si2C1']] for a in areas]
+        areas, concentrations = self._calibrationData(labels, concentrations)
 
         res = calibrate(
             areas=areas, 
@@ -127,32 +498,91 @@ class Analyzer():
             )
         self.calibration = res
 
-        for label, concentration in zip(labels, concentrations):
-            self.spectrums[label]['true_comp']['Si1'] = concentration[0]
-            self.spectrums[label]['true_comp']['Si2C1'] = concentration[1]
-        for label in labels:
-            self.spectrums[label]['for_calib'] = True
+        rows = self._setTrueComp(labels, concentrations)
+        self.store.flag('for_calib')[rows] = True
         return res
     
+    def updateCalibration(
+            self,
+            labels: list,
+            concentrations=None,
+            Si1_method: str = 'original',
+            Si2C1_method: str = 'original',
+            forgetting: float = 1.0):
+        """
+        adds labels to the calibration without refitting the earlier ones (see
+        IncrementalCalibration), labels already in it are replaced
+        forgetting: below 1 weighs recent labels more, to follow drift
+        the other spectra keep their for_calib, a change of method or forgetting
+        starts a new calibration from labels
+        """
+        inc = self.incrementalCalibration
+        new = inc is None or inc.methods != {'Si1': Si1_method, 'Si2C1': Si2C1_method} or inc.forgetting != forgetting
+        if new:
+            inc = IncrementalCalibration(Si1_method=Si1_method, Si2C1_method=Si2C1_method, forgetting=forgetting)
+
+        areas, concentrations = self._calibrationData(labels, concentrations)
+        # nothing changes unless the calibration can be computed
+        with inc.atomic(labels):
+            inc.remove([label for label in labels if label in inc])
+            inc.add(areas, concentrations, keys=labels)
+            calibration = inc.calibration()
+        if new:
+            self.incrementalCalibration = inc
+            self.store.flag('for_calib')[:] = False
+        rows = self._setTrueComp(labels, concentrations)
+        self.store.flag('for_calib')[rows] = True
+        self.calibration = calibration
+        return self.calibration
+
+    def removeCalibrationLabels(self, labels: list):
+        """
+        takes labels out of the calibration built by updateCalibration
+        """
+        inc = self.incrementalCalibration
+        with inc.atomic(labels):
+            inc.remove(labels)
+            calibration = inc.calibration()
+        self.store.flag('for_calib')[self.store.rows(labels)] = False
+        self.calibration = calibration
+        return self.calibration
+
+    def crossValidate(self, labels: list, concentrations=None, **kwargs):
+        """
+        held out errors of the calibration methods on labels, see crossValidateCalibration
+        (k=None leaves one out), does not change self.calibration
+        """
+        areas, concentrations = self._calibrationData(labels, concentrations)
+        return crossValidateCalibration(areas=areas, true_concentrations=concentrations, **kwargs)
+
     def applyCalibrationAreas(self, labels=None, **kwargs):
+        store = self.store
         if labels is None:
-            labels = list(self.spectrums.keys())
-            labels = [label for label in labels if not self.spectrums[label]['area_calc_failed']] # removes failed area calculations
-        areas = []
-        for label in labels:
-            a = self.spectrums[label]['areas']
-            areas.append([a['Si1'], a['Si2C1']])
+            rows = np.flatnonzero(~store.flag('area_calc_failed')) # removes failed area calculations
+            labels = [store.labels[row] for row in rows]
+        else:
+            rows = store.rows(labels)
+        areas = store.matrix('areas', windowlabellist, rows)
         res = applyCalibrationAreas(areas=areas, calibration = self.calibration, **kwargs)
-        for _, label in enumerate(labels):
-            self.spectrums[label]['pred_comp']['Si1'] = res[0][_]
-            self.spectrums[label]['pred_comp']['Si2C1'] = res[1][_]
+        for i, window in enumerate(windowlabellist):
+            store.column('pred_comp', window)[rows] = res[i]
         ret = {}
         for label in labels:
-            ret[label] = self.spectrums[label]['pred_comp']
+            ret[label] = dict(self.spectrums[label]['pred_comp'])
         return ret
     
-    def apply(self, **kwargs):
-        return apply(calib_params = self.calibration, **kwargs)
+    def saveCalibration(self, path):
+        """
+        writes self.calibration to path as JSON (e.g. for ins-analysis run --calib)
+        """
+        saveCalibration(self.calibration, path)
+
+    def loadCalibration(self, path):
+        self.calibration = loadCalibration(path)
+        return self.calibration
+
+    def apply(self, bins, vals, **kwargs):
+        return apply(bins, vals, calibration = self.calibration, **kwargs)
     
-    def applyFromFile(self, **kwargs):
-        return applyFromFile(calib_params = self.calibration, **kwargs)
\ No newline at end of file
+    def applyFromFile(self, filename, **kwargs):
+        return applyFromFile(filename, calibration = self.calibration, **kwargs)
\ No newline at end of file
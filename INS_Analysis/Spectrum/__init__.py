@@ -1,11 +1,29 @@
 from .readMCA import readMCA
+from .readMCA import read_many
 from .readMCTAL import readMCTAL
+from .cache import SpectrumCache
+from .cache import enable_cache
+from .cache import disable_cache
+from . import cache as _cache_module
 
 filereader = {'mca': readMCA, 'mctal': readMCTAL}
 
-def read(filename, **kwargs):
+def read(filename, cache=None, **kwargs):
+    """
+    cache: SpectrumCache to go through, False to skip the cache,
+        None for the one set with enable_cache (if any)
+    """
     ext = filename.split('.')[-1]
-    if ext in filereader:
+    if ext not in filereader:
+        raise ValueError('File extension not recognized')
+    if cache is None:
+        cache = _cache_module.get_cache()
+    if not cache:
         return filereader[ext](filename, **kwargs)
-    else:
-        raise ValueError('File extension not recognized')
\ No newline at end of file
+
+    key = cache.key(filename, ext, kwargs)
+    spectrum = cache.get(key)
+    if spectrum is None:
+        spectrum = filereader[ext](filename, **kwargs)
+        cache.put(key, spectrum)
+    return spectrum
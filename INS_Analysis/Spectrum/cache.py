@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+
+from ..tools.cache import DiskCache, hash_key
+
+default_directory = os.path.join('~', '.cache', 'INS_Analysis', 'spectra')
+default_max_bytes = 2**30
+
+
+class SpectrumCache(DiskCache):
+    """
+    Parsed spectra stored as binary .npy files (the bins array followed by the vals array),
+    keyed by the file's path, size and modification time and the reader kwargs.
+    """
+    def __init__(self, directory=default_directory, max_bytes=default_max_bytes):
+        super().__init__(directory, max_bytes=max_bytes, suffix='.npy')
+
+    @staticmethod
+    def key(filename, reader, kwargs):
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        return hash_key(path, stat.st_size, stat.st_mtime_ns, reader, kwargs)
+
+    def get(self, key):
+        def loader(path):
+            with open(path, 'rb') as f:
+                return np.load(f, allow_pickle=False), np.load(f, allow_pickle=False)
+        return self.load(key, loader)
+
+    def put(self, key, spectrum):
+        def writer(f):
+            for array in spectrum:
+                np.save(f, np.asarray(array), allow_pickle=False)
+        self.store(key, writer)
+
+
+_cache = None
+
+
+def enable_cache(directory=default_directory, max_bytes=default_max_bytes):
+    """
+    caches every Spectrum.read from now on, returns the SpectrumCache
+    """
+    global _cache
+    _cache = SpectrumCache(directory, max_bytes=max_bytes)
+    return _cache
+
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+
+def get_cache():
+    return _cache
+
+
+# INS_ANALYSIS_SPECTRUM_CACHE=<directory> turns the cache on for a whole run
+if os.environ.get('INS_ANALYSIS_SPECTRUM_CACHE'):
+    enable_cache(os.environ['INS_ANALYSIS_SPECTRUM_CACHE'])
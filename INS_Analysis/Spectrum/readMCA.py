@@ -1,16 +1,158 @@
-def read_spectrum(file_path):
-    spectrum = []
-    with open(file_path, 'r') as file:    
-        for line in file:
-            spectrum.append(line.strip())
-    return spectrum
-
-def format_spectrum(spectrum):
-    return list(map(int, spectrum[spectrum.index("2048")+1:]))
-
-def readMCA(file_path):
-    spectrum = read_spectrum(file_path)
-    spectrum = format_spectrum(spectrum)
-    return spectrum
-
-    
\ No newline at end of file
+import glob
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# a line holding nothing but an integer, the channel count header is one of these
+_lone_int = re.compile(r'^[ \t]*(\d+)[ \t]*\r?$', re.M)
+_not_a_count = re.compile(r'[^\s\d]')
+# header lines tried as the channel count before giving up
+max_header_candidates = 64
+
+energy_units = {'ev': 1e-6, 'kev': 1e-3, 'mev': 1}
+
+
+def read_text(file_path):
+    with open(file_path, 'r') as file:
+        return file.read()
+
+
+def decode_counts(block):
+    """
+    int32 array of the whitespace separated counts in block, None if anything else is in it
+    """
+    # checked up front, numpy either warns or raises on a token that is not a number
+    if _not_a_count.search(block) is not None:
+        return None
+    return np.fromstring(block, dtype=np.int32, sep=' ')
+
+
+def pmca_calibration(header):
+    """
+    polynomial coefficients (increasing order, MeV) from a <<CALIBRATION>> section, or None
+    """
+    start = header.find('<<CALIBRATION>>')
+    if start < 0:
+        return None
+    section = header[start:].split('<<', 2)[1].splitlines()[1:]
+    unit = 1e-3
+    points = []
+    for line in section:
+        line = line.strip()
+        if line.upper().startswith('LABEL'):
+            unit = energy_units.get(line.split('-')[-1].strip().lower(), unit)
+            continue
+        parts = line.split()
+        if len(parts) == 2:
+            points.append((float(parts[0]), float(parts[1]) * unit))
+    if len(points) < 2:
+        return None
+    channels, energies = np.array(points).T
+    return np.polyfit(channels, energies, 1)[::-1]
+
+
+def parse_mca(text):
+    """
+    returns (counts, calibration) from the text of an MCA file
+
+    handles PMCA files (<<DATA>> ... <<END>>), files with a header ending in a line
+    holding the channel count followed by that many counts, and plain columns of counts
+    """
+    start = text.find('<<DATA>>')
+    if start >= 0:
+        end = text.find('<<END>>', start)
+        end = len(text) if end < 0 else end
+        counts = decode_counts(text[start+len('<<DATA>>'):end])
+        if counts is None:
+            raise ValueError('could not read the <<DATA>> section')
+        return counts, pmca_calibration(text[:start])
+
+    for i, match in enumerate(_lone_int.finditer(text)):
+        if i == max_header_candidates:
+            break
+        n_channels = int(match.group(1))
+        counts = decode_counts(text[match.end():])
+        if counts is not None and len(counts) == n_channels:
+            return counts, None
+
+    counts = decode_counts(text)
+    if counts is None:
+        raise ValueError('could not find the channel data')
+    return counts, None
+
+
+def energy_axis(n_channels, calibration=None):
+    """
+    calibration: polynomial coefficients in increasing order (offset, gain, ...)
+    channel numbers when None
+    """
+    channels = np.arange(n_channels, dtype=float)
+    if calibration is None:
+        return channels
+    return np.polynomial.polynomial.polyval(channels, calibration)
+
+
+def readMCA(file_path, calibration=None, **kwargs):
+    """
+    returns (bins, vals), vals an int32 array of counts per channel
+
+    calibration: polynomial coefficients (offset, gain, ...) from channel to energy,
+        defaults to the file's <<CALIBRATION>> section, then to channel numbers
+    """
+    counts, file_calibration = parse_mca(read_text(file_path))
+    if calibration is None:
+        calibration = file_calibration
+    return energy_axis(len(counts), calibration), counts
+
+
+def expand_paths(glob_or_paths, pattern='*.mca'):
+    """
+    glob_or_paths: a glob, a directory (searched for pattern), a file or a list of any of these
+    """
+    if isinstance(glob_or_paths, (str, os.PathLike)):
+        glob_or_paths = [glob_or_paths]
+    paths = []
+    for item in glob_or_paths:
+        item = os.fspath(item)
+        if os.path.isdir(item):
+            paths += sorted(glob.glob(os.path.join(item, pattern)))
+        elif glob.has_magic(item):
+            paths += sorted(glob.glob(item))
+        else:
+            paths.append(item)
+    return paths
+
+
+def read_many(glob_or_paths, workers=None, reader=readMCA, **kwargs):
+    """
+    Loads many spectra sharing one energy axis into a single array.
+
+    glob_or_paths: a glob, a directory, a file or a list of any of these
+    workers: threads reading files, defaults to the executor's default
+    reader: function returning (bins, vals) for a path
+    kwargs: passed on to reader
+
+    returns bins, counts and paths, counts of shape (len(paths), len(bins))
+    """
+    paths = expand_paths(glob_or_paths)
+    if not paths:
+        raise ValueError('no files found')
+
+    bins, first = reader(paths[0], **kwargs)
+    bins = np.asarray(bins)
+    first = np.asarray(first)
+    counts = np.empty((len(paths),) + first.shape, dtype=first.dtype)
+    counts[0] = first
+
+    def load(row):
+        row_bins, vals = reader(paths[row], **kwargs)
+        if np.shape(vals) != first.shape or not np.array_equal(row_bins, bins):
+            raise ValueError(f'{paths[row]} does not share the energy axis of {paths[0]}')
+        counts[row] = vals
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(load, range(1, len(paths))))
+
+    return bins, counts, paths
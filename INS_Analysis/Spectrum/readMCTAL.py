@@ -1,23 +1,174 @@
-try:
-    from mcnptools import Mctal, MctalTally
-except:
-    print("warning: mcnptools is not installed, some functions will not work.")
-    Mctal = None
-    MctalTally = None
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 
-def readMCTAL(file, tally=8, start_time_bin=0, end_time_bin=None, nps=1e9):
-    m = Mctal(file)
-    tfc = MctalTally.TFC
+import numpy as np
 
-    t8 = m.GetTally(tally)
+# bin dimensions of a tally in the order of the vals block, t varies fastest
+dimensions = ['f', 'd', 'u', 's', 'm', 'c', 'e', 't']
 
-    t8_e_bins = t8.GetEBins()
+# keyword lines start in the first column, data lines are indented
+_keyword = re.compile(r'^(tally|vals|tfc|[fdusmcet][tc]?)(?=[ \t]|\r?$)', re.M)
+
+
+@dataclass(frozen=True)
+class MctalTally:
+    """
+    One tally of a MCTAL file.
+    values and errors have one axis per bin dimension (f, d, u, s, m, c, e, t),
+    bins holds the listed bin boundaries of each dimension and tfc the
+    (0 based) bin of each dimension charted in the tally fluctuation chart.
+    """
+    number: int
+    values: np.ndarray
+    errors: np.ndarray
+    bins: dict
+    totals: dict
+    tfc: tuple
+
+    @property
+    def ebins(self):
+        return self.bins['e']
+
+    @property
+    def tbins(self):
+        return self.bins['t']
+
+    def time_energy(self, fixed=None):
+        """
+        (time, energy) array of values over the listed energy and time bins,
+        the other dimensions held at fixed (defaults to the tfc bins)
+        """
+        if fixed is None:
+            fixed = self.tfc[:6]
+        values = self.values[tuple(fixed)]
+        n_e = len(self.bins['e']) or values.shape[0]
+        n_t = len(self.bins['t']) or values.shape[1]
+        return values[:n_e, :n_t].T
+
+
+def _floats(block):
+    if not block.strip():
+        return np.empty(0)
+    return np.fromstring(block, dtype=float, sep=' ')
+
+
+def parse_tallies(text):
+    """
+    returns {tally number: MctalTally} from the text of a MCTAL file
+    """
+    matches = list(_keyword.finditer(text))
+    tallies = {}
+    current = None
+
+    def finish(tally):
+        shape = tuple(max(tally['counts'].get(d, 1), 1) for d in dimensions)
+        pairs = tally['vals'][:2 * int(np.prod(shape))].reshape(shape + (2,))
+        values = pairs[..., 0]
+        errors = pairs[..., 1]
+        bins = {d: tally['bins'].get(d, np.empty(0)) for d in dimensions}
+        # the parsed tallies are cached and shared between callers
+        for array in (values, errors, *bins.values()):
+            array.flags.writeable = False
+        tfc = tally['tfc'] or tuple(0 for _ in dimensions)
+        tallies[tally['number']] = MctalTally(
+            number=tally['number'],
+            values=values,
+            errors=errors,
+            bins=bins,
+            totals={d: tally['totals'].get(d, False) for d in dimensions},
+            tfc=tfc,
+        )
+
+    for i, match in enumerate(matches):
+        keyword = match.group(1)
+        end = matches[i+1].start() if i + 1 < len(matches) else len(text)
+        line_end = text.find('\n', match.end())
+        line_end = end if line_end < 0 or line_end > end else line_end
+        line = text[match.end():line_end].split()
+        body = text[line_end:end]
+
+        if keyword == 'tally':
+            if current is not None:
+                finish(current)
+            current = {'number': int(line[0]), 'counts': {}, 'bins': {}, 'totals': {}, 'vals': None, 'tfc': None}
+        elif current is None:
+            continue
+        elif keyword == 'vals':
+            current['vals'] = _floats(body)
+        elif keyword == 'tfc':
+            # tfc n jtf(f) ... jtf(t), 1 based
+            current['tfc'] = tuple(max(int(j) - 1, 0) for j in line[1:9])
+        else:
+            dimension = keyword[0]
+            current['counts'][dimension] = int(line[0])
+            current['totals'][dimension] = keyword[1:] == 't'
+            if dimension in ('c', 'e', 't'):
+                current['bins'][dimension] = _floats(' '.join(line[1:]) + body)
+            else:
+                current['bins'][dimension] = _floats(body)
+
+    if current is not None:
+        finish(current)
+    return tallies
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+cache_size = 16
+
+
+def parseMCTAL(file):
+    """
+    {tally number: MctalTally} of a MCTAL file, parsed once and kept in an
+    in-process cache keyed by path, size and modification time, so their
+    arrays are read only
+    """
+    path = os.path.abspath(file)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        tallies = _cache.get(key)
+        if tallies is not None:
+            _cache.move_to_end(key)
+            return tallies
+
+    with open(path, 'r') as f:
+        tallies = parse_tallies(f.read())
+
+    with _cache_lock:
+        for stale in [k for k in _cache if k[0] == path]:
+            del _cache[stale]
+        _cache[key] = tallies
+        while len(_cache) > cache_size:
+            _cache.popitem(last=False)
+    return tallies
+
+
+def clear_mctal_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def readMCTALTally(file, tally=8, nps=1e9):
+    """
+    returns energy bins, time bins and the (time, energy) array of a tally scaled by nps
+    """
+    t = parseMCTAL(file)[tally]
+    return t.ebins.copy(), t.tbins.copy(), t.time_energy() * nps
+
+
+def readMCTAL(file, tally=8, start_time_bin=0, end_time_bin=None, nps=1e9, **kwargs):
+    t8 = parseMCTAL(file)[tally]
+
+    t8_e_bins = t8.ebins.copy()
     if end_time_bin is None:
         end_time_bin = start_time_bin
-    #                        f    d    u    s    m    c   e   t
-    t8_evals = [[t8.GetValue(tfc, tfc, tfc, tfc, tfc, tfc, i, time) * nps for i in range(len(t8_e_bins))] for time in range(start_time_bin, end_time_bin+1)]
-    
+    t8_evals = t8.time_energy()[start_time_bin:end_time_bin+1] * nps
+
     if len(t8_evals) == 1:
         t8_evals = t8_evals[0]
 
-    return t8_e_bins, t8_evals
\ No newline at end of file
+    return t8_e_bins, t8_evals
@@ -2,7 +2,20 @@ from . import Spectrum
 from .Spectrum import read
 from .Analyzer import Analyzer
 from .areas import calcPeakAreas
+from .areas import calcPeakAreasBatch
+from .areas import fitGeb
 from .calibration import calibrate
 from .calibration import applyCalibrationAreas
+from .calibration import saveCalibration
+from .calibration import loadCalibration
+from .calibration import bootstrapCalibration
+from .calibration import crossValidateCalibration
+from .calibration import IncrementalCalibration
 from .process import apply
 from .process import applyFromFile
+
+from .timeSeries import iterTimeSpectra
+from .timeSeries import analyzeTimeSeries
+
+from .watcher import DirectoryWatcher
+from .watcher import watchDirectory
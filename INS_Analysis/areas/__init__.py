@@ -1 +1,8 @@
-from .calculatePeakAreas import calcPeakAreas
\ No newline at end of file
+from .calculatePeakAreas import calcPeakAreas
+from .batchPeakAreas import calcPeakAreasBatch
+from .gebFit import fitGeb
+from .fitPlan import FitPlan
+from .fitPlan import compile_fit_plan
+from .fitCache import FitResultCache
+from .fitCache import enable_fit_cache
+from .fitCache import disable_fit_cache
@@ -0,0 +1,594 @@
+import numpy as np
+from scipy.integrate import simpson
+
+from ..tools import fitting_functions as ff
+from ..tools import instrument
+from ..tools import window_maker as wm
+from .calculatePeakAreas import fit_window_data, resolve_bounds, separated_starting_weights
+from .fitPlan import compile_fit_plan, locate_windows
+
+_eps = np.finfo(float).eps
+# fewer spectra than this are fit one at a time: a batch iterates until its
+# slowest spectrum converges, which below about this many costs more than
+# fitting each on its own
+default_min_batch = 16
+
+
+def evaluate_batch(fn, x, weights):
+    """
+    fn: fitting function (or compound sum) taking (x, *weights)
+    x: 1d array of x values shared by the batch
+    weights: (n_spectra, n_weights) array
+    returns (n_spectra, len(x)) array
+    """
+    ret = fn(x[None, :], *weights.T[:, :, None])
+    return np.broadcast_to(ret, (weights.shape[0], x.shape[0]))
+
+
+def evaluate_jacobian_batch(jac, x, weights):
+    """
+    jac: analytic jacobian taking (x, *weights)
+    returns (n_spectra, len(x), n_weights) array
+    """
+    ret = jac(x[None, :], *weights.T[:, :, None])
+    return np.broadcast_to(ret, (weights.shape[0], x.shape[0], weights.shape[1]))
+
+
+def finite_difference_jacobian(fn, x, weights, lower, upper, f0=None):
+    """
+    forward difference jacobian for every spectrum of the batch in a single
+    evaluation of fn, with the steps of scipy's approx_derivative ('2-point',
+    turned back or shortened to stay within the bounds)
+    returns (n_spectra, len(x), n_weights) array
+    """
+    n_spectra, n_weights = weights.shape
+    if f0 is None:
+        f0 = evaluate_batch(fn, x, weights)
+    h = np.sqrt(_eps) * np.where(weights >= 0, 1., -1.) * np.maximum(1, np.abs(weights))
+    lower_dist = weights - lower
+    upper_dist = upper - weights
+    fitting = np.abs(h) <= np.maximum(lower_dist, upper_dist)
+    violated = (weights + h < lower) | (weights + h > upper)
+    h = np.where(violated & fitting, -h, h)
+    h = np.where(~fitting & (upper_dist >= lower_dist), upper_dist, h)
+    h = np.where(~fitting & (upper_dist < lower_dist), -lower_dist, h)
+    stepped = np.repeat(weights[None, :, :], n_weights, axis=0)
+    for j in range(n_weights):
+        stepped[j, :, j] += h[:, j]
+    dx = np.einsum('jbj->jb', stepped) - weights.T
+    f1 = evaluate_batch(fn, x, stepped.reshape(-1, n_weights))
+    f1 = f1.reshape(n_weights, n_spectra, -1)
+    return np.moveaxis((f1 - f0[None]) / dx[:, :, None], 0, -1)
+
+
+def make_strictly_feasible(p, lower, upper, rstep=1e-10):
+    """
+    moves weights sitting on (or outside) a bound slightly inside it,
+    rstep relative to the bound, the next float inside when 0
+    """
+    if rstep == 0:
+        on_lower = p <= lower
+        on_upper = p >= upper
+        p = np.where(on_lower, np.nextafter(lower, upper), p)
+        p = np.where(on_upper, np.nextafter(upper, lower), p)
+    else:
+        lower_dist = p - lower
+        upper_dist = upper - p
+        on_lower = np.isfinite(lower) & (lower_dist <= np.minimum(upper_dist, rstep * np.maximum(1, np.abs(lower))))
+        on_upper = np.isfinite(upper) & (upper_dist <= np.minimum(lower_dist, rstep * np.maximum(1, np.abs(upper))))
+        p = np.where(on_lower, lower + rstep * np.maximum(1, np.abs(lower)), p)
+        p = np.where(on_upper, upper - rstep * np.maximum(1, np.abs(upper)), p)
+    # bounds closer together than the nudge
+    return np.where((p < lower) | (p > upper), (lower + upper) / 2, p)
+
+
+# the trust region reflective method below follows scipy's least_squares
+# (method='trf', tr_solver='exact', x_scale=1) operation for operation, one
+# row per spectrum, so that a batch takes the steps curve_fit takes on each
+
+
+def _dot(a, b):
+    return np.einsum('bi,bi->b', a, b)
+
+
+def _matvec(A, v):
+    return np.einsum('bij,bj->bi', A, v)
+
+
+def _norm(a):
+    return np.sqrt(_dot(a, a))
+
+
+def scaling_vector(p, g, lower, upper):
+    """
+    Coleman-Li scaling: distance to the bound the gradient points away from
+    (1 when unbounded that way) and its derivative
+    """
+    to_upper = (g < 0) & np.isfinite(upper)
+    to_lower = (g > 0) & np.isfinite(lower)
+    v = np.where(to_lower, p - lower, np.where(to_upper, upper - p, 1.))
+    dv = np.where(to_lower, 1., np.where(to_upper, -1., 0.))
+    return v, dv
+
+
+def step_to_bound(p, step, lower, upper):
+    """
+    multiple of step reaching the first bound, and which bounds it hits
+    (-1 lower, 1 upper)
+    """
+    moving = step != 0
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        steps = np.where(moving, np.maximum((lower - p) / step, (upper - p) / step), np.inf)
+    stride = steps.min(axis=-1)
+    return stride, (steps == stride[:, None]) * np.sign(step)
+
+
+def to_trust_region(p, step, delta):
+    """
+    multiple of step from p (inside the region) to the trust region's edge
+    """
+    a = _dot(step, step)
+    b = _dot(p, step)
+    c = _dot(p, p) - delta**2
+    d = np.sqrt(b*b - a*c)
+    q = -(b + np.copysign(d, b))
+    return np.maximum(q / a, c / q)
+
+
+def quadratic(J, g, step, diag):
+    """
+    the model's cost change 0.5 step (J'J + diag) step + g step
+    """
+    Js = _matvec(J, step)
+    return 0.5 * (_dot(Js, Js) + _dot(step * diag, step)) + _dot(step, g)
+
+
+def quadratic_along(J, g, step, diag, start=None):
+    """
+    coefficients a, b (and c from start) of the model's cost a t**2 + b t + c
+    along start + t step
+    """
+    Js = _matvec(J, step)
+    a = 0.5 * (_dot(Js, Js) + _dot(step * diag, step))
+    b = _dot(g, step)
+    if start is None:
+        return a, b, 0.
+    Js0 = _matvec(J, start)
+    b = b + _dot(Js0, Js) + _dot(start * diag, step)
+    c = 0.5 * _dot(Js0, Js0) + _dot(g, start) + 0.5 * _dot(start * diag, start)
+    return a, b, c
+
+
+def minimize_quadratic(a, b, c, lo, hi):
+    """
+    t within [lo, hi] minimizing a t**2 + b t + c, and that minimum
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        extremum = -0.5 * b / a
+    t = np.stack([lo, hi, extremum])
+    with np.errstate(invalid='ignore', over='ignore'):
+        y = t * (a * t + b) + c
+    y[2] = np.where((a != 0) & (lo < extremum) & (extremum < hi), y[2], np.inf)
+    best = np.argmin(y, axis=0)
+    take = np.arange(len(a))
+    return t[best, take], y[best, take]
+
+
+def solve_trust_region(uf, s, V, delta, alpha, n_residuals, rtol=0.01, max_iter=10):
+    """
+    step of norm delta minimizing the linearized cost (More's method on the
+    singular values s and vectors V of the jacobian), or the Gauss-Newton step
+    when shorter, with the Levenberg-Marquardt parameter giving it
+    """
+    suf = s * uf
+    if n_residuals >= s.shape[1]:
+        full_rank = s[:, -1] > _eps * n_residuals * s[:, 0]
+    else:
+        full_rank = np.zeros(len(s), dtype=bool)
+
+    def phi_and_derivative(alpha):
+        denom = s**2 + alpha[:, None]
+        p_norm = _norm(suf / denom)
+        return p_norm - delta, -np.sum(suf**2 / denom**3, axis=-1) / p_norm
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gauss_newton = -_matvec(V, uf / s)
+        short = full_rank & (_norm(gauss_newton) <= delta)
+        alpha_upper = _norm(suf) / delta
+        phi, phi_prime = phi_and_derivative(np.zeros_like(delta))
+        alpha_lower = np.where(full_rank, -phi / phi_prime, 0.)
+        alpha = np.where(~full_rank & (alpha == 0), np.maximum(0.001 * alpha_upper, np.sqrt(alpha_lower * alpha_upper)), alpha)
+        done = short.copy()
+        for _ in range(max_iter):
+            if done.all():
+                break
+            outside = ~done & ((alpha < alpha_lower) | (alpha > alpha_upper))
+            alpha = np.where(outside, np.maximum(0.001 * alpha_upper, np.sqrt(alpha_lower * alpha_upper)), alpha)
+            phi, phi_prime = phi_and_derivative(alpha)
+            alpha_upper = np.where(~done & (phi < 0), alpha, alpha_upper)
+            ratio = phi / phi_prime
+            alpha_lower = np.where(done, alpha_lower, np.maximum(alpha_lower, alpha - ratio))
+            alpha = np.where(done, alpha, alpha - (phi + delta) * ratio / delta)
+            done |= np.abs(phi) < rtol * delta
+        step = -_matvec(V, suf / (s**2 + alpha[:, None]))
+        step *= (delta / _norm(step))[:, None]
+    return np.where(short[:, None], gauss_newton, step), np.where(short, 0., alpha)
+
+
+def select_step(p, J_h, diag_h, g_h, step, step_h, d, delta, lower, upper, theta):
+    """
+    the trust region step when it stays within the bounds, otherwise the best
+    (by the model) of that step cut short of the bound it crosses, its
+    reflection off that bound and the scaled gradient step
+    returns the step, the step in scaled variables and its predicted reduction
+    """
+    inside = np.all((p + step >= lower) & (p + step <= upper), axis=-1)
+    inside_value = quadratic(J_h, g_h, step_h, diag_h)
+    if inside.all():
+        return step, step_h, -inside_value
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        stride, hits = step_to_bound(p, step, lower, upper)
+        reflected_h = np.where(hits != 0, -step_h, step_h)
+        reflected = d * reflected_h
+        cut = step * stride[:, None]
+        cut_h = step_h * stride[:, None]
+
+        # along the reflection, to whichever comes first of the bounds and the trust region
+        to_region = to_trust_region(cut_h, reflected_h, delta)
+        to_bound, _ = step_to_bound(p + cut, reflected, lower, upper)
+        reflected_stride = np.minimum(to_bound, to_region)
+        positive = reflected_stride > 0
+        stride_lo = np.where(positive, (1 - theta) * stride / reflected_stride, 0.)
+        stride_hi = np.where(positive, np.where(reflected_stride == to_bound, theta * to_bound, to_region), -1.)
+        a, b, c = quadratic_along(J_h, g_h, reflected_h, diag_h, start=cut_h)
+        reflected_stride, reflected_value = minimize_quadratic(a, b, c, stride_lo, stride_hi)
+        reflected_h = reflected_h * reflected_stride[:, None] + cut_h
+        reflected = reflected_h * d
+        reflected_value = np.where(stride_lo <= stride_hi, reflected_value, np.inf)
+
+        # the cut step, strictly inside the bounds
+        cut = cut * theta[:, None]
+        cut_h = cut_h * theta[:, None]
+        cut_value = quadratic(J_h, g_h, cut_h, diag_h)
+
+        gradient_h = -g_h
+        gradient = d * gradient_h
+        to_region = delta / _norm(gradient_h)
+        to_bound, _ = step_to_bound(p, gradient, lower, upper)
+        gradient_stride = np.where(to_bound < to_region, theta * to_bound, to_region)
+        a, b, _ = quadratic_along(J_h, g_h, gradient_h, diag_h)
+        gradient_stride, gradient_value = minimize_quadratic(a, b, 0., np.zeros_like(a), gradient_stride)
+        gradient_h = gradient_h * gradient_stride[:, None]
+        gradient = gradient * gradient_stride[:, None]
+
+    use_cut = (cut_value < reflected_value) & (cut_value < gradient_value)
+    use_reflected = ~use_cut & (reflected_value < cut_value) & (reflected_value < gradient_value)
+
+    def pick(inside_choice, cut_choice, reflected_choice, gradient_choice):
+        expand = (lambda mask: mask[:, None]) if np.ndim(inside_choice) == 2 else (lambda mask: mask)
+        return np.where(expand(inside), inside_choice, np.where(
+            expand(use_cut), cut_choice, np.where(expand(use_reflected), reflected_choice, gradient_choice)))
+
+    return (
+        pick(step, cut, reflected, gradient),
+        pick(step_h, cut_h, reflected_h, gradient_h),
+        -pick(inside_value, cut_value, reflected_value, gradient_value),
+    )
+
+
+def batch_trust_region(
+        fn,
+        x,
+        y,
+        p0,
+        lower,
+        upper,
+        maxfev=50000,
+        ftol=1e-8,
+        xtol=1e-8,
+        gtol=1e-8,
+        jac=None,
+        ):
+    """
+    Bounded least squares solved for every row of y at once by the trust
+    region reflective method curve_fit runs on each spectrum. Each spectrum
+    keeps its own trust radius and Levenberg-Marquardt parameter, the bounds
+    are handled inside the iteration (Coleman-Li scaling, steps reflected off
+    the bounds they would cross) and spectra drop out of the active set as
+    they terminate.
+
+    fn: fitting function taking (x, *weights)
+    x: 1d array of x values shared by the batch
+    y: (n_spectra, len(x)) array of values to fit
+    p0, lower, upper: (n_spectra, n_weights) arrays
+    jac: analytic jacobian of fn, finite differences when None
+    returns weights, termination status (least_squares': 1 to 4 converged,
+    0 out of evaluations, -1 residuals not finite at the start) and
+    function evaluation counts
+    """
+    with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+        return _batch_trust_region(fn, x, y, p0, lower, upper, maxfev, ftol, xtol, gtol, jac)
+
+
+def _batch_trust_region(fn, x, y, p0, lower, upper, maxfev, ftol, xtol, gtol, jac):
+    n_spectra, n_weights = p0.shape
+    n_residuals = len(x)
+
+    def jacobian(rows):
+        if jac is None:
+            return finite_difference_jacobian(fn, x, p[rows], lower[rows], upper[rows], f0=f[rows] + y[rows])
+        return evaluate_jacobian_batch(jac, x, p[rows])
+
+    def subset(mask):
+        # a slice when every row is taken, so that assignments write in place
+        return slice(None) if mask.all() else np.flatnonzero(mask)
+
+    p = make_strictly_feasible(np.array(p0, dtype=float), lower, upper)
+    f = evaluate_batch(fn, x, p) - y
+    weights = p.copy()
+    status = np.where(np.all(np.isfinite(f), axis=-1), 0, -1)
+    nfev = np.ones(n_spectra, dtype=int)
+
+    # the iteration runs on the spectra still active, their rows in rows
+    rows = np.flatnonzero(status == 0)
+    p, f, y, lower, upper = p[rows], f[rows], y[rows], lower[rows], upper[rows]
+    n_active = len(rows)
+    cost = 0.5 * _dot(f, f)
+    J = np.array(jacobian(slice(None)))
+    g = np.einsum('bmn,bm->bn', J, f)
+    v, _ = scaling_vector(p, g, lower, upper)
+    delta = _norm(p / v**0.5)
+    delta[delta == 0] = 1.
+    alpha = np.zeros(n_active)
+    row_nfev = np.ones(n_active, dtype=int)
+
+    # per spectrum parts of the trust region problem, redone after every accepted step
+    d = np.zeros((n_active, n_weights))
+    diag_h = np.zeros((n_active, n_weights))
+    g_h = np.zeros((n_active, n_weights))
+    uf = np.zeros((n_active, n_weights))
+    s = np.zeros((n_active, n_weights))
+    V = np.zeros((n_active, n_weights, n_weights))
+    theta = np.zeros(n_active)
+    stale = np.ones(n_active, dtype=bool)
+    ending = np.zeros(n_active, dtype=int)
+
+    while len(rows):
+        if stale.any():
+            idx = subset(stale)
+            v, dv = scaling_vector(p[idx], g[idx], lower[idx], upper[idx])
+            g_norm = np.max(np.abs(g[idx] * v), axis=-1)
+            ending[idx] = np.where(g_norm < gtol, 1, ending[idx])
+            done = (ending != 0) | (row_nfev >= maxfev)
+            if done.any():
+                # finished spectra leave the arrays the iteration runs on
+                weights[rows[done]] = p[done]
+                status[rows[done]] = ending[done]
+                nfev[rows[done]] = row_nfev[done]
+                keep = ~done
+                kept = keep[idx]
+                rows, p, f, y, lower, upper, J, g, cost, delta, alpha, row_nfev = (
+                    a[keep] for a in (rows, p, f, y, lower, upper, J, g, cost, delta, alpha, row_nfev))
+                d, diag_h, g_h, uf, s, V, theta, stale, ending = (
+                    a[keep] for a in (d, diag_h, g_h, uf, s, V, theta, stale, ending))
+                v, dv, g_norm = v[kept], dv[kept], g_norm[kept]
+                idx = subset(stale)
+                if not len(rows):
+                    break
+
+            d[idx] = v**0.5
+            diag_h[idx] = g[idx] * dv
+            g_h[idx] = d[idx] * g[idx]
+            J_h = J[idx] * d[idx][:, None, :]
+            augmented = np.concatenate([J_h, diag_h[idx][:, :, None]**0.5 * np.eye(n_weights)], axis=1)
+            U, s[idx], Vt = np.linalg.svd(augmented, full_matrices=False)
+            V[idx] = Vt.transpose(0, 2, 1)
+            uf[idx] = np.einsum('bmn,bm->bn', U[:, :n_residuals], f[idx])
+            theta[idx] = np.maximum(0.995, 1 - g_norm)
+            stale[idx] = False
+
+        # one trial step for every active spectrum
+        J_h = J * d[:, None, :]
+        step_h, alpha = solve_trust_region(uf, s, V, delta, alpha, n_residuals)
+        step, step_h, predicted = select_step(p, J_h, diag_h, g_h, d * step_h, step_h, d, delta, lower, upper, theta)
+        p_new = make_strictly_feasible(p + step, lower, upper, rstep=0)
+        f_new = evaluate_batch(fn, x, p_new) - y
+        row_nfev += 1
+
+        step_h_norm = _norm(step_h)
+        finite = np.all(np.isfinite(f_new), axis=-1)
+        cost_new = 0.5 * _dot(f_new, f_new)
+        reduction = np.where(finite, cost - cost_new, -1.)
+        ratio = np.where(predicted > 0, reduction / predicted, np.where((predicted == 0) & (reduction == 0), 1., 0.))
+        delta_new = np.where(
+            ratio < 0.25, 0.25 * step_h_norm,
+            np.where((ratio > 0.75) & (step_h_norm > 0.95 * delta), 2 * delta, delta))
+        small_gain = (reduction < ftol * cost) & (ratio > 0.25)
+        small_step = _norm(step) < xtol * (xtol + _norm(p))
+        ending = np.where(finite, np.where(small_gain, np.where(small_step, 4, 2), np.where(small_step, 3, 0)), 0)
+
+        # residuals that overflowed shrink the region and try again
+        go_on = finite & (ending == 0)
+        alpha = np.where(go_on, alpha * delta / delta_new, alpha)
+        delta = np.where(go_on, delta_new, np.where(finite, delta, 0.25 * step_h_norm))
+
+        accepted = reduction > 0
+        if accepted.any():
+            took = subset(accepted)
+            p[took] = p_new[took]
+            f[took] = f_new[took]
+            cost[took] = cost_new[took]
+            J[took] = jacobian(took)
+            g[took] = np.einsum('bmn,bm->bn', J[took], f[took])
+        # a new point, an ending or the last evaluation spent closes the iteration
+        stale |= accepted | (ending != 0) | (row_nfev >= maxfev)
+
+    return weights, status, nfev
+
+
+def _bounds_matrix(bounds, targets, bins, vals, geb):
+    n_spectra = vals.shape[0]
+    cols = resolve_bounds(bounds, targets, bins, vals, geb)
+    cols = [np.broadcast_to(np.asarray(c, dtype=float), (n_spectra,)) for c in cols]
+    return np.column_stack(cols) if cols else np.empty((n_spectra, 0))
+
+
+def fit_window_batch(bins, vals, window_plan, geb, maxfev=50000, integration_points=1025):
+    """
+    Fits one peak window for a batch of spectra sharing the same bins.
+
+    bins: 1d array of the window bins
+    vals: (n_spectra, len(bins)) array of the window values
+    window_plan: WindowPlan of the window
+
+    returns areas, baseline and peak weights, termination status (see
+    batch_trust_region) and nfev
+    """
+    targets = window_plan.bound_targets
+    p0 = _bounds_matrix(window_plan.starting_weights, targets, bins, vals, geb)
+    lower = _bounds_matrix(window_plan.lower, targets, bins, vals, geb)
+    upper = _bounds_matrix(window_plan.upper, targets, bins, vals, geb)
+    held = np.array(window_plan.fixed or (False,) * window_plan.n_weights, dtype=bool)
+    p0 = separated_starting_weights(window_plan, p0, lower, upper)
+    p0 = np.where(held, p0, np.clip(p0, lower, upper))
+    fn = window_plan.sum_function
+    free = np.arange(window_plan.n_weights)
+    if any(window_plan.fixed):
+        # held weights start from targets and geb alone, the same for every spectrum
+        fn, _ = ff.fixed_weight_function(fn, p0[0], np.array(window_plan.fixed))
+        free = np.flatnonzero(~np.array(window_plan.fixed))
+    free_weights, status, nfev = batch_trust_region(
+        fn,
+        bins,
+        vals,
+        p0=p0[:, free],
+        lower=lower[:, free],
+        upper=upper[:, free],
+        maxfev=maxfev,
+        jac=ff.get_jacobian(fn),
+    )
+    final_weights = p0.copy()
+    final_weights[:, free] = free_weights
+
+    baseline_weights = final_weights[:, window_plan.baseline_slice]
+    peak_weights = final_weights[:, window_plan.peak_slice]
+
+    integral = ff.get_integral(window_plan.peak_function)
+    if integral is not None:
+        areas = integral(bins[0], bins[-1], *peak_weights.T)
+    else:
+        grid = np.linspace(bins[0], bins[-1], integration_points)
+        areas = simpson(evaluate_batch(window_plan.peak_function, grid, peak_weights), x=grid, axis=-1)
+
+    return areas, baseline_weights, peak_weights, status, nfev
+
+
+def fit_window_rows(bins, vals, window_plan, geb, plan):
+    """
+    fit_window_data on each row of a window batch, the batch's outputs with
+    status 1 for the fits that succeed and 0 for those that raise
+    """
+    n_spectra = len(vals)
+    areas = np.full(n_spectra, np.nan)
+    baseline_weights = np.full((n_spectra, window_plan.baseline_n_weights), np.nan)
+    peak_weights = np.full((n_spectra, window_plan.n_weights - window_plan.baseline_n_weights), np.nan)
+    status = np.zeros(n_spectra, dtype=int)
+    for i in range(n_spectra):
+        try:
+            areas[i], weights, _ = fit_window_data(bins, vals[i], window_plan, geb, plan.maxfev, plan.solver)
+        except (RuntimeError, ValueError, np.linalg.LinAlgError):
+            continue
+        baseline_weights[i] = weights['baseline']
+        peak_weights[i] = weights['peak']
+        status[i] = 1
+    return areas, baseline_weights, peak_weights, status, np.zeros(n_spectra, dtype=int)
+
+
+def calcPeakAreasBatch(
+        bins,
+        vals_matrix,
+        chunksize: int = 4096,
+        minBatch: int = default_min_batch,
+        returnInfo: bool = False,
+        plan=None,
+        **kwargs
+        ):
+    """
+    Vectorized counterpart of calcPeakAreas for many spectra sharing one bin grid.
+
+    Each window is fit for every spectrum at once by the method curve_fit
+    runs on each (see batch_trust_region), from the same starting weights,
+    so a spectrum gets the fit calcPeakAreas with solver='curve_fit' gives it
+    to rounding. Doublets whose peaks keep their shared start (widths without
+    an upper bound, no geb, see separated_starting_weights) begin on a saddle,
+    where rounding can still tip a spectrum into another minimum.
+
+    bins: 1d list or array of bins
+    vals_matrix: (n_spectra, len(bins)) list or array of values
+    chunksize: number of spectra solved together, bounds the jacobian memory
+    minBatch: fewer spectra are fit one at a time (see default_min_batch)
+    plan: FitPlan, skips compiling the settings in kwargs
+    kwargs: same fit settings as calcPeakAreas
+
+    returns areas, weights and failed
+        areas: {window: (n_spectra,) array}
+        weights: {window: {'baseline': (n_spectra, n) array, 'peak': (n_spectra, m) array}}
+        failed: (n_spectra,) bool array, True when any window did not converge
+    and info ({window: {'converged', 'status', 'nfev'}}, status as least_squares',
+    nfev 0 for spectra fit one at a time) when returnInfo is True
+    """
+    if plan is None:
+        plan = compile_fit_plan(**kwargs)
+    geb = plan.geb_dict
+
+    bins = np.asarray(bins, dtype=float)
+    vals_matrix = np.atleast_2d(np.asarray(vals_matrix, dtype=float))
+    n_spectra = vals_matrix.shape[0]
+
+    areas = {}
+    weights = {}
+    info = {}
+    failed = np.zeros(n_spectra, dtype=bool)
+    window_plans = plan.windows
+    if plan.peak_search is not None:
+        # spectra fit together share a gain, the windows are located once on their sum
+        with instrument.stage('peak_search'):
+            window_plans = locate_windows(bins, vals_matrix.sum(axis=0), plan)
+    windows = wm.cut_windows(bins, vals_matrix, tuple(window_plan.window for window_plan in window_plans))
+    for window_plan, (window_bins, window_vals) in zip(window_plans, windows):
+        label = window_plan.label
+
+        if n_spectra < minBatch:
+            window_areas, baseline_weights, peak_weights, status, nfev = fit_window_rows(
+                window_bins, window_vals, window_plan, geb, plan)
+        else:
+            with instrument.stage('batch_fit', window=label, n_spectra=n_spectra) as fit_stage:
+                chunks = []
+                for start in range(0, n_spectra, chunksize):
+                    chunks.append(fit_window_batch(
+                        window_bins,
+                        window_vals[start:start+chunksize],
+                        window_plan,
+                        geb,
+                        maxfev=plan.maxfev,
+                    ))
+                window_areas, baseline_weights, peak_weights, status, nfev = [
+                    np.concatenate(parts) for parts in zip(*chunks)]
+                fit_stage.set(nfev=int(nfev.sum()), converged=bool((status > 0).all()))
+
+        areas[label] = window_areas
+        weights[label] = {
+            'baseline': baseline_weights,
+            'peak': peak_weights,
+        }
+        info[label] = {
+            'converged': status > 0,
+            'status': status,
+            'nfev': nfev,
+        }
+        failed |= (status <= 0) | ~np.isfinite(window_areas)
+
+    if returnInfo:
+        return areas, weights, failed, info
+    return areas, weights, failed
@@ -1,78 +1,24 @@
 import numpy as np
 from scipy.optimize import curve_fit
-from scipy.integrate import quad
 
 from ..tools import fitting_functions as ff
+from ..tools import instrument
 from ..tools import window_maker as wm
-
-defaultPeakWindows = {
-    'Si1': [1.6, 2.2],
-    'Si2C1': [4.2, 4.8],
-}
-
-baselineFunctions = {
-    'point_slope': {
-        'fn': ff.point_slope,
-        'bounds': {
-            'lower': [-np.inf, -np.inf],
-            'upper': [np.inf, np.inf],
-            'starting_weights': [1, 1],
-            }
-        },
-    'point_slope_super': {
-        'fn': ff.point_slope_super,
-        'bounds': {
-            'lower': [-1e100, 0, 'lower bound x'],
-            'upper': [0, 'upper bound y', 'upper bound x'],
-            'starting_weights': [0, 'lower bound y', 'center x']
-            },
-        },
-    'exp_falloff': {
-        'fn': ff.exp_falloff,
-        'bounds': {
-            'lower': ['lower bound x', 0, 0, 'lower bound y'],
-            'upper': ['upper bound x', np.inf, np.inf, 'upper bound y'],
-            'starting_weights': ['center x', 'window height', .1, 'lower bound y']
-            }
-        },
-    'fat_tail': {
-        'fn': ff.fat_tail,
-        'bounds': {
-            'lower': [0, 0, 0, 0],
-            'upper': ['lower bound x', np.inf, 1, 'upper bound y'],
-            'starting_weights': [0, 'lower bound y', .1, 'lower bound y']
-            }
-        },
-}
-
-peakFunctions = {
-    'gaus': {
-        'fn': ff.gaus,
-        'bounds': {
-            'lower': ['lower bound x', 0, 0],
-            'upper': ['upper bound x', 'window height', 'upper bound sigma'],
-            'starting_weights': ['center x', 'window height', 'sigma']
-            }
-        }
-}
-
-default_peak_area_config = {
-    'Si1': {
-        'targets': [1.78],
-        'window': defaultPeakWindows['Si1'],
-        'peaks': [peakFunctions['gaus']],
-        'baseline': baselineFunctions['point_slope'],
-    },
-    'Si2C1': {
-        'targets': [4.44, 4.5],
-        'window': defaultPeakWindows['Si2C1'],
-        'peaks': [peakFunctions['gaus'], peakFunctions['gaus']],
-        'baseline': baselineFunctions['point_slope'],
-    },
-    'geb': None,
-}
+from .configs import (
+    baselineFunctions,
+    common_fns,
+    default_peak_area_config,
+    defaultPeakWindows,
+    peakFunctions,
+    windowlabellist,
+)
+from .fitCache import resolve_cache, window_key
+from .fitPlan import build_peak_area_config, compile_config, compile_fit_plan, FitPlan, locate_windows
+from .varpro import fit_varpro, separable
 
 geb_fn = ff.geb
+# a warm started fit needing more evaluations than this starts over from the heuristic starting weights
+warm_start_maxfev = 2000
 
 def lbx(bins, **kwargs):
     return min(bins)
@@ -81,22 +27,25 @@ def ubx(bins, **kwargs):
     return max(bins)
 
 def lby(vals, **kwargs):
-    return min(vals)
+    return np.min(vals, axis=-1)
 
 def uby(vals, **kwargs):
-    return max(vals)
+    return np.max(vals, axis=-1)
 
 def cx(bins, **kwargs):
     return (min(bins) + max(bins)) / 2
 
 def wh(vals, **kwargs):
-    return (max(vals) - min(vals))*1.1
+    return (np.max(vals, axis=-1) - np.min(vals, axis=-1))*1.1
 
 def sgm(target, geb, **kwargs):
     if geb is None:
         return 1
     return geb_fn(target, geb['a'], geb['b'], geb['c'])
 
+def tgt(target, **kwargs):
+    return target
+
 def ubsgm(target, geb, **kwargs):
     if geb is None:
         return np.inf
@@ -110,6 +59,7 @@ atbds = {
     'window height': wh,
     'sigma': sgm,
     'upper bound sigma': ubsgm,
+    'target': tgt,
 }
 
 
@@ -122,213 +72,309 @@ def autobound(bounds, bins, vals, target, geb):
             ret.append(ab)
     return ret
 
-###example config
-# {
-#   'element 1': {
-#           targets:[], # Where you think the peak is centered
-#           window:[], # minimum and maximum energy to regress calculate area
-#           peaks:[{peak_config_1}, {peak_config_2}],
-#           baseline:{baseline_config},
-#                   },
-#   'element 2': {},
-#   'geb': {'a': -0.0073, 'b': 0.078, 'c': 0},
-#   'maxfev': 50000,
-#   }
-
-def theActualPeakAreaCalculation(bins, vals, config, returnFits=False, **kwargs):
-    wave = np.array([bins, vals])
-    geb = config['geb']
-    # si1
-    si1_config = config['Si1']
-    si1_wave_bins, si1_wave_vals = wm.make_window(wave, si1_config['window'][0], si1_config['window'][1])
-    si1_peak_config = si1_config['peaks']
-    si1_baseline_config = si1_config['baseline']
-    
-    
-    targets = si1_config['targets']
-
-    si1_baseline_lower_bounds = autobound(bounds=si1_baseline_config['bounds']['lower'],bins=si1_wave_bins,vals=si1_wave_vals,target=targets[0],geb=geb)
-    si1_baseline_upper_bounds = autobound(bounds=si1_baseline_config['bounds']['upper'],bins=si1_wave_bins,vals=si1_wave_vals,target=targets[0],geb=geb)
-    si1_baseline_starting_weights = autobound(bounds=si1_baseline_config['bounds']['starting_weights'],bins=si1_wave_bins,vals=si1_wave_vals,target=targets[0],geb=geb)
-    si1_baseline_function = si1_baseline_config['fn']
-    si1_baseline_n_weights = len(si1_baseline_upper_bounds)
-
-
-    si1_peak_upper_bounds = []
-    si1_peak_lower_bounds = []
-    si1_peak_starting_weights = []
-    si1_peak_functions = []
-    si1_peak_n_weights = []
-
-    for _, peak in enumerate(si1_peak_config):
-        peak_lower_bounds = autobound(bounds=peak['bounds']['lower'],bins=si1_wave_bins,vals=si1_wave_vals,target=targets[_],geb=geb)
-        peak_upper_bounds = autobound(bounds=peak['bounds']['upper'],bins=si1_wave_bins,vals=si1_wave_vals,target=targets[_],geb=geb)
-        peak_starting_weights = autobound(bounds=peak['bounds']['starting_weights'],bins=si1_wave_bins,vals=si1_wave_vals,target=targets[_],geb=geb)
-        peak_function = peak['fn']
-        peak_n_weights = len(peak_upper_bounds)
-
-        si1_peak_upper_bounds += peak_upper_bounds
-        si1_peak_lower_bounds += peak_lower_bounds
-        si1_peak_starting_weights += peak_starting_weights
-        si1_peak_functions.append(peak_function)
-        si1_peak_n_weights.append(peak_n_weights)
-
-    
-    si1_peak_function = ff.generate_compound_sum(si1_peak_functions, si1_peak_n_weights)
-    si1_peak_n_weights = sum(si1_peak_n_weights)
-
-    si1_sum_function = ff.generate_compound_sum([si1_baseline_function, si1_peak_function], [si1_baseline_n_weights, si1_peak_n_weights])
-    si1_sum_lower_bounds = si1_baseline_lower_bounds + si1_peak_lower_bounds
-    si1_sum_upper_bounds = si1_baseline_upper_bounds + si1_peak_upper_bounds
-    si_starting_weights = si1_baseline_starting_weights + si1_peak_starting_weights
-    
-    maxfev = 50000
-    if 'maxfev' in config:
-        maxfev = config['maxfev']
-    
-    si1_final_weights, si1_covs = curve_fit(
-        si1_sum_function,
-        si1_wave_bins,
-        si1_wave_vals,
-        p0=si_starting_weights,
-        maxfev=maxfev,
-        bounds=(
-            si1_sum_lower_bounds,
-            si1_sum_upper_bounds
-            )
-    )
-
-    si1_baseline_final_weights = si1_final_weights[:si1_baseline_n_weights]
-    si1_peak_final_weights = si1_final_weights[si1_baseline_n_weights:si1_baseline_n_weights+si1_peak_n_weights]
-
-    si1_peak_area = quad(
-        si1_peak_function,
-        si1_wave_bins[0],
-        si1_wave_bins[-1],
-        args=tuple(si1_peak_final_weights.tolist())
-    )[0]
-
-    # si2C1
-
-    si2C1_config = config['Si2C1']
-    si2C1_wave_bins, si2C1_wave_vals = wm.make_window(wave, si2C1_config['window'][0], si2C1_config['window'][1])
-    si2C1_peak_config = si2C1_config['peaks']
-    si2C1_baseline_config = si2C1_config['baseline']
-    targets = si2C1_config['targets']
-
-    si2C1_baseline_lower_bounds = autobound(bounds=si2C1_baseline_config['bounds']['lower'],bins=si2C1_wave_bins,vals=si2C1_wave_vals,target=targets[0],geb=geb)
-    si2C1_baseline_upper_bounds = autobound(bounds=si2C1_baseline_config['bounds']['upper'],bins=si2C1_wave_bins,vals=si2C1_wave_vals,target=targets[0],geb=geb)
-    si2C1_baseline_starting_weights = autobound(bounds=si2C1_baseline_config['bounds']['starting_weights'],bins=si2C1_wave_bins,vals=si2C1_wave_vals,target=targets[0],geb=geb)
-    si2C1_baseline_function = si2C1_baseline_config['fn']
-    si2C1_baseline_n_weights = len(si2C1_baseline_upper_bounds)
-
-    si2C1_peak_upper_bounds = []
-    si2C1_peak_lower_bounds = []
-    si2C1_peak_starting_weights = []
-    si2C1_peak_functions = []
-    si2C1_peak_n_weights = []
-
-    for _, peak in enumerate(si2C1_peak_config):
-
-        peak_lower_bounds = autobound(bounds=peak['bounds']['lower'],bins=si2C1_wave_bins,vals=si2C1_wave_vals,target=targets[_],geb=geb)
-        peak_upper_bounds = autobound(bounds=peak['bounds']['upper'],bins=si2C1_wave_bins,vals=si2C1_wave_vals,target=targets[_],geb=geb)
-        peak_starting_weights = autobound(bounds=peak['bounds']['starting_weights'],bins=si2C1_wave_bins,vals=si2C1_wave_vals,target=targets[_],geb=geb)
-        peak_function = peak['fn']
-        peak_n_weights = len(peak_upper_bounds)
-
-        si2C1_peak_upper_bounds += peak_upper_bounds
-        si2C1_peak_lower_bounds += peak_lower_bounds
-        si2C1_peak_starting_weights += peak_starting_weights
-        si2C1_peak_functions.append(peak_function)
-        si2C1_peak_n_weights.append(peak_n_weights)
-
-    si2C1_peak_function = ff.generate_compound_sum(si2C1_peak_functions, si2C1_peak_n_weights)
-    si2C1_peak_n_weights = sum(si2C1_peak_n_weights)
-
-    si2C1_sum_function = ff.generate_compound_sum([si2C1_baseline_function, si2C1_peak_function], [si2C1_baseline_n_weights, si2C1_peak_n_weights])
-    si2C1_sum_lower_bounds = si2C1_baseline_lower_bounds + si2C1_peak_lower_bounds
-    si2C1_sum_upper_bounds = si2C1_baseline_upper_bounds + si2C1_peak_upper_bounds
-    si2C1_starting_weights = si2C1_baseline_starting_weights + si2C1_peak_starting_weights
-
-    si2C1_final_weights, si2C1_covs = curve_fit(
-        si2C1_sum_function,
-        si2C1_wave_bins,
-        si2C1_wave_vals,
-        p0=si2C1_starting_weights,
-        maxfev=maxfev,
-        bounds=(
-            si2C1_sum_lower_bounds,
-            si2C1_sum_upper_bounds
-            )
-    )
-
-    si2C1_baseline_final_weights = si2C1_final_weights[:si2C1_baseline_n_weights]
-    si2C1_peak_final_weights = si2C1_final_weights[si2C1_baseline_n_weights:si2C1_baseline_n_weights+si2C1_peak_n_weights]
+def peak_areas(peak_functions, peak_n_weights, peak_weights, lo, hi):
+    """
+    area of every peak in a window, each peak integrated on its own
+    (closed form when registered, quad otherwise)
+    """
+    areas = []
+    for (start, stop), fn in zip(ff.weight_slices(peak_n_weights), peak_functions):
+        areas.append(float(ff.integrate(fn, lo, hi, peak_weights[start:stop])))
+    return areas
 
-    si2C1_peak_areas = []
-    for i in range(len(targets)):
-        si2C1_peak_areas.append(quad(
-            si2C1_peak_function,
-            si2C1_wave_bins[0],
-            si2C1_wave_bins[-1],
-            args=tuple(si2C1_peak_final_weights.tolist())
-        )[0])
-    
-    si2C1_peak_area = sum(si2C1_peak_areas)
+def resolve_bounds(bounds, targets, bins, vals, geb):
+    """
+    autobound with a target per weight, as flattened in a WindowPlan
+    """
+    ret = []
+    for ab, target in zip(bounds, targets):
+        if isinstance(ab, str):
+            ret.append(atbds[ab](bins=bins, vals=vals, target=target, geb=geb))
+        else:
+            ret.append(ab)
+    return ret
 
+def fit_window(wave, window_plan, geb, maxfev, solver='auto'):
+    """
+    fits one window of wave ([bins, vals]) as laid out by window_plan
+    returns the window area, the final weights and the fitted curves
+    """
+    wave_bins, wave_vals = wm.make_window(wave, window_plan.window[0], window_plan.window[1])
+    return fit_window_data(wave_bins, wave_vals, window_plan, geb, maxfev, solver=solver)
+
+def varpro_starting_weights(window_plan, free, starting_weights, lower_bounds, upper_bounds):
+    """
+    peak weights starting at 'center x' start at their peak's target instead:
+    projected on the amplitudes, a peak started away from its line gets no
+    amplitude and no gradient to move it, and peaks sharing a start make the
+    amplitude basis singular
+    """
+    starting_weights = np.array(starting_weights, dtype=float)
+    for i, weight in enumerate(free):
+        if weight >= window_plan.baseline_n_weights and window_plan.starting_weights[weight] == 'center x':
+            starting_weights[i] = np.clip(window_plan.bound_targets[weight], lower_bounds[i], upper_bounds[i])
+    return starting_weights
+
+def separated_starting_weights(window_plan, starting_weights, lower_bounds, upper_bounds):
+    """
+    peak weights starting at 'center x' start at their peak's target instead,
+    where every peak weight is bounded: peaks sharing a start sit on a saddle
+    of the cost where rounding alone decides which peak takes which line.
+    A peak free to widen without bound started on its own line spreads over
+    the baseline, those keep the shared start (and fit the window as one).
+    starting_weights, lower_bounds, upper_bounds: every weight of the window, or rows of them
+    """
+    starting_weights = np.array(starting_weights, dtype=float)
+    peak = slice(window_plan.baseline_n_weights, None)
+    bounded = np.all(np.isfinite(lower_bounds[..., peak]) & np.isfinite(upper_bounds[..., peak]), axis=-1)
+    for i, start in enumerate(window_plan.starting_weights):
+        if i >= window_plan.baseline_n_weights and isinstance(start, str) and start == 'center x':
+            target = np.clip(window_plan.bound_targets[i], lower_bounds[..., i], upper_bounds[..., i])
+            starting_weights[..., i] = np.where(bounded, target, starting_weights[..., i])
+    return starting_weights
+
+def varpro_window(wave_bins, wave_vals, window_plan, fn, free, starting_weights, lower_bounds, upper_bounds, maxfev, target_starts=True):
+    """
+    fit_varpro of fn, the window's sum function of the weights free, None
+    unless it converged with some peak's linear weights (amplitudes) off their bounds
+    target_starts: start at the targets as varpro_starting_weights (off for warm starts)
+    """
+    if target_starts:
+        starting_weights = varpro_starting_weights(window_plan, free, starting_weights, lower_bounds, upper_bounds)
+    peak_linear = np.zeros(len(free), dtype=bool)
+    peak_linear[list(ff.get_linear_weights(fn))] = True
+    peak_linear &= free >= window_plan.baseline_n_weights
+    with instrument.stage('varpro') as fit_stage:
+        try:
+            weights, res = fit_varpro(fn, wave_bins, wave_vals, starting_weights, lower_bounds, upper_bounds, maxfev)
+        except (np.linalg.LinAlgError, ValueError):
+            fit_stage.set(converged=False)
+            return None
+        converged = res is None or res.status > 0
+        # a peak held at a bound has no say in where it sits, with every peak
+        # held nothing was fit (started off the lines), curve_fit decides those
+        held = np.all((weights[peak_linear] <= lower_bounds[peak_linear]) | (weights[peak_linear] >= upper_bounds[peak_linear]))
+        if res is not None:
+            fit_stage.set(nfev=int(res.nfev), status=int(res.status))
+        fit_stage.set(converged=converged and not held)
+    if converged and not held:
+        return weights
+    return None
+
+def curve_fit_window(wave_bins, wave_vals, fn, starting_weights, lower_bounds, upper_bounds, maxfev):
+    full_output = instrument.enabled()
+    with instrument.stage('curve_fit') as fit_stage:
+        res = curve_fit(
+            fn,
+            wave_bins,
+            wave_vals,
+            p0=starting_weights,
+            jac=ff.get_jacobian(fn),
+            maxfev=maxfev,
+            bounds=(
+                lower_bounds,
+                upper_bounds
+                ),
+            full_output=full_output,
+        )
+        if full_output:
+            fit_stage.set(nfev=int(res[2]['nfev']), status=int(res[4]), converged=res[4] in (1, 2, 3, 4))
+    return res[0]
+
+def window_problem(wave_bins, wave_vals, window_plan, geb):
+    """
+    what is fit in a window: the sum function of its free weights (the
+    window's fixed weights held, see fixed_weight_function), the indices of
+    those weights and their starting weights and bounds, with the starting
+    weights of every weight
+    """
+    targets = window_plan.bound_targets
+    with instrument.stage('autobound'):
+        lower_bounds = np.asarray(resolve_bounds(window_plan.lower, targets, wave_bins, wave_vals, geb), dtype=float)
+        upper_bounds = np.asarray(resolve_bounds(window_plan.upper, targets, wave_bins, wave_vals, geb), dtype=float)
+        starting_weights = np.asarray(resolve_bounds(window_plan.starting_weights, targets, wave_bins, wave_vals, geb), dtype=float)
+        starting_weights = separated_starting_weights(window_plan, starting_weights, lower_bounds, upper_bounds)
+        # starts taken from the data (see locate_window) may land outside the bounds
+        held = np.array(window_plan.fixed or (False,) * window_plan.n_weights, dtype=bool)
+        starting_weights = np.where(held, starting_weights, np.clip(starting_weights, lower_bounds, upper_bounds))
+
+    if not any(window_plan.fixed):
+        free = np.arange(window_plan.n_weights)
+        return window_plan.sum_function, free, starting_weights, lower_bounds, upper_bounds, starting_weights
+    fn, free_starting_weights = ff.fixed_weight_function(window_plan.sum_function, starting_weights, np.array(window_plan.fixed))
+    free = np.flatnonzero(~np.array(window_plan.fixed))
+    return fn, free, free_starting_weights, lower_bounds[free], upper_bounds[free], starting_weights
+
+def solve_window(wave_bins, wave_vals, window_plan, fn, free, starting_weights, lower_bounds, upper_bounds, maxfev, solver='auto', warm=False):
+    """
+    the final free weights of a window_problem
+    solver: 'curve_fit' alone, 'varpro' variable projection when fn allows it
+        (see varpro_window) and curve_fit when not or when it fails, 'auto'
+        variable projection only when fn is linear in every free weight (it
+        is then exact, in one solve), curve_fit otherwise: on doublets
+        variable projection settles in worse local minima
+    warm: starting_weights are a previous fit's, kept as they are
+    """
+    free_weights = None
+    if separable(fn) and (solver == 'varpro' or (solver == 'auto' and len(ff.get_linear_weights(fn)) == len(free))):
+        free_weights = varpro_window(
+            wave_bins, wave_vals, window_plan, fn, free,
+            starting_weights, lower_bounds, upper_bounds, maxfev, target_starts=not warm)
+    if free_weights is None:
+        return curve_fit_window(
+            wave_bins, wave_vals, fn, starting_weights, lower_bounds, upper_bounds, maxfev)
+    return free_weights
+
+def warm_solve_window(wave_bins, wave_vals, window_plan, fn, free, warm_weights, lower_bounds, upper_bounds, maxfev, solver='auto'):
+    """
+    solve_window started at warm_weights (every weight of the window, as
+    another spectrum's fit left them) clipped into this window's bounds,
+    None when that fit fails within warm_start_maxfev
+    """
+    warm_weights = np.asarray(warm_weights, dtype=float)
+    if warm_weights.shape != (window_plan.n_weights,):
+        return None
+    starting_weights = np.clip(warm_weights[free], lower_bounds, upper_bounds)
+    if maxfev is None:
+        maxfev = warm_start_maxfev
+    with instrument.stage('warm_start') as warm_stage:
+        try:
+            free_weights = solve_window(
+                wave_bins, wave_vals, window_plan, fn, free,
+                starting_weights, lower_bounds, upper_bounds, min(maxfev, warm_start_maxfev), solver, warm=True)
+        except (RuntimeError, ValueError, np.linalg.LinAlgError):
+            free_weights = None
+        warm_stage.set(converged=free_weights is not None)
+    return free_weights
+
+def fit_window_data(wave_bins, wave_vals, window_plan, geb, maxfev, solver='auto', warm_weights=None):
+    """
+    fit_window on data already cut to the window
+    solver: 'auto', 'varpro' or 'curve_fit', see solve_window
+    warm_weights: every weight of the window to start from (see warm_solve_window),
+        the heuristic starting weights are used if that fit fails
+    """
+    fn, free, starting_weights, lower_bounds, upper_bounds, all_starting_weights = window_problem(
+        wave_bins, wave_vals, window_plan, geb)
+
+    free_weights = None
+    if warm_weights is not None:
+        free_weights = warm_solve_window(
+            wave_bins, wave_vals, window_plan, fn, free,
+            warm_weights, lower_bounds, upper_bounds, maxfev, solver)
+    if free_weights is None:
+        free_weights = solve_window(
+            wave_bins, wave_vals, window_plan, fn, free,
+            starting_weights, lower_bounds, upper_bounds, maxfev, solver)
+    final_weights = all_starting_weights.copy()
+    final_weights[free] = free_weights
+
+    baseline_final_weights = final_weights[window_plan.baseline_slice]
+    peak_final_weights = final_weights[window_plan.peak_slice]
+
+    with instrument.stage('integrate'):
+        area = sum(peak_areas(
+            window_plan.peak_fns,
+            window_plan.peak_n_weights,
+            peak_final_weights,
+            wave_bins[0],
+            wave_bins[-1],
+        ))
 
     weights = {
-        'Si1': {
-            'baseline': si1_baseline_final_weights,
-            'peak': si1_peak_final_weights,
-        },
-        'Si2C1': {
-            'baseline': si2C1_baseline_final_weights,
-            'peak': si2C1_peak_final_weights,
-        }
+        'baseline': baseline_final_weights,
+        'peak': peak_final_weights,
     }
-
-    fits = {
-        'Si1': {
-            'bins': si1_wave_bins,
-            'baseline': si1_baseline_function(np.array(si1_wave_bins), *si1_baseline_final_weights).tolist(),
-            'peak': si1_sum_function(np.array(si1_wave_bins), *si1_final_weights).tolist(),
-        }, 
-        'Si2C1': {
-            'bins': si2C1_wave_bins,
-            'baseline': si2C1_baseline_function(np.array(si2C1_wave_bins), *si2C1_baseline_final_weights).tolist(),
-            'peak': si2C1_sum_function(np.array(si2C1_wave_bins), *si2C1_final_weights).tolist(),
-        }
-        }
-    
-    areas = {
-        'Si1': si1_peak_area,
-        'Si2C1': si2C1_peak_area,
+    fit = {
+        'bins': wave_bins,
+        'baseline': window_plan.baseline_fn(np.array(wave_bins), *baseline_final_weights).tolist(),
+        'peak': window_plan.sum_function(np.array(wave_bins), *final_weights).tolist(),
     }
-
+    return area, weights, fit
+
+def cached_fit_window(wave_bins, wave_vals, window_plan, plan, cache, cachedOnly=False, warm_weights=None):
+    """
+    fit_window_data through a FitResultCache, None on a miss when cachedOnly
+    (warm starts do not key the cache, a hit is a hit however it was started)
+    """
+    with instrument.stage('cache') as cache_stage:
+        key = window_key(window_plan, plan.geb, plan.maxfev, wave_bins, wave_vals, plan.solver)
+        res = cache.get(key)
+        cache_stage.set(hit=res is not None)
+    if res is None and not cachedOnly:
+        res = fit_window_data(wave_bins, wave_vals, window_plan, plan.geb_dict, plan.maxfev, plan.solver, warm_weights)
+        cache.put(key, res)
+    return res
+
+def window_weights(weights):
+    """
+    every weight of a window in one array, from fit_window_data's {'baseline', 'peak'} or as is
+    """
+    if isinstance(weights, dict):
+        return np.concatenate([np.ravel(weights['baseline']), np.ravel(weights['peak'])])
+    return weights
+
+def theActualPeakAreaCalculation(bins, vals, plan, returnFits=False, cache=None, cachedOnly=False, startingWeights=None, returnWeights=False, **kwargs):
+    """
+    plan: FitPlan (or a config dict, compiled on the fly)
+    cache: FitResultCache, False for none, None for the one set with enable_fit_cache
+    cachedOnly: return None rather than fit a window missing from the cache
+    startingWeights: {window label: final weights of an earlier fit} to warm start
+        those windows from (see fit_window_data), as returned with returnWeights
+    returnWeights: also return the final weights, {window label: {'baseline', 'peak'}}
+    """
+    if isinstance(plan, dict):
+        plan = compile_config(plan)
+    cache = resolve_cache(cache)
+    if cache is None and cachedOnly:
+        return None
+    bins = np.asarray(bins, dtype=float)
+    vals = np.asarray(vals, dtype=float)
+    geb = plan.geb_dict
+
+    if startingWeights is None:
+        startingWeights = {}
+
+    areas = {}
+    fits = {}
+    final_weights = {}
+    window_plans = plan.windows
+    if plan.peak_search is not None:
+        with instrument.stage('peak_search'):
+            window_plans = locate_windows(bins, vals, plan)
+    with instrument.stage('window'):
+        windows = list(wm.cut_windows(bins, vals, tuple(window_plan.window for window_plan in window_plans)))
+    for window_plan, (wave_bins, wave_vals) in zip(window_plans, windows):
+        warm_weights = startingWeights.get(window_plan.label)
+        if warm_weights is not None:
+            warm_weights = window_weights(warm_weights)
+        with instrument.tags(window=window_plan.label):
+            if cache is None:
+                area, weights, fit = fit_window_data(wave_bins, wave_vals, window_plan, geb, plan.maxfev, plan.solver, warm_weights)
+            else:
+                res = cached_fit_window(wave_bins, wave_vals, window_plan, plan, cache, cachedOnly=cachedOnly, warm_weights=warm_weights)
+                if res is None:
+                    return None
+                area, weights, fit = res
+        areas[window_plan.label] = area
+        fits[window_plan.label] = fit
+        final_weights[window_plan.label] = weights
+
+    ret = (areas,)
     if returnFits:
-        return areas, fits
-    return areas
-
-windowlabellist = ['Si1', 'Si2C1']
-
-common_fns = {
-    'point_slope': ff.point_slope,
-    'point_slope_super': ff.point_slope_super,
-    'exp_falloff': ff.exp_falloff,
-    'fat_tail': ff.fat_tail,
-    'chi_2': ff.chi_2,
-    'char': ff.char,
-    'x': ff.x,
-    'const': ff.const,
-    'gaus': ff.gaus,
-}
+        ret += (fits,)
+    if returnWeights:
+        ret += (final_weights,)
+    if len(ret) == 1:
+        return areas
+    return ret
 
 
 def calcPeakAreas(
         bins, 
         vals, 
         peakWindows=defaultPeakWindows, # list or dict
+        peakTargets=None, # list of lists or dict, see build_peak_area_config for adding windows
         peakFunctions='gaus', # str, list or dict
         peakStartingWeights=None, # list of lists or dict
         peakUpperBounds=None, # list of lists or dict
@@ -339,89 +385,36 @@ def calcPeakAreas(
         baselineLowerBounds=None, # list of lists or dict
         geb = None, # list
         maxfev=None,
+        solver=None, # 'auto' (variable projection on linear windows, curve_fit otherwise), 'varpro' or 'curve_fit', see solve_window
+        fixWidths=None, # bool, peak widths held at geb (needs geb)
+        fixCenters=None, # bool, peak centers held at their targets
+        peakSearch=None, # bool or dict (width, min_significance, tolerance), windows moved onto the peaks found
         returnFits:bool=False,
+        startingWeights=None, # dict, {window: final weights} of an earlier fit to start from
+        returnWeights:bool=False, # also return the final weights
+        plan=None, # FitPlan, skips compiling the settings above
+        cache=None, # FitResultCache, False for none, None for the one set with enable_fit_cache
         **kwargs
         ): #a wrapper for theActualPeakAreaCalculation
-    if isinstance(peakWindows, list):
-        peakWindows = dict(zip(windowlabellist, peakWindows))
-
-    if isinstance(peakFunctions, str):
-        peakFunctions = [[peakFunctions], [peakFunctions, peakFunctions]]
-    if isinstance(peakFunctions, list):
-        peakFunctions = dict(zip(windowlabellist, peakFunctions))
-
-    if isinstance(peakStartingWeights, list):
-        peakStartingWeights = dict(zip(windowlabellist, peakStartingWeights))
-    if isinstance(peakUpperBounds, list):
-        peakUpperBounds = dict(zip(windowlabellist, peakUpperBounds))
-    if isinstance(peakLowerBounds, list):
-        peakLowerBounds = dict(zip(windowlabellist, peakLowerBounds))
-
-
-    if isinstance(baselineFunction, str):
-        baselineFunction = [baselineFunction]*len(windowlabellist)
-    if isinstance(baselineFunction, list):
-        baselineFunction = dict(zip(windowlabellist, baselineFunction))
-
-    if isinstance(baselineStartingWeights, list):
-        baselineStartingWeights = dict(zip(windowlabellist, baselineStartingWeights))
-    if isinstance(baselineUpperBounds, list):
-        baselineUpperBounds = dict(zip(windowlabellist, baselineUpperBounds))
-    if isinstance(baselineLowerBounds, list):
-        baselineLowerBounds = dict(zip(windowlabellist, baselineLowerBounds))
-    if isinstance(geb, list):
-        geb = {'a': geb[0], 'b': geb[1], 'c': geb[2]}
-
-    config = default_peak_area_config
-
-    if peakWindows is not None:
-        for key in peakWindows:
-            config[key]['window'] = peakWindows[key]
-
-    if peakFunctions is not None:
-        for key in peakFunctions:
-            for i in range(len(config[key]['peaks'])):
-                if isinstance(peakFunctions[key][i], str):
-                    config[key]['peaks'][i]['fn'] = common_fns[peakFunctions[key][i]]
-                else:
-                    config[key]['peaks'][i]['fn'] = peakFunctions[key][i]
-
-    if peakStartingWeights is not None:
-        for key in peakStartingWeights:
-            for i in range(len(config[key]['peaks'])):
-                config[key]['peaks'][i]['bounds']['starting_weights'] = peakStartingWeights[key]
-    if peakUpperBounds is not None:
-        for key in peakUpperBounds:
-            for i in range(len(config[key]['peaks'])):
-                config[key]['peaks'][i]['bounds']['upper'] = peakUpperBounds[key]
-    if peakLowerBounds is not None:
-        for key in peakLowerBounds:
-            for i in range(len(config[key]['peaks'])):
-                config[key]['peaks'][i]['bounds']['lower'] = peakLowerBounds[key]
-
-    if baselineFunction is not None:
-        for key in baselineFunction:
-            if isinstance(baselineFunction[key], str):
-                config[key]['baseline'] = baselineFunctions[baselineFunction[key]]
-            elif isinstance(baselineFunction[key], dict):
-                config[key]['baseline'] =baselineFunction[key]
-
-    if baselineStartingWeights is not None:
-        for key in baselineStartingWeights:
-            for i in range(len(config[key]['peaks'])):
-                config[key]['baseline']['bounds']['starting_weights'] = baselineStartingWeights[key]
-    if baselineUpperBounds is not None:
-        for key in baselineUpperBounds:
-            for i in range(len(config[key]['peaks'])):
-                config[key]['baseline']['bounds']['upper'] = baselineUpperBounds[key]
-    if baselineLowerBounds is not None:
-        for key in baselineLowerBounds:
-            for i in range(len(config[key]['peaks'])):
-                config[key]['baseline']['bounds']['lower'] = baselineLowerBounds[key]
-    if geb is not None:
-        config['geb'] = geb
-    
-    if maxfev is not None:
-        config['maxfev'] = maxfev
-
-    return theActualPeakAreaCalculation(bins, vals, config, returnFits=returnFits, **kwargs)
\ No newline at end of file
+    if plan is None:
+        plan = compile_fit_plan(
+            peakWindows=peakWindows,
+            peakTargets=peakTargets,
+            peakFunctions=peakFunctions,
+            peakStartingWeights=peakStartingWeights,
+            peakUpperBounds=peakUpperBounds,
+            peakLowerBounds=peakLowerBounds,
+            baselineFunction=baselineFunction,
+            baselineStartingWeights=baselineStartingWeights,
+            baselineUpperBounds=baselineUpperBounds,
+            baselineLowerBounds=baselineLowerBounds,
+            geb=geb,
+            maxfev=maxfev,
+            solver=solver,
+            fixWidths=fixWidths,
+            fixCenters=fixCenters,
+            peakSearch=peakSearch,
+            )
+    return theActualPeakAreaCalculation(
+        bins, vals, plan, returnFits=returnFits, cache=cache,
+        startingWeights=startingWeights, returnWeights=returnWeights, **kwargs)
@@ -0,0 +1,101 @@
+import numpy as np
+
+from ..tools import fitting_functions as ff
+
+defaultPeakWindows = {
+    'Si1': [1.6, 2.2],
+    'Si2C1': [4.2, 4.8],
+}
+
+baselineFunctions = {
+    'point_slope': {
+        'fn': ff.point_slope,
+        'bounds': {
+            'lower': [-np.inf, -np.inf],
+            'upper': [np.inf, np.inf],
+            'starting_weights': [1, 1],
+            }
+        },
+    'point_slope_super': {
+        'fn': ff.point_slope_super,
+        'bounds': {
+            'lower': [-1e100, 0, 'lower bound x'],
+            'upper': [0, 'upper bound y', 'upper bound x'],
+            'starting_weights': [0, 'lower bound y', 'center x']
+            },
+        },
+    'exp_falloff': {
+        'fn': ff.exp_falloff,
+        'bounds': {
+            'lower': ['lower bound x', 0, 0, 'lower bound y'],
+            'upper': ['upper bound x', np.inf, np.inf, 'upper bound y'],
+            'starting_weights': ['center x', 'window height', .1, 'lower bound y']
+            }
+        },
+    'fat_tail': {
+        'fn': ff.fat_tail,
+        'bounds': {
+            'lower': [0, 0, 0, 0],
+            'upper': ['lower bound x', np.inf, 1, 'upper bound y'],
+            'starting_weights': [0, 'lower bound y', .1, 'lower bound y']
+            }
+        },
+}
+
+peakFunctions = {
+    'gaus': {
+        'fn': ff.gaus,
+        'bounds': {
+            'lower': ['lower bound x', 0, 0],
+            'upper': ['upper bound x', 'window height', 'upper bound sigma'],
+            'starting_weights': ['center x', 'window height', 'sigma']
+            }
+        }
+}
+
+default_peak_area_config = {
+    'Si1': {
+        'targets': [1.78],
+        'window': defaultPeakWindows['Si1'],
+        'peaks': [peakFunctions['gaus']],
+        'baseline': baselineFunctions['point_slope'],
+    },
+    'Si2C1': {
+        'targets': [4.44, 4.5],
+        'window': defaultPeakWindows['Si2C1'],
+        'peaks': [peakFunctions['gaus'], peakFunctions['gaus']],
+        'baseline': baselineFunctions['point_slope'],
+    },
+    'geb': None,
+}
+
+###example config
+# {
+#   'element 1': {
+#           targets:[], # Where you think the peak is centered
+#           window:[], # minimum and maximum energy to regress calculate area
+#           peaks:[{peak_config_1}, {peak_config_2}],
+#           baseline:{baseline_config},
+#                   },
+#   'element 2': {},
+#   'geb': {'a': -0.0073, 'b': 0.078, 'c': 0},
+#   'maxfev': 50000,
+#   'solver': 'auto', # 'varpro' or 'curve_fit', see fitPlan.solvers
+#   'fix_widths': False, # peak widths held at geb
+#   'fix_centers': False, # peak centers held at their targets
+#   'peak_search': {'width': 8, 'min_significance': 5, 'tolerance': 0.15}, # or True, targets moved onto the peaks found
+#   }
+
+windowlabellist = ['Si1', 'Si2C1']
+
+common_fns = {
+    'point_slope': ff.point_slope,
+    'point_slope_super': ff.point_slope_super,
+    'exp_falloff': ff.exp_falloff,
+    'fat_tail': ff.fat_tail,
+    'chi_2': ff.chi_2,
+    'char': ff.char,
+    'x': ff.x,
+    'const': ff.const,
+    'gaus': ff.gaus,
+}
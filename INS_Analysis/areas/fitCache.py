@@ -0,0 +1,118 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ..tools.cache import DiskCache, hash_key
+
+default_directory = os.path.join('~', '.cache', 'INS_Analysis', 'fits')
+# part of every key, bumped when a change to the fitting changes its results
+# so that fits kept on disk by earlier versions are not served
+fit_version = 2
+
+
+def window_key(window_plan, geb, maxfev, bins, vals, solver='auto'):
+    """
+    key of one window fit: the fit version, the window's settings, geb,
+    maxfev, solver and the windowed data
+    """
+    bins = np.ascontiguousarray(bins, dtype=float)
+    vals = np.ascontiguousarray(vals, dtype=float)
+    return hash_key(fit_version, window_plan.fingerprint, geb, maxfev, solver, bins, vals)
+
+
+def _copy_entry(entry):
+    area, weights, fit = entry
+    weights = {k: np.array(v) for k, v in weights.items()}
+    fit = {k: v.copy() for k, v in fit.items()}
+    return area, weights, fit
+
+
+class FitResultCache():
+    """
+    (area, weights, fit) of single window fits.
+    Kept in memory up to memory_size entries, least recently used evicted first,
+    and on disk under directory (if given) up to max_bytes.
+    Pickles without its memory tier, so worker processes share the disk tier only.
+    """
+    def __init__(self, memory_size=4096, directory=None, max_bytes=2**28):
+        self.memory_size = memory_size
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = None if directory is None else DiskCache(directory, max_bytes=max_bytes, suffix='.pkl')
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return _copy_entry(entry)
+        if self.disk is None:
+            return None
+
+        def loader(path):
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        entry = self.disk.load(key, loader)
+        if entry is None:
+            return None
+        self._remember(key, entry)
+        return _copy_entry(entry)
+
+    def put(self, key, entry):
+        entry = _copy_entry(entry)
+        self._remember(key, entry)
+        if self.disk is not None:
+            self.disk.store(key, lambda f: pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def __getstate__(self):
+        return {'memory_size': self.memory_size, 'directory': self.directory, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+_cache = None
+
+
+def enable_fit_cache(memory_size=4096, directory=None, max_bytes=2**28):
+    """
+    caches every calcPeakAreas window fit from now on, returns the FitResultCache
+    directory: also keep results on disk there (default_directory is a good choice)
+    """
+    global _cache
+    _cache = FitResultCache(memory_size=memory_size, directory=directory, max_bytes=max_bytes)
+    return _cache
+
+
+def disable_fit_cache():
+    global _cache
+    _cache = None
+
+
+def resolve_cache(cache):
+    """
+    cache: a FitResultCache, False for none, None for the one set with enable_fit_cache
+    """
+    if cache is None:
+        return _cache
+    if cache is False:
+        return None
+    return cache
@@ -0,0 +1,540 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from functools import cached_property
+
+import numpy as np
+
+from ..tools import fitting_functions as ff
+from ..tools.cache import hash_key
+from ..tools.peak_search import find_peaks, match_peaks
+from . import configs
+from .configs import (
+    baselineFunctions,
+    common_fns,
+    default_peak_area_config,
+    defaultPeakWindows,
+    windowlabellist,
+)
+
+
+@dataclass(frozen=True)
+class WindowPlan:
+    """
+    Everything needed to fit one peak window, resolved once from the config.
+    Bound specs are numbers or autobound keys, flattened over the baseline
+    followed by each peak, with the target each weight is bounded around.
+    fixed flags the weights held at their starting weights rather than fit.
+    """
+    label: str
+    targets: tuple
+    window: tuple
+    baseline_fn: object
+    peak_fns: tuple
+    baseline_n_weights: int
+    peak_n_weights: tuple
+    peak_function: object
+    sum_function: object
+    jacobian: object
+    lower: tuple
+    upper: tuple
+    starting_weights: tuple
+    bound_targets: tuple
+    fixed: tuple = ()
+
+    @property
+    def n_weights(self):
+        return self.baseline_n_weights + sum(self.peak_n_weights)
+
+    @property
+    def baseline_slice(self):
+        return slice(0, self.baseline_n_weights)
+
+    @property
+    def peak_slice(self):
+        return slice(self.baseline_n_weights, self.n_weights)
+
+    @cached_property
+    def fingerprint(self):
+        """
+        digest of the settings that decide the fit, stable across processes
+        """
+        return hash_key(
+            self.label, self.targets, self.window, self.baseline_fn, self.peak_fns,
+            self.baseline_n_weights, self.peak_n_weights,
+            self.lower, self.upper, self.starting_weights, self.bound_targets, self.fixed,
+        )
+
+
+@dataclass(frozen=True)
+class FitPlan:
+    """
+    Immutable, hashable compiled form of a peak area config.
+    Build with compile_fit_plan, which memoizes plans by their settings.
+    """
+    windows: tuple
+    geb: tuple
+    maxfev: int
+    solver: str = 'auto'
+    fix_widths: bool = False
+    fix_centers: bool = False
+    peak_search: tuple = None
+
+    @property
+    def labels(self):
+        return tuple(window.label for window in self.windows)
+
+    @property
+    def window_bounds(self):
+        return tuple(window.window for window in self.windows)
+
+    @property
+    def geb_dict(self):
+        if self.geb is None:
+            return None
+        return dict(self.geb)
+
+    @cached_property
+    def fingerprint(self):
+        """
+        digest of every setting of the plan, stable across processes
+        """
+        return hash_key(
+            [window.fingerprint for window in self.windows], self.geb, self.maxfev, self.solver,
+            self.fix_widths, self.fix_centers, self.peak_search,
+        )
+
+    @property
+    def peak_search_dict(self):
+        if self.peak_search is None:
+            return None
+        return dict(self.peak_search)
+
+    def window(self, label):
+        for window in self.windows:
+            if window.label == label:
+                return window
+        raise KeyError(label)
+
+
+# 'varpro' fits windows whose functions declare their linear weights by variable
+# projection (see varpro), 'auto' only those linear in every free weight (see
+# solve_window), 'curve_fit' fits every weight with curve_fit
+solvers = ('auto', 'varpro', 'curve_fit')
+
+
+def _spec_tuple(specs):
+    return tuple(float(s) if isinstance(s, (int, float, np.number)) else s for s in specs)
+
+
+# config keys of plan wide settings, the others are windows
+plan_settings = ('geb', 'maxfev', 'solver', 'fix_widths', 'fix_centers', 'peak_search')
+
+# settings of the peak search run before fitting (see locate_windows)
+peak_search_settings = ('width', 'min_significance', 'tolerance')
+
+
+def compile_window(label, window_config, fix_widths=False, fix_centers=False):
+    """
+    fix_widths: hold the peak weights starting at 'sigma' (the detector
+        resolution, geb, at the peak's target)
+    fix_centers: hold the peak weights starting at 'center x' at the peak's target
+    """
+    targets = tuple(window_config['targets'])
+    baseline_config = window_config['baseline']
+    peak_configs = window_config['peaks']
+
+    baseline_bounds = baseline_config['bounds']
+    baseline_n_weights = len(baseline_bounds['upper'])
+    lower = list(baseline_bounds['lower'])
+    upper = list(baseline_bounds['upper'])
+    starting_weights = list(baseline_bounds['starting_weights'])
+    bound_targets = [targets[0]] * baseline_n_weights
+
+    peak_fns = []
+    peak_n_weights = []
+    for _, peak in enumerate(peak_configs):
+        n = len(peak['bounds']['upper'])
+        lower += peak['bounds']['lower']
+        upper += peak['bounds']['upper']
+        starting_weights += peak['bounds']['starting_weights']
+        bound_targets += [targets[_]] * n
+        peak_fns.append(peak['fn'])
+        peak_n_weights.append(n)
+
+    fixed = [False] * len(starting_weights)
+    for i in range(baseline_n_weights, len(starting_weights)):
+        if fix_widths and starting_weights[i] == 'sigma':
+            fixed[i] = True
+        if fix_centers and starting_weights[i] == 'center x':
+            starting_weights[i] = 'target'
+            fixed[i] = True
+
+    peak_function = ff.generate_compound_sum(peak_fns, peak_n_weights)
+    sum_function = ff.generate_compound_sum(
+        [baseline_config['fn'], peak_function],
+        [baseline_n_weights, sum(peak_n_weights)])
+
+    return WindowPlan(
+        label=label,
+        targets=targets,
+        window=tuple(window_config['window']),
+        baseline_fn=baseline_config['fn'],
+        peak_fns=tuple(peak_fns),
+        baseline_n_weights=baseline_n_weights,
+        peak_n_weights=tuple(peak_n_weights),
+        peak_function=peak_function,
+        sum_function=sum_function,
+        jacobian=ff.get_jacobian(sum_function),
+        lower=_spec_tuple(lower),
+        upper=_spec_tuple(upper),
+        starting_weights=_spec_tuple(starting_weights),
+        bound_targets=tuple(bound_targets),
+        fixed=tuple(fixed),
+    )
+
+
+def compile_config(config):
+    """
+    compiles a full config dict (see default_peak_area_config) into a FitPlan
+    """
+    fix_widths = bool(config.get('fix_widths', False))
+    fix_centers = bool(config.get('fix_centers', False))
+    windows = tuple(
+        compile_window(label, config[label], fix_widths=fix_widths, fix_centers=fix_centers)
+        for label in config
+        if label not in plan_settings
+    )
+    geb = config.get('geb')
+    if geb is not None:
+        geb = tuple((k, float(geb[k])) for k in ('a', 'b', 'c'))
+    elif fix_widths:
+        raise ValueError('fixing the peak widths needs geb')
+    solver = config.get('solver', 'auto')
+    if solver not in solvers:
+        raise ValueError(f'unknown solver {solver}, one of {solvers}')
+    peak_search = config.get('peak_search')
+    if peak_search is True:
+        peak_search = {}
+    if peak_search is None or peak_search is False:
+        peak_search = None
+    else:
+        unknown = set(peak_search) - set(peak_search_settings)
+        if unknown:
+            raise ValueError(f'unknown peak search settings {sorted(unknown)}, of {peak_search_settings}')
+        peak_search = tuple(sorted((k, float(v)) for k, v in peak_search.items() if v is not None))
+    return FitPlan(
+        windows=windows, geb=geb, maxfev=int(config.get('maxfev', 50000)), solver=solver,
+        fix_widths=fix_widths, fix_centers=fix_centers, peak_search=peak_search)
+
+
+def locate_window(window_plan, peaks, tolerance=None):
+    """
+    window_plan moved onto peaks found in the spectrum (see
+    tools.peak_search.find_peaks): targets, window and bounds shift by the
+    median distance of the targets to their nearest peaks within tolerance
+    (half the window by default), peak centers start at the shifted targets
+    and a peak that alone matches a resolved peak starts at its width
+    (unless held); unchanged when no target has a peak
+    """
+    window = window_plan.window
+    if tolerance is None:
+        tolerance = (window[1] - window[0]) / 2
+    matched = match_peaks(peaks['position'], window_plan.targets, tolerance)
+    found = matched >= 0
+    if not found.any():
+        return window_plan
+    shift = float(np.median(peaks['position'][matched[found]] - np.array(window_plan.targets)[found]))
+
+    starting_weights = list(window_plan.starting_weights)
+    fixed = window_plan.fixed or (False,) * window_plan.n_weights
+    for peak, (start, stop) in enumerate(ff.weight_slices(window_plan.peak_n_weights)):
+        sigma = np.nan
+        if found[peak] and np.sum(matched == matched[peak]) == 1:
+            sigma = peaks['sigma'][matched[peak]]
+        for i in range(window_plan.baseline_n_weights + start, window_plan.baseline_n_weights + stop):
+            if starting_weights[i] == 'center x':
+                starting_weights[i] = 'target'
+            elif starting_weights[i] == 'sigma' and not fixed[i] and np.isfinite(sigma) and sigma > 0:
+                starting_weights[i] = float(sigma)
+
+    return replace(
+        window_plan,
+        targets=tuple(t + shift for t in window_plan.targets),
+        window=(window[0] + shift, window[1] + shift),
+        starting_weights=tuple(starting_weights),
+        bound_targets=tuple(t + shift for t in window_plan.bound_targets),
+    )
+
+
+# smoothing of the peak search (channels) without a width set or geb to take it from
+default_search_width = 8
+
+
+def search_width(bins, plan):
+    """
+    smoothing of the peak search in channels, the standard deviation
+    geb gives at the middle target when set
+    """
+    width = plan.peak_search_dict.get('width')
+    if width is not None:
+        return width
+    if plan.geb is None:
+        return default_search_width
+    geb = plan.geb_dict
+    target = np.median([t for window in plan.windows for t in window.targets])
+    channel = np.median(np.abs(np.diff(bins)))
+    return max(float(ff.geb(target, geb['a'], geb['b'], geb['c'])) / np.sqrt(2) / channel, 1)
+
+
+def locate_windows(bins, vals, plan):
+    """
+    plan's WindowPlans moved onto the peaks of the spectrum vals (see
+    locate_window), found by the smoothed second derivative with the
+    settings in plan.peak_search
+    """
+    settings = plan.peak_search_dict
+    peaks = find_peaks(
+        bins, vals, width=search_width(bins, plan),
+        min_significance=settings.get('min_significance', 5))
+    return tuple(locate_window(window, peaks, settings.get('tolerance')) for window in plan.windows)
+
+
+# fresh dicts and lists, the registries and default config are never written to
+def _copy_fn_config(fn_config):
+    return {
+        'fn': fn_config['fn'],
+        'bounds': {k: list(v) for k, v in fn_config['bounds'].items()},
+    }
+
+
+def _copy_window_config(window_config):
+    return {
+        'targets': list(window_config['targets']),
+        'window': list(window_config['window']),
+        'peaks': [_copy_fn_config(peak) for peak in window_config['peaks']],
+        'baseline': _copy_fn_config(window_config['baseline']),
+    }
+
+
+def _new_window_config(targets, window):
+    return {
+        'targets': list(targets),
+        'window': list(window),
+        'peaks': [_copy_fn_config(configs.peakFunctions['gaus']) for _ in targets],
+        'baseline': _copy_fn_config(baselineFunctions['point_slope']),
+    }
+
+
+def _set_targets(window_config, targets):
+    # one peak per target, extra peaks are copies of the first
+    peaks = window_config['peaks']
+    window_config['targets'] = list(targets)
+    window_config['peaks'] = [
+        peaks[i] if i < len(peaks) else _copy_fn_config(peaks[0])
+        for i in range(len(targets))
+    ]
+
+
+def build_peak_area_config(
+        peakWindows=defaultPeakWindows, # list or dict
+        peakTargets=None, # list of lists or dict
+        peakFunctions='gaus', # str, list or dict
+        peakStartingWeights=None, # list of lists or dict
+        peakUpperBounds=None, # list of lists or dict
+        peakLowerBounds=None, # list of lists or dict
+        baselineFunction='point_slope', # str, list or dict
+        baselineStartingWeights=None, # list of lists or dict
+        baselineUpperBounds=None, # list of lists or dict
+        baselineLowerBounds=None, # list of lists or dict
+        geb = None, # list
+        maxfev=None,
+        solver=None, # 'auto', 'varpro' or 'curve_fit'
+        fixWidths=None, # bool, peak widths held at geb
+        fixCenters=None, # bool, peak centers held at their targets
+        peakSearch=None, # bool or dict of peak_search_settings, targets moved onto the peaks found
+        **kwargs
+        ):
+    """
+    returns a new config dict from default_peak_area_config and the calcPeakAreas settings
+
+    lists are matched to the default windows (Si1, Si2C1) in order, dicts may name
+    any window: a label new to peakWindows adds a window with the targets given
+    in peakTargets, fitted with a gaus per target on a point_slope baseline unless
+    set otherwise, and a window set to None in peakWindows is left out, e.g.
+    peakWindows={'H': [2.1, 2.35], 'O': [5.95, 6.3]}, peakTargets={'H': [2.223], 'O': [6.129]}
+    """
+    if isinstance(peakWindows, list):
+        peakWindows = dict(zip(windowlabellist, peakWindows))
+    if isinstance(peakTargets, list):
+        peakTargets = dict(zip(windowlabellist, peakTargets))
+
+    config = {label: _copy_window_config(default_peak_area_config[label]) for label in windowlabellist}
+
+    if peakWindows is not None:
+        for key in peakWindows:
+            if peakWindows[key] is None:
+                config.pop(key, None)
+            elif key in config:
+                config[key]['window'] = list(peakWindows[key])
+            elif peakTargets is not None and key in peakTargets:
+                config[key] = _new_window_config(peakTargets[key], peakWindows[key])
+            else:
+                raise ValueError(f'window {key} needs its peakTargets')
+
+    if peakTargets is not None:
+        for key in peakTargets:
+            if key not in config:
+                raise ValueError(f'window {key} needs its peakWindows')
+            _set_targets(config[key], peakTargets[key])
+
+    labels = list(config)
+    config['geb'] = default_peak_area_config['geb']
+
+    if isinstance(peakFunctions, str):
+        peakFunctions = {key: [peakFunctions]*len(config[key]['peaks']) for key in labels}
+    if isinstance(peakFunctions, list):
+        peakFunctions = dict(zip(windowlabellist, peakFunctions))
+
+    if isinstance(peakStartingWeights, list):
+        peakStartingWeights = dict(zip(windowlabellist, peakStartingWeights))
+    if isinstance(peakUpperBounds, list):
+        peakUpperBounds = dict(zip(windowlabellist, peakUpperBounds))
+    if isinstance(peakLowerBounds, list):
+        peakLowerBounds = dict(zip(windowlabellist, peakLowerBounds))
+
+
+    if isinstance(baselineFunction, str):
+        baselineFunction = {key: baselineFunction for key in labels}
+    if isinstance(baselineFunction, list):
+        baselineFunction = dict(zip(windowlabellist, baselineFunction))
+
+    if isinstance(baselineStartingWeights, list):
+        baselineStartingWeights = dict(zip(windowlabellist, baselineStartingWeights))
+    if isinstance(baselineUpperBounds, list):
+        baselineUpperBounds = dict(zip(windowlabellist, baselineUpperBounds))
+    if isinstance(baselineLowerBounds, list):
+        baselineLowerBounds = dict(zip(windowlabellist, baselineLowerBounds))
+    if isinstance(geb, list):
+        geb = {'a': geb[0], 'b': geb[1], 'c': geb[2]}
+
+    if peakFunctions is not None:
+        for key in peakFunctions:
+            for i in range(len(config[key]['peaks'])):
+                if isinstance(peakFunctions[key][i], str):
+                    config[key]['peaks'][i]['fn'] = common_fns[peakFunctions[key][i]]
+                else:
+                    config[key]['peaks'][i]['fn'] = peakFunctions[key][i]
+
+    if peakStartingWeights is not None:
+        for key in peakStartingWeights:
+            for i in range(len(config[key]['peaks'])):
+                config[key]['peaks'][i]['bounds']['starting_weights'] = list(peakStartingWeights[key])
+    if peakUpperBounds is not None:
+        for key in peakUpperBounds:
+            for i in range(len(config[key]['peaks'])):
+                config[key]['peaks'][i]['bounds']['upper'] = list(peakUpperBounds[key])
+    if peakLowerBounds is not None:
+        for key in peakLowerBounds:
+            for i in range(len(config[key]['peaks'])):
+                config[key]['peaks'][i]['bounds']['lower'] = list(peakLowerBounds[key])
+
+    if baselineFunction is not None:
+        for key in baselineFunction:
+            if isinstance(baselineFunction[key], str):
+                config[key]['baseline'] = _copy_fn_config(baselineFunctions[baselineFunction[key]])
+            elif isinstance(baselineFunction[key], dict):
+                config[key]['baseline'] = _copy_fn_config(baselineFunction[key])
+
+    if baselineStartingWeights is not None:
+        for key in baselineStartingWeights:
+            config[key]['baseline']['bounds']['starting_weights'] = list(baselineStartingWeights[key])
+    if baselineUpperBounds is not None:
+        for key in baselineUpperBounds:
+            config[key]['baseline']['bounds']['upper'] = list(baselineUpperBounds[key])
+    if baselineLowerBounds is not None:
+        for key in baselineLowerBounds:
+            config[key]['baseline']['bounds']['lower'] = list(baselineLowerBounds[key])
+    if geb is not None:
+        config['geb'] = geb
+
+    if maxfev is not None:
+        config['maxfev'] = maxfev
+    if solver is not None:
+        config['solver'] = solver
+    if fixWidths is not None:
+        config['fix_widths'] = fixWidths
+    if fixCenters is not None:
+        config['fix_centers'] = fixCenters
+    if peakSearch is not None:
+        config['peak_search'] = peakSearch
+
+    return config
+
+
+def freeze(value):
+    """
+    hashable stand-in for a settings value, lists and arrays become tuples
+    and dicts become sorted tuples of items
+    """
+    if isinstance(value, dict):
+        return ('__dict__',) + tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return tuple(freeze(v) for v in value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+plan_cache_size = 256
+
+
+# calcPeakAreas kwargs that are not fit settings
+run_settings = ('returnFits', 'startingWeights', 'returnWeights', 'plan', 'cache')
+
+
+def settings_plan(**kwargs):
+    """
+    FitPlan calcPeakAreas fits with given kwargs: their plan, or the one
+    their fit settings compile to
+    """
+    plan = kwargs.get('plan')
+    if plan is None:
+        plan = compile_fit_plan(**{k: v for k, v in kwargs.items() if k not in run_settings})
+    return plan
+
+
+def compile_fit_plan(**kwargs):
+    """
+    FitPlan for the calcPeakAreas settings in kwargs,
+    memoized in an LRU keyed by the settings
+    """
+    key = freeze(kwargs)
+    try:
+        hash(key)
+    except TypeError:
+        return compile_config(build_peak_area_config(**kwargs))
+
+    with _plan_cache_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+
+    plan = compile_config(build_peak_area_config(**kwargs))
+
+    with _plan_cache_lock:
+        plan = _plan_cache.setdefault(key, plan)
+        _plan_cache.move_to_end(key)
+        while len(_plan_cache) > plan_cache_size:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def clear_fit_plan_cache():
+    with _plan_cache_lock:
+        _plan_cache.clear()
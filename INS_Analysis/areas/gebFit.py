@@ -0,0 +1,93 @@
+import numpy as np
+from scipy.optimize import least_squares
+
+from ..tools import fitting_functions as ff
+from ..tools import window_maker as wm
+from .calculatePeakAreas import curve_fit_window, window_problem
+from .fitPlan import compile_fit_plan, locate_windows
+from .varpro import fit_varpro, separable
+
+geb_keys = ('a', 'b', 'c')
+
+
+def _geb_dict(geb):
+    if isinstance(geb, dict):
+        return {k: float(geb[k]) for k in geb_keys}
+    return dict(zip(geb_keys, map(float, geb)))
+
+
+def window_residuals(windows, geb, maxfev):
+    """
+    residuals of every (window_plan, bins, vals) in windows fit with the
+    widths held at geb, each solved on its own (curve_fit for windows
+    whose functions are not separable); a window whose fit fails counts
+    as fitting nothing, so one bad spectrum does not end the search
+    """
+    ret = []
+    for window_plan, bins, vals in windows:
+        try:
+            fn, _, p0, lower, upper, _ = window_problem(bins, vals, window_plan, geb)
+            if separable(fn):
+                weights, _ = fit_varpro(fn, bins, vals, p0, lower, upper, maxfev)
+            else:
+                weights = curve_fit_window(bins, vals, fn, p0, lower, upper, maxfev)
+            residual = fn(bins, *weights) - vals
+        except (RuntimeError, ValueError, np.linalg.LinAlgError):
+            residual = -vals
+        if not np.all(np.isfinite(residual)):
+            residual = -vals
+        ret.append(residual)
+    return np.concatenate(ret)
+
+
+def fitGeb(spectra, geb, maxfev=None, returnInfo=False, **kwargs):
+    """
+    detector resolution (geb a, b, c) fit once, jointly, to a batch of spectra
+
+    every peak width is held at geb and every center at its target, leaving
+    each window linear in the rest (amplitudes, baseline), solved exactly per
+    spectrum for every guess of a, b and c, which are searched by least_squares
+    on all the residuals together (centers left free make each residual the
+    outcome of a fit of its own, too rough to search on)
+
+    spectra: [bins, vals] pairs
+    geb: starting a, b, c (list or dict)
+    kwargs: fit settings as calcPeakAreas (peakWindows, peakTargets, peakSearch, ...)
+    returns {'a', 'b', 'c'} to give calcPeakAreas as geb with fixWidths=True,
+    and the least_squares result with returnInfo
+    """
+    geb = _geb_dict(geb)
+    plan = compile_fit_plan(geb=geb, fixWidths=True, fixCenters=True, maxfev=maxfev, **kwargs)
+
+    windows = []
+    for bins, vals in spectra:
+        bins = np.asarray(bins, dtype=float)
+        vals = np.asarray(vals, dtype=float)
+        window_plans = plan.windows
+        if plan.peak_search is not None:
+            window_plans = locate_windows(bins, vals, plan)
+        window_bounds = tuple(window_plan.window for window_plan in window_plans)
+        for window_plan, (window_bins, window_vals) in zip(window_plans, wm.cut_windows(bins, vals, window_bounds)):
+            windows.append((window_plan, window_bins, window_vals))
+    targets = np.array([t for window_plan, _, _ in windows[:len(plan.windows)] for t in window_plan.targets])
+    unresolved = np.concatenate([vals for _, _, vals in windows])
+
+    def residuals(params):
+        trial = dict(zip(geb_keys, params))
+        sigma = ff.geb(targets, trial['a'], trial['b'], trial['c'])
+        if not np.all(np.isfinite(sigma) & (sigma > 0)):
+            # no peak can take these widths, as bad as fitting nothing
+            return -unresolved
+        return window_residuals(windows, trial, plan.maxfev)
+
+    res = least_squares(
+        residuals,
+        [geb[k] for k in geb_keys],
+        bounds=([-np.inf, -np.inf, 0], [np.inf, np.inf, np.inf]),
+        x_scale='jac',
+        method='trf',
+    )
+    ret = dict(zip(geb_keys, res.x.tolist()))
+    if returnInfo:
+        return ret, res
+    return ret
@@ -0,0 +1,80 @@
+import numpy as np
+from scipy.optimize import least_squares, lsq_linear
+
+from ..tools import fitting_functions as ff
+
+
+def separable(fn):
+    """
+    whether fn can be fit by variable projection: it declares its linear
+    weights and has a jacobian
+    """
+    return ff.get_linear_weights(fn) is not None and ff.get_jacobian(fn) is not None
+
+
+def solve_linear(basis, y, lower, upper):
+    """
+    least squares weights of the basis columns within lower and upper,
+    and which of them are free (not held at a bound)
+    """
+    weights = np.linalg.lstsq(basis, y, rcond=None)[0]
+    if np.all((weights >= lower) & (weights <= upper)):
+        return weights, np.ones(len(weights), dtype=bool)
+    weights = lsq_linear(basis, y, bounds=(lower, upper), method='bvls').x
+    return weights, (weights > lower) & (weights < upper)
+
+
+def fit_varpro(fn, x, y, p0, lower, upper, maxfev):
+    """
+    separable least squares of fn (see separable): the weights fn is linear in
+    (amplitudes, baseline) are solved within their bounds for every guess of
+    the others, so the bounded search (least_squares, trf) runs over the
+    nonlinear weights (centers, widths) alone, with Kaufman's approximation of
+    the jacobian projected on the free linear weights
+
+    returns the weights and the least_squares result (None when every weight is linear)
+    """
+    jacobian = ff.get_jacobian(fn)
+    linear = np.array(ff.get_linear_weights(fn), dtype=int)
+    nonlinear = np.setdiff1d(np.arange(len(p0)), linear)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    weights = np.array(p0, dtype=float)
+    last = {}
+
+    def project(theta):
+        # basis of the linear weights at theta and the weights solving it
+        if last and np.array_equal(last['theta'], theta):
+            return last['basis'], last['weights'], last['free']
+        weights[nonlinear] = theta
+        basis = jacobian(x, *weights)[:, linear]
+        weights[linear], free = solve_linear(basis, y, lower[linear], upper[linear])
+        last.update(theta=np.array(theta), basis=basis, weights=weights.copy(), free=free)
+        return basis, last['weights'], free
+
+    def residuals(theta):
+        basis, w, _ = project(theta)
+        return basis @ w[linear] - y
+
+    def projected_jacobian(theta):
+        basis, w, free = project(theta)
+        columns = jacobian(x, *w)[:, nonlinear]
+        if not free.any():
+            return columns
+        basis = basis[:, free]
+        return columns - basis @ np.linalg.lstsq(basis, columns, rcond=None)[0]
+
+    theta = np.clip(weights[nonlinear], lower[nonlinear], upper[nonlinear])
+    if len(nonlinear) == 0:
+        return project(theta)[1], None
+    res = least_squares(
+        residuals,
+        theta,
+        jac=projected_jacobian,
+        bounds=(lower[nonlinear], upper[nonlinear]),
+        method='trf',
+        max_nfev=maxfev,
+    )
+    return project(res.x)[1], res
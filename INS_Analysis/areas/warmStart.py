@@ -0,0 +1,99 @@
+import numpy as np
+
+warm_start_modes = ('previous', 'nearest')
+
+
+def spectrum_shape(vals):
+    """
+    vals scaled to sum to one, so spectra of different counting times compare
+    """
+    vals = np.asarray(vals, dtype=float)
+    total = vals.sum()
+    if total == 0 or not np.isfinite(total):
+        return vals
+    return vals / total
+
+
+class WarmStarts():
+    """
+    final weights ({window: {'baseline', 'peak'}}) of fitted spectra, to start
+    fitting others from (see calcPeakAreas' startingWeights)
+    mode: 'previous' the last spectrum added, 'nearest' the one closest in shape
+        (euclidean distance of spectrum_shape, among spectra with as many bins),
+        or a function (label, fitted labels) -> label, None for no warm start
+    """
+    def __init__(self, mode='previous'):
+        if not callable(mode) and mode not in warm_start_modes:
+            raise ValueError(f'warm start must be one of {warm_start_modes} or a function, not {mode!r}')
+        self.mode = mode
+        self.weights = {}
+        self.vals = {}
+        self.last = None
+        # per number of bins: shapes stacked in rows (grown by doubling) and their labels
+        self._shapes = {}
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __contains__(self, label):
+        return label in self.weights
+
+    def add(self, label, vals, weights):
+        if weights is None:
+            return
+        self.weights[label] = weights
+        self.vals[label] = vals
+        self.last = label
+        if self.mode != 'nearest':
+            return
+        shape = spectrum_shape(vals)
+        rows, labels = self._shapes.get(len(shape), (None, []))
+        if label in labels:
+            rows[labels.index(label)] = shape
+            return
+        if rows is None or len(labels) == len(rows):
+            grown = np.empty((max(8, 2 * len(labels)), len(shape)))
+            if rows is not None:
+                grown[:len(labels)] = rows
+            rows = grown
+        rows[len(labels)] = shape
+        labels.append(label)
+        self._shapes[len(shape)] = (rows, labels)
+
+    def choose(self, label, vals):
+        """
+        label of the fitted spectrum to start label (with vals) from, None if none
+        """
+        if not self.weights:
+            return None
+        if self.mode == 'previous':
+            return self.last
+        if self.mode == 'nearest':
+            shape = spectrum_shape(vals)
+            rows, labels = self._shapes.get(len(shape), (None, []))
+            if not labels:
+                return None
+            distances = np.linalg.norm(rows[:len(labels)] - shape, axis=1)
+            return labels[int(np.nanargmin(distances))] if np.isfinite(distances).any() else None
+        chosen = self.mode(label, list(self.weights))
+        return chosen if chosen in self.weights else None
+
+    def starting_weights(self, label, vals):
+        """
+        final weights to start label (with vals) from, None for a cold start
+        """
+        chosen = self.choose(label, vals)
+        if chosen is None:
+            return None
+        return self.weights[chosen]
+
+    def subset(self, labels):
+        """
+        a WarmStarts of the same mode holding only labels (those added), e.g.
+        to seed a worker
+        """
+        ret = WarmStarts(self.mode)
+        for label in labels:
+            if label in self.weights:
+                ret.add(label, self.vals[label], self.weights[label])
+        return ret
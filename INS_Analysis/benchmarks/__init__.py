@@ -0,0 +1,5 @@
+from .synthetic import make_spectra
+from .runner import run
+from .runner import run_scenario
+from .runner import compare
+from .scenarios import scenarios
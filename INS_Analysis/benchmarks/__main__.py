@@ -0,0 +1,41 @@
+import argparse
+
+from .runner import compare, run
+from .scenarios import scenarios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m INS_Analysis.benchmarks',
+        description='Times the INS_Analysis pipeline on seeded synthetic spectra.')
+    parser.add_argument('scenarios', nargs='*',
+                        help=f"scenarios to run, all by default: {', '.join(scenarios)}")
+    parser.add_argument('--sizes', type=int, nargs='+', help='numbers of spectra to run each scenario on')
+    parser.add_argument('--channels', type=int, default=2048)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per size, the best is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run measuring peak memory')
+    parser.add_argument('--out', help='JSON file for the results')
+    parser.add_argument('--compare', metavar='OLD_JSON', help='results of an earlier run to compare against')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in scenarios]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    report = run(
+        names=args.scenarios or None,
+        sizes=args.sizes,
+        seed=args.seed,
+        n_channels=args.channels,
+        repeat=args.repeat,
+        memory=not args.no_memory,
+        out=args.out,
+    )
+    if args.compare:
+        for row in compare(args.compare, report):
+            print(f"{row['scenario']:>22} {row['n_spectra']:>7}  {row['old_seconds']:10.4f} s -> "
+                  f"{row['new_seconds']:10.4f} s  x{row['speedup']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
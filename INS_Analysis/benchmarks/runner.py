@@ -0,0 +1,139 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import scipy
+
+from .scenarios import default_max_spectra, min_spectra, scenarios, scratch_directory
+
+default_sizes = [1, 10, 100, 1000, 10000, 100000]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    return {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_scenario(name, n_spectra, seed=0, n_channels=2048, repeat=1, memory=True):
+    """
+    times scenario name on n_spectra spectra, the best of repeat runs,
+    and with memory its peak traced allocation in one more run
+    """
+    setup, run = scenarios[name]
+    with scratch_directory() as directory:
+        state = setup(n_spectra, seed, n_channels, directory)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            metrics = run(state)
+            times.append(time.perf_counter() - start)
+
+        peak_memory = None
+        if memory:
+            tracemalloc.start()
+            try:
+                run(state)
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    seconds = min(times)
+    return {
+        'scenario': name,
+        'n_spectra': n_spectra,
+        'n_channels': n_channels,
+        'seed': seed,
+        'seconds': seconds,
+        'seconds_all': times,
+        'spectra_per_second': n_spectra / seconds if seconds > 0 else None,
+        'peak_memory_bytes': peak_memory,
+        **metrics,
+    }
+
+
+def run(names=None, sizes=None, seed=0, n_channels=2048, repeat=1, memory=True, out=None, log=print):
+    """
+    runs scenarios (all by default) at every size, sizes default to default_sizes
+    up to each scenario's default_max_spectra, sizes below min_spectra are skipped
+
+    out: JSON file to write the results to
+    returns {'environment': ..., 'results': [...]}
+    """
+    names = list(scenarios) if names is None else list(names)
+    results = []
+    for name in names:
+        if sizes is None:
+            scenario_sizes = [n for n in default_sizes if n <= default_max_spectra[name]]
+        else:
+            scenario_sizes = sizes
+        for n_spectra in scenario_sizes:
+            if n_spectra < min_spectra.get(name, 1):
+                continue
+            result = run_scenario(name, n_spectra, seed=seed, n_channels=n_channels, repeat=repeat, memory=memory)
+            results.append(result)
+            if log is not None:
+                log(format_result(result))
+
+    report = {'environment': environment(), 'results': results}
+    if out is not None:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def format_result(result):
+    memory = result['peak_memory_bytes']
+    memory = '' if memory is None else f'{memory / 2**20:9.1f} MiB'
+    nfev = f"  nfev {result['nfev']}" if 'nfev' in result else ''
+    return (f"{result['scenario']:>22} {result['n_spectra']:>7}  {result['seconds']:10.4f} s"
+            f"  {result['spectra_per_second']:12.1f} /s  {memory}{nfev}")
+
+
+def compare(old, new):
+    """
+    old, new: reports (or JSON paths) from run
+    returns rows of scenario, n_spectra, old and new seconds and the speedup (old / new)
+    """
+    if isinstance(old, (str, os.PathLike)):
+        with open(old) as f:
+            old = json.load(f)
+    if isinstance(new, (str, os.PathLike)):
+        with open(new) as f:
+            new = json.load(f)
+    old_seconds = {(r['scenario'], r['n_spectra']): r['seconds'] for r in old['results']}
+    rows = []
+    for r in new['results']:
+        key = (r['scenario'], r['n_spectra'])
+        if key in old_seconds:
+            rows.append({
+                'scenario': key[0],
+                'n_spectra': key[1],
+                'old_seconds': old_seconds[key],
+                'new_seconds': r['seconds'],
+                'speedup': old_seconds[key] / r['seconds'] if r['seconds'] > 0 else None,
+            })
+    return rows
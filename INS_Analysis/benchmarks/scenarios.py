@@ -0,0 +1,144 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from .. import Spectrum
+from ..areas import calcPeakAreas, calcPeakAreasBatch
+from ..calibration import applyCalibrationAreas, calibrate
+from ..Spectrum.readMCTAL import clear_mctal_cache
+from ..tools import instrument
+from .synthetic import line_areas, make_spectra, write_mca, write_mctal
+
+areas_geb = [-0.0073, 0.078, 0]
+
+
+# each scenario is a setup(n, seed, n_channels, directory) -> state,
+# untimed, and a run(state) -> dict of extra metrics, timed
+
+def setup_spectra(n, seed, n_channels, directory):
+    bins, counts, concentrations = make_spectra(n, n_channels=n_channels, seed=seed)
+    return {'bins': bins, 'counts': counts, 'concentrations': concentrations}
+
+
+def fit_each(state):
+    failed = 0
+    for vals in state['counts']:
+        try:
+            calcPeakAreas(state['bins'], vals, geb=areas_geb)
+        except Exception:
+            failed += 1
+    return failed
+
+
+def run_calcPeakAreas(state):
+    return {'failed': fit_each(state)}
+
+
+def run_calcPeakAreasRecorded(state):
+    # the same fits recorded, its time against calcPeakAreas is the recorder's cost
+    nfev = {'total': 0}
+
+    def count(record):
+        nfev['total'] += record.get('nfev', 0)
+
+    with instrument.record(hooks=[count]):
+        failed = fit_each(state)
+    return {'nfev': nfev['total'], 'failed': failed}
+
+
+def run_calcPeakAreasBatch(state):
+    areas, weights, failed, info = calcPeakAreasBatch(
+        state['bins'], state['counts'], geb=areas_geb, returnInfo=True)
+    nfev = sum(int(window['nfev'].sum()) for window in info.values())
+    return {'nfev': nfev, 'failed': int(failed.sum())}
+
+
+def setup_calibration(n, seed, n_channels, directory):
+    # areas straight from the line model, fitting that many spectra is not what is timed
+    _, _, concentrations = make_spectra(n, n_channels=8, seed=seed)
+    _, _, reference = make_spectra(100, n_channels=8, seed=seed + 1)
+    return {
+        'areas': line_areas(concentrations, seed=seed),
+        'concentrations': concentrations,
+        'calibration': calibrate(line_areas(reference, seed=seed + 1), reference),
+    }
+
+
+def run_calibrate(state):
+    calibrate(state['areas'], state['concentrations'])
+    return {}
+
+
+def run_applyCalibrationAreas(state):
+    applyCalibrationAreas(state['areas'], state['calibration'])
+    return {}
+
+
+def setup_mca_files(n, seed, n_channels, directory):
+    bins, counts, _ = make_spectra(n, n_channels=n_channels, seed=seed)
+    paths = []
+    for i, vals in enumerate(counts):
+        path = os.path.join(directory, f'{i:06d}.mca')
+        write_mca(path, vals, gain=bins[1] - bins[0])
+        paths.append(path)
+    return {'paths': paths, 'directory': directory}
+
+
+def run_read_mca(state):
+    for path in state['paths']:
+        Spectrum.read(path, cache=False)
+    return {}
+
+
+def run_read_many(state):
+    Spectrum.read_many(state['directory'])
+    return {}
+
+
+def setup_mctal(n, seed, n_channels, directory):
+    bins, counts, _ = make_spectra(n, n_channels=n_channels, seed=seed)
+    path = os.path.join(directory, 'benchmark.mctal')
+    write_mctal(path, bins, counts)
+    return {'path': path, 'n': n}
+
+
+def run_read_mctal(state):
+    clear_mctal_cache()
+    for t in range(state['n']):
+        Spectrum.read(state['path'], start_time_bin=t, cache=False)
+    return {}
+
+
+scenarios = {
+    'calcPeakAreas': (setup_spectra, run_calcPeakAreas),
+    'calcPeakAreasRecorded': (setup_spectra, run_calcPeakAreasRecorded),
+    'calcPeakAreasBatch': (setup_spectra, run_calcPeakAreasBatch),
+    'calibrate': (setup_calibration, run_calibrate),
+    'applyCalibrationAreas': (setup_calibration, run_applyCalibrationAreas),
+    'readMCA': (setup_mca_files, run_read_mca),
+    'read_many': (setup_mca_files, run_read_many),
+    'readMCTAL': (setup_mctal, run_read_mctal),
+}
+
+# fewest spectra a scenario can run on
+min_spectra = {
+    'calibrate': 3,
+}
+
+# largest default size of each scenario, keeps a default run to minutes
+default_max_spectra = {
+    'calcPeakAreas': 1000,
+    'calcPeakAreasRecorded': 1000,
+    'calcPeakAreasBatch': 10000,
+    'calibrate': 100000,
+    'applyCalibrationAreas': 100000,
+    'readMCA': 10000,
+    'read_many': 10000,
+    'readMCTAL': 1000,
+}
+
+
+@contextmanager
+def scratch_directory():
+    with tempfile.TemporaryDirectory(prefix='ins_benchmark_') as directory:
+        yield directory
@@ -0,0 +1,124 @@
+import numpy as np
+
+from ..tools import fitting_functions as ff
+
+default_geb = {'a': -0.0073, 'b': 0.078, 'c': 0}
+
+# gamma lines (MeV) and counts per channel at the peak per unit concentration
+lines = {
+    'Si 1.78': {'energy': 1.779, 'element': 'Si', 'amplitude': 1000},
+    'C 4.44': {'energy': 4.439, 'element': 'C', 'amplitude': 2500},
+    'Si 4.50': {'energy': 4.497, 'element': 'Si', 'amplitude': 250},
+}
+concentration_ranges = {'Si': (0.15, 0.45), 'C': (0.0, 0.08)}
+
+
+def make_spectra(
+        n_spectra=1,
+        n_channels=2048,
+        seed=0,
+        emax=8.0,
+        geb=default_geb,
+        intensity=1.0,
+        ):
+    """
+    Seeded MINS-like spectra: an exponential falloff on a flat background,
+    the Si 1.78 MeV and C/Si 4.44/4.50 MeV lines as gaussians with widths from geb,
+    all Poisson sampled.
+
+    n_channels: channels between 0 and emax MeV
+    intensity: scales every count, lower is noisier
+
+    returns bins, counts ((n_spectra, n_channels) int32) and concentrations
+    ((n_spectra, 2), Si and C, the columns of calibrate's true_concentrations)
+    """
+    rng = np.random.default_rng(seed)
+    bins = np.linspace(0, emax, n_channels)
+    concentrations = np.stack([
+        rng.uniform(*concentration_ranges['Si'], n_spectra),
+        rng.uniform(*concentration_ranges['C'], n_spectra),
+    ], axis=-1)
+    element_column = {'Si': 0, 'C': 1}
+
+    falloff = rng.uniform(350, 450, (n_spectra, 1)) * np.exp(-bins / rng.uniform(2.3, 2.7, (n_spectra, 1)))
+    expected = falloff + rng.uniform(15, 25, (n_spectra, 1))
+    for line in lines.values():
+        sigma = ff.geb(line['energy'], geb['a'], geb['b'], geb['c'])
+        amplitude = line['amplitude'] * concentrations[:, element_column[line['element']], None]
+        expected += ff.gaus(bins, line['energy'], amplitude, sigma)
+
+    counts = rng.poisson(expected * intensity).astype(np.int32)
+    return bins, counts, concentrations
+
+
+def line_areas(concentrations, geb=default_geb, noise=0.02, seed=0):
+    """
+    (n, 2) Si1 and Si2C1 window areas the lines of make_spectra would give
+    for concentrations, with relative gaussian noise
+    """
+    rng = np.random.default_rng(seed)
+    window_lines = {0: ['Si 1.78'], 1: ['C 4.44', 'Si 4.50']}
+    element_column = {'Si': 0, 'C': 1}
+    areas = np.zeros((len(concentrations), 2))
+    for column, names in window_lines.items():
+        for name in names:
+            line = lines[name]
+            sigma = ff.geb(line['energy'], geb['a'], geb['b'], geb['c'])
+            areas[:, column] += line['amplitude'] * sigma * np.sqrt(np.pi) * concentrations[:, element_column[line['element']]]
+    return areas * rng.normal(1, noise, areas.shape)
+
+
+def write_mca(path, counts, gain=None):
+    """
+    writes counts as a PMCA style .mca file, calibrated with gain (MeV per channel) if given
+    """
+    parts = ['<<PMCA SPECTRUM>>', 'TAG - benchmark', 'LIVE_TIME - 1']
+    if gain is not None:
+        parts += ['<<CALIBRATION>>', 'LABEL - MeV', '0 0', f'{len(counts)-1} {gain*(len(counts)-1)}']
+    parts.append('<<DATA>>')
+    parts.append('\n'.join(map(str, counts)))
+    parts.append('<<END>>')
+    with open(path, 'w') as f:
+        f.write('\n'.join(parts) + '\n')
+
+
+def _mctal_block(values):
+    flat = np.stack([values.ravel(), np.full(values.size, 0.01)], axis=-1).ravel()
+    return '\n'.join(
+        ' ' + ' '.join(f'{v:.5E}' for v in flat[i:i+8])
+        for i in range(0, len(flat), 8)
+    )
+
+
+def write_mctal(path, bins, counts, tally=8, nps=1e9):
+    """
+    writes a MCTAL file holding one tally with a time bin per row of counts
+    (time_bins x energy_bins), values divided by nps as MCNP reports them
+    """
+    n_t, n_e = counts.shape
+    values = np.asarray(counts, dtype=float).T / nps
+    lines = [
+        f'mcnp6.2   6  01/01/00 00:00:00     1            {int(nps)}     {int(nps)}',
+        ' synthetic benchmark problem',
+        'ntal     1',
+        f'    {tally}',
+        f'tally    {tally}   -2    0',
+        '     1 2',
+        'f       1',
+        '     10',
+        'd       1',
+        'u       0',
+        's       0',
+        'm       0',
+        'c       0',
+        f'e       {n_e}',
+        ' ' + ' '.join(f'{b:.5E}' for b in bins),
+        f't       {n_t}',
+        ' ' + ' '.join(f'{b:.5E}' for b in np.arange(1, n_t + 1) * 100.),
+        'vals',
+        _mctal_block(values),
+        f'tfc    1    1    1    1    1    1    1    {n_e}    {n_t}',
+        f'      {int(nps)}   1.0E+00   0.01   1000',
+    ]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
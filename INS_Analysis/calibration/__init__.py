@@ -1,2 +1,7 @@
 from .calibrate import calibrate
-from .calibrate import applyCalibrationAreas
\ No newline at end of file
+from .calibrate import applyCalibrationAreas
+from .calibrate import saveCalibration
+from .calibrate import loadCalibration
+from .resample import bootstrapCalibration
+from .crossval import crossValidateCalibration
+from .incremental import IncrementalCalibration
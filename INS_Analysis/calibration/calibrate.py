@@ -1,54 +1,145 @@
+import json
+
 from scipy.optimize import curve_fit
+from ..areas.configs import windowlabellist
 from ..tools import fitting_functions as ff
 import numpy as np
 
+# models linear in their parameters after a change of variables carry a 'linear' entry:
+# design(x) -> (n, m) matrix the concentrations are linear in, and
+# to_params(coefs) -> (params, d params / d coefs) mapping its m coefficients back,
+# both broadcasting over leading axes of coefs
+
+def k1_design(x):
+    return np.asarray(x, dtype=float)[..., None]
+
+def identity_params(coefs):
+    coefs = np.asarray(coefs, dtype=float)
+    jac = np.broadcast_to(np.eye(coefs.shape[-1]), coefs.shape + coefs.shape[-1:])
+    return coefs, jac
+
+def original_calibration_design(x):
+    # (x1 - k1*x0)/k2 = x1/k2 - x0*k1/k2
+    x = np.asarray(x, dtype=float)
+    return np.stack([x[..., 1], x[..., 0]], axis=-1)
+
+def original_calibration_params(coefs):
+    a, b = np.moveaxis(np.asarray(coefs, dtype=float), -1, 0)
+    params = np.stack([-b/a, 1/a], axis=-1)
+    jac = np.stack([
+        np.stack([b/a**2, -1/a], axis=-1),
+        np.stack([-1/a**2, np.zeros_like(a)], axis=-1),
+    ], axis=-2)
+    return params, jac
+
+def proposed_calibration_a_design(x):
+    x = np.asarray(x, dtype=float)
+    return np.stack([x[..., 1], x[..., 0], np.ones(x.shape[:-1])], axis=-1)
+
+def proposed_calibration_a_params(coefs):
+    coefs = np.asarray(coefs, dtype=float)
+    params, jac = original_calibration_params(coefs[..., :2])
+    params = np.concatenate([params, coefs[..., 2:]], axis=-1)
+    jac = np.concatenate([
+        np.concatenate([jac, np.zeros(coefs.shape[:-1] + (2, 1))], axis=-1),
+        np.concatenate([np.zeros(coefs.shape[:-1] + (1, 2)), np.ones(coefs.shape[:-1] + (1, 1))], axis=-1),
+    ], axis=-2)
+    return params, jac
+
 two_variable_calibrations_indexing = {
     'original': {
         'function': ff.original_calibration,
+        'jacobian': ff.original_calibration_jacobian,
+        'linear': {'design': original_calibration_design, 'to_params': original_calibration_params},
         'params': ['k1', 'k2'],
         'p0': [1, 1]
-    }
+    },
+    'proposed_a': {
+        'function': ff.proposed_calibration_a,
+        'jacobian': ff.proposed_calibration_a_jacobian,
+        'linear': {'design': proposed_calibration_a_design, 'to_params': proposed_calibration_a_params},
+        'params': ['k1', 'k2', 'k3'],
+        'p0': [1, 1, 0]
+    },
 }
 
 single_variable_calibrations_indexing = {
     'original': {
         'function': ff.k1,
+        'jacobian': ff.k1_jacobian,
+        'linear': {'design': k1_design, 'to_params': identity_params},
         'params': ['k1'],
         'p0': [1]
     }
 }
 
+# rows of areas calibrated at a time by applyCalibrationAreas with asArray,
+# keeps the temporaries of a block in cache
+apply_block_rows = 2**16
+
+def fit_linear(model, x, y):
+    """
+    direct least squares for a model with a 'linear' entry
+    returns the parameters and their covariance (scaled by the residual variance, as curve_fit)
+    """
+    design = model['linear']['design'](x)
+    coefs, _, rank, _ = np.linalg.lstsq(design, y, rcond=None)
+    n, m = design.shape
+    dof = n - m
+    if dof > 0 and rank == m:
+        residual = y - design @ coefs
+        coefs_cov = np.linalg.inv(design.T @ design) * (residual @ residual) / dof
+    else:
+        coefs_cov = np.full((m, m), np.inf)
+    params, jac = model['linear']['to_params'](coefs)
+    with np.errstate(invalid='ignore'):
+        cov = jac @ coefs_cov @ jac.T
+    return params, cov
+
+def fit_model(model, x, y, p0=None, solver='auto'):
+    """
+    solver: 'auto' solves models with a linear form directly, 'curve_fit' always iterates
+    returns the parameters and their covariance
+    """
+    if solver == 'auto' and 'linear' in model:
+        return fit_linear(model, x, y)
+    if p0 is None:
+        p0 = model['p0']
+    return curve_fit(model['function'], x, y, p0=p0, jac=model.get('jacobian'), maxfev=10000)
+
 def calibrate(
-        areas: list, 
-        true_concentrations: list[list[float]], 
-        Si1_method: str = 'original', 
+        areas: list,
+        true_concentrations: list[list[float]],
+        Si1_method: str = 'original',
         Si1_p0=None,
         Si2C1_method: str = 'original',
         Si2C1_p0=None,
+        solver: str = 'auto',
         **kwargs):
-    
-    true_concentrations = np.array(true_concentrations)
-    areas = np.array(areas)
-
-    if Si1_p0 is None:
-        Si1_p0 = single_variable_calibrations_indexing[Si1_method]['p0']
-    Si1_curve = single_variable_calibrations_indexing[Si1_method]['function']
-    
-    r_params, c_covs = curve_fit(Si1_curve, areas[:, 0], true_concentrations[:,  0], p0=Si1_p0, maxfev=10000)
-    
+    """
+    solver: 'auto' solves models linear in their parameters (after a change of
+        variables) by direct least squares and the rest with curve_fit,
+        'curve_fit' uses curve_fit for every model (p0 only applies there)
+
+    the returned calibration also holds the covariance of each method's weights
+    """
+    true_concentrations = np.asarray(true_concentrations, dtype=float)
+    areas = np.asarray(areas, dtype=float)
+
+    Si1_model = single_variable_calibrations_indexing[Si1_method]
+    r_params, Si1_cov = fit_model(Si1_model, areas[:, 0], true_concentrations[:, 0], p0=Si1_p0, solver=solver)
+
     Si1_weights = {}
-    for i, param in enumerate(single_variable_calibrations_indexing[Si1_method]['params']):
+    for i, param in enumerate(Si1_model['params']):
         Si1_weights[param] = r_params[i]
 
-    if Si2C1_p0 is None:
-        Si2C1_p0 = two_variable_calibrations_indexing[Si2C1_method]['p0']
-    Si2C1_curve = two_variable_calibrations_indexing[Si2C1_method]['function']
-    r_params, c_covs = curve_fit(Si2C1_curve, areas, true_concentrations[:, 1], p0=Si2C1_p0, maxfev=10000)
+    Si2C1_model = two_variable_calibrations_indexing[Si2C1_method]
+    r_params, Si2C1_cov = fit_model(Si2C1_model, areas, true_concentrations[:, 1], p0=Si2C1_p0, solver=solver)
 
     Si2C1_weights = {}
-    for i, param in enumerate(two_variable_calibrations_indexing[Si2C1_method]['params']):
+    for i, param in enumerate(Si2C1_model['params']):
         Si2C1_weights[param] = r_params[i]
-        
+
 
     calibration = {
         'methods': {
@@ -58,16 +149,76 @@ def calibrate(
         'weights': {
             'Si1': Si1_weights,
             'Si2C1': Si2C1_weights
-            }
+            },
+        'covariances': {
+            'Si1': Si1_cov,
+            'Si2C1': Si2C1_cov
+            },
     }
     return calibration
 
-def applyCalibrationAreas(areas: list, calibration: dict):
+def check_calibration_windows(labels):
+    """
+    raises ValueError unless labels (the windows of a fit) hold the Si1 and
+    Si2C1 windows whose areas applyCalibrationAreas takes
+    """
+    missing = [label for label in windowlabellist if label not in labels]
+    if missing:
+        raise ValueError(f'a calibration takes the areas of the Si1 and Si2C1 windows, the fit settings leave out {", ".join(missing)}')
+
+def applyCalibrationAreas(areas: list, calibration: dict, asArray: bool = False, out=None):
+    """
+    areas: rows of Si1 and Si2C1 areas, shape (n, 2)
+    asArray: return an (n, 2) array of Si1 and Si2C1 predictions (written to out if given)
+        rather than [Si1 predictions, Si2C1 predictions] lists
+    """
     Si1_curve = single_variable_calibrations_indexing[calibration['methods']['Si1']]['function']
     Si2C1_curve = two_variable_calibrations_indexing[calibration['methods']['Si2C1']]['function']
     Si1_weights = calibration['weights']['Si1']
     Si2C1_weights = calibration['weights']['Si2C1']
-    Si1_areas = [area[0] for area in areas]
-    Si1_predictions = Si1_curve(Si1_areas, **Si1_weights).tolist()
-    Si2C1_predictions = Si2C1_curve(areas, **Si2C1_weights).tolist()
-    return [Si1_predictions, Si2C1_predictions]
+    areas = np.asarray(areas, dtype=float)
+
+    if not asArray:
+        Si1_predictions = Si1_curve(areas[..., 0], **Si1_weights).tolist()
+        Si2C1_predictions = Si2C1_curve(areas, **Si2C1_weights).tolist()
+        return [Si1_predictions, Si2C1_predictions]
+
+    if out is None:
+        out = np.empty(areas.shape[:-1] + (2,))
+    elif out.shape != areas.shape[:-1] + (2,) or not out.flags.c_contiguous:
+        raise ValueError('out must be a C contiguous array of shape areas.shape[:-1] + (2,)')
+    rows = areas.reshape(-1, areas.shape[-1])
+    out_rows = out.reshape(-1, 2)
+    for start in range(0, len(rows), apply_block_rows):
+        block = rows[start:start+apply_block_rows]
+        out_rows[start:start+apply_block_rows, 0] = Si1_curve(block[:, 0], **Si1_weights)
+        out_rows[start:start+apply_block_rows, 1] = Si2C1_curve(block, **Si2C1_weights)
+    return out
+
+def _plain(value):
+    # numpy values of a calibration as json types
+    if isinstance(value, dict):
+        return {key: _plain(v) for key, v in value.items()}
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+def saveCalibration(calibration: dict, path: str):
+    """
+    writes calibration (as returned by calibrate) to path as JSON
+    """
+    with open(path, 'w') as f:
+        json.dump(_plain(calibration), f, indent=2)
+
+def loadCalibration(path: str) -> dict:
+    """
+    a calibration saved with saveCalibration, ready for applyCalibrationAreas
+    """
+    with open(path) as f:
+        calibration = json.load(f)
+    if 'covariances' in calibration:
+        calibration['covariances'] = {
+            key: None if cov is None else np.asarray(cov, dtype=float)
+            for key, cov in calibration['covariances'].items()
+        }
+    return calibration
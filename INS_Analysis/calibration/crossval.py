@@ -0,0 +1,156 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from ..tools.parallel import chunked, default_chunksize, resolve_n_jobs
+from .calibrate import (
+    fit_model,
+    single_variable_calibrations_indexing,
+    two_variable_calibrations_indexing,
+)
+
+
+def make_folds(n, k=None, seed=None):
+    """
+    k: None (or n) for leave one out, otherwise k shuffled folds of near equal size
+    returns a list of held out row indices
+    """
+    if k is None or k >= n:
+        return [np.array([i]) for i in range(n)]
+    if k < 2:
+        raise ValueError('k must be at least 2')
+    order = np.random.default_rng(seed).permutation(n)
+    return [np.sort(fold) for fold in np.array_split(order, k)]
+
+
+def linear_fold_residuals(model, x, y, folds):
+    """
+    held out residuals of a model with a linear form from the full data fit alone:
+    (I - H_FF)^-1 e_F for every fold F, with H the hat matrix (e_i / (1 - h_ii) leaving one out)
+    """
+    design = model['linear']['design'](x)
+    coefs, _, _, _ = np.linalg.lstsq(design, y, rcond=None)
+    residuals = y - design @ coefs
+    inverse = np.linalg.pinv(design.T @ design)
+    ret = np.empty(len(y))
+    if all(len(fold) == 1 for fold in folds):
+        idx = np.concatenate(folds)
+        leverage = np.einsum('ij,jk,ik->i', design[idx], inverse, design[idx])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ret[idx] = residuals[idx] / (1 - leverage)
+        return ret
+    for fold in folds:
+        hat = design[fold] @ inverse @ design[fold].T
+        try:
+            ret[fold] = np.linalg.solve(np.eye(len(fold)) - hat, residuals[fold])
+        except np.linalg.LinAlgError:
+            ret[fold] = np.nan
+    return ret
+
+
+def _fold_residuals(model, x, y, p0, folds):
+    # refits leaving each fold out, starting from the full data weights
+    ret = []
+    keep = np.ones(len(y), dtype=bool)
+    for fold in folds:
+        keep[:] = True
+        keep[fold] = False
+        try:
+            params = fit_model(model, x[keep], y[keep], p0=p0, solver='curve_fit')[0]
+            ret.append(y[fold] - model['function'](x[fold], *params))
+        except (RuntimeError, ValueError, TypeError):
+            ret.append(np.full(len(fold), np.nan))
+    return ret
+
+
+def fold_residuals(model, x, y, folds, p0=None, solver='auto', executor=None, n_jobs=1):
+    """
+    held out residual of every row, each row predicted by the fit without its fold
+    """
+    if solver == 'auto' and 'linear' in model:
+        return linear_fold_residuals(model, x, y, folds)
+
+    p0 = fit_model(model, x, y, p0=p0, solver=solver)[0]
+    if executor is None:
+        fold_errors = _fold_residuals(model, x, y, p0, folds)
+    else:
+        chunks = chunked(folds, default_chunksize(len(folds), n_jobs))
+        results = executor.map(_fold_residuals, repeat(model), repeat(x), repeat(y), repeat(p0), chunks)
+        fold_errors = [errors for chunk in results for errors in chunk]
+    ret = np.empty(len(y))
+    for fold, errors in zip(folds, fold_errors):
+        ret[fold] = errors
+    return ret
+
+
+def crossValidateCalibration(
+        areas: list,
+        true_concentrations: list[list[float]],
+        Si1_methods=None,
+        Si2C1_methods=None,
+        k=None,
+        seed=None,
+        p0=None,
+        solver: str = 'auto',
+        n_jobs=None,
+        returnResiduals: bool = False):
+    """
+    held out prediction errors of calibration methods, to choose between them
+
+    Si1_methods, Si2C1_methods: methods to compare, every registered one by default
+    k: None for leave one out, otherwise the number of (seeded, shuffled) folds
+    p0: {(target, method): p0} starting weights of curve_fit models
+    solver: see calibrate, models with a linear form are scored from the hat
+        matrix of one fit, the rest are refit per fold (over n_jobs processes)
+        starting from the full data weights
+
+    returns a DataFrame indexed by target and method of the folds, rmse, mae,
+    bias (mean of true - predicted) and max_abs_error, with returnResiduals
+    also {(target, method): held out residual of every row}
+    """
+    import pandas as pd
+
+    areas = np.asarray(areas, dtype=float)
+    true_concentrations = np.asarray(true_concentrations, dtype=float)
+    if Si1_methods is None:
+        Si1_methods = list(single_variable_calibrations_indexing)
+    if Si2C1_methods is None:
+        Si2C1_methods = list(two_variable_calibrations_indexing)
+    p0 = p0 or {}
+
+    cases = [
+        ('Si1', method, single_variable_calibrations_indexing[method], areas[:, 0], true_concentrations[:, 0])
+        for method in Si1_methods
+    ] + [
+        ('Si2C1', method, two_variable_calibrations_indexing[method], areas, true_concentrations[:, 1])
+        for method in Si2C1_methods
+    ]
+    folds = make_folds(len(areas), k, seed)
+
+    n_jobs = resolve_n_jobs(n_jobs)
+    executor = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    residuals = {}
+    try:
+        for target, method, model, x, y in cases:
+            residuals[(target, method)] = fold_residuals(
+                model, x, y, folds, p0=p0.get((target, method)), solver=solver, executor=executor, n_jobs=n_jobs)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    rows = []
+    for (target, method), errors in residuals.items():
+        rows.append({
+            'target': target,
+            'method': method,
+            'folds': len(folds),
+            'rmse': np.sqrt(np.nanmean(errors**2)),
+            'mae': np.nanmean(np.abs(errors)),
+            'bias': np.nanmean(errors),
+            'max_abs_error': np.nanmax(np.abs(errors)),
+        })
+    table = pd.DataFrame(rows).set_index(['target', 'method'])
+    if returnResiduals:
+        return table, residuals
+    return table
@@ -0,0 +1,194 @@
+import copy
+import itertools
+from contextlib import contextmanager
+
+import numpy as np
+
+from .calibrate import (
+    single_variable_calibrations_indexing,
+    two_variable_calibrations_indexing,
+)
+
+
+class RecursiveLeastSquares():
+    """
+    least squares of a model with a 'linear' entry updated one sample at a time
+
+    forgetting: every update scales the weight of the samples before it by this
+        (1 keeps them all equally, below 1 follows drift)
+
+    once the normal equations have full rank P = (X^T W X)^-1 and the
+    coefficients are updated with the usual gain k = P x / (1/w + x^T P x)
+    (after forgetting), removing a sample is the same update with a negative
+    weight w
+    """
+    def __init__(self, model, forgetting=1.0):
+        if 'linear' not in model:
+            raise ValueError('incremental calibration needs a model with a linear form')
+        if not 0 < forgetting <= 1:
+            raise ValueError('forgetting must be in (0, 1]')
+        self.model = model
+        self.forgetting = forgetting
+        self.m = len(model['params'])
+        self.reset()
+
+    def reset(self):
+        self.normal = np.zeros((self.m, self.m))
+        self.moment = np.zeros(self.m)
+        self.squares = 0.0
+        self.P = None
+        self.coefs = None
+        # weighted residual sum of squares and sum of weights
+        self.rss = 0.0
+        self.weight = 0.0
+
+    def design(self, x):
+        return self.model['linear']['design'](x)
+
+    def _try_initialize(self):
+        if np.linalg.matrix_rank(self.normal) < self.m:
+            self.P = self.coefs = None
+            return
+        self.P = np.linalg.inv(self.normal)
+        self.coefs = self.P @ self.moment
+        self.rss = max(self.squares - self.moment @ self.coefs, 0.0)
+
+    def update(self, x, y, weight=1.0):
+        """
+        adds sample (x, y) with weight, forgetting the earlier ones first
+        a negative weight removes a sample added with that weight
+        """
+        d = self.design(x)
+        lam = self.forgetting if weight > 0 else 1.0
+        self.weight = lam*self.weight + weight
+        # the normal equations are kept alongside to start over when underdetermined
+        self.normal = lam*self.normal + weight*np.outer(d, d)
+        self.moment = lam*self.moment + weight*d*y
+        self.squares = lam*self.squares + weight*y*y
+        if self.P is None:
+            self._try_initialize()
+            return
+
+        P = self.P / lam
+        Pd = P @ d
+        leverage = d @ Pd
+        if weight < 0 and 1 + weight*leverage <= 1e-10:
+            # removing the sample leaves too few to determine the coefficients
+            self._try_initialize()
+            return
+        gain = Pd / (1/weight + leverage)
+        error = y - d @ self.coefs
+        self.coefs = self.coefs + gain*error
+        self.P = P - np.outer(gain, Pd)
+        # a priori times a posteriori residual
+        self.rss = max(lam*self.rss + weight*error*(y - d @ self.coefs), 0.0)
+
+    def params(self):
+        """
+        the model parameters and their covariance (scaled by the residual variance)
+        """
+        if self.coefs is None:
+            raise ValueError(f'at least {self.m} independent samples are needed')
+        params, jac = self.model['linear']['to_params'](self.coefs)
+        dof = self.weight - self.m
+        if dof > 0:
+            coefs_cov = self.P * self.rss / dof
+        else:
+            coefs_cov = np.full((self.m, self.m), np.inf)
+        with np.errstate(invalid='ignore'):
+            cov = jac @ coefs_cov @ jac.T
+        return params, cov
+
+
+class IncrementalCalibration():
+    """
+    Calibration updated as reference samples are added or removed, each in
+    constant time, instead of refitting every sample (see calibrate).
+
+    forgetting: weight kept by the earlier samples at every added sample,
+        1 (default) weighs every sample equally and matches calibrate
+    """
+    def __init__(self, Si1_method='original', Si2C1_method='original', forgetting=1.0):
+        self.methods = {'Si1': Si1_method, 'Si2C1': Si2C1_method}
+        self.forgetting = forgetting
+        self.targets = {
+            'Si1': RecursiveLeastSquares(single_variable_calibrations_indexing[Si1_method], forgetting),
+            'Si2C1': RecursiveLeastSquares(two_variable_calibrations_indexing[Si2C1_method], forgetting),
+        }
+        # key -> (areas, concentrations, step added)
+        self.samples = {}
+        self.step = 0
+        self._keys = itertools.count()
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __contains__(self, key):
+        return key in self.samples
+
+    def _update(self, areas, concentrations, weight):
+        self.targets['Si1'].update(areas[0], concentrations[0], weight)
+        self.targets['Si2C1'].update(areas, concentrations[1], weight)
+
+    def add(self, areas, concentrations, keys=None):
+        """
+        areas: [Si1, Si2C1] area pair or rows of them, concentrations likewise
+        keys: a key per sample to remove it by later, counted up by default
+        returns the keys
+        """
+        areas = np.atleast_2d(np.asarray(areas, dtype=float))
+        concentrations = np.atleast_2d(np.asarray(concentrations, dtype=float))
+        if keys is None:
+            keys = [next(self._keys) for _ in range(len(areas))]
+        elif len(keys) != len(areas):
+            raise ValueError('one key per sample is needed')
+        for key in keys:
+            if key in self.samples:
+                raise KeyError(f'sample {key!r} is already in the calibration')
+        for key, a, c in zip(keys, areas, concentrations):
+            self._update(a, c, 1.0)
+            self.step += 1
+            self.samples[key] = (a, c, self.step)
+        return list(keys)
+
+    def remove(self, keys):
+        """
+        takes the samples added under keys back out of the calibration
+        """
+        for key in keys:
+            a, c, step = self.samples.pop(key)
+            if not self.samples:
+                # start clean rather than from the rounding left by the downdates
+                for target in self.targets.values():
+                    target.reset()
+                continue
+            self._update(a, c, -self.forgetting**(self.step - step))
+
+    @contextmanager
+    def atomic(self, keys):
+        """
+        adds and removes of the samples under keys within are undone if it raises
+        """
+        targets = copy.deepcopy(self.targets)
+        step = self.step
+        samples = {key: self.samples[key] for key in keys if key in self.samples}
+        try:
+            yield self
+        except BaseException:
+            for key in keys:
+                self.samples.pop(key, None)
+            self.samples.update(samples)
+            self.targets = targets
+            self.step = step
+            raise
+
+    def calibration(self):
+        """
+        the current calibration, as returned by calibrate
+        """
+        ret = {'methods': dict(self.methods), 'weights': {}, 'covariances': {}}
+        for label, target in self.targets.items():
+            params, cov = target.params()
+            ret['weights'][label] = {param: params[i] for i, param in enumerate(target.model['params'])}
+            ret['covariances'][label] = cov
+        return ret
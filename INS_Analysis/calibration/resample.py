@@ -0,0 +1,155 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+from scipy.stats import norm
+
+from ..tools.parallel import chunked, default_chunksize, resolve_n_jobs
+from .calibrate import (
+    calibrate,
+    fit_model,
+    single_variable_calibrations_indexing,
+    two_variable_calibrations_indexing,
+)
+
+# resamples solved together by the vectorized linear path
+block_resamples = 1024
+
+
+def resample_weights(n, n_resamples, method, rng):
+    """
+    yields blocks of per row weights, one row of n weights per resample
+    bootstrap: multinomial counts of n draws with replacement
+    jackknife: every row but one, n resamples
+    """
+    if method == 'bootstrap':
+        for start in range(0, n_resamples, block_resamples):
+            size = min(block_resamples, n_resamples - start)
+            yield rng.multinomial(n, np.full(n, 1/n), size=size).astype(float)
+    elif method == 'jackknife':
+        for start in range(0, n, block_resamples):
+            weights = np.ones((min(block_resamples, n - start), n))
+            weights[np.arange(len(weights)), start + np.arange(len(weights))] = 0
+            yield weights
+    else:
+        raise ValueError(f'unknown resampling method {method}')
+
+
+def weighted_linear_fits(model, x, y, weights):
+    """
+    parameters of a model with a linear form for every row of weights,
+    from weighted normal equations solved as one stack
+    """
+    design = model['linear']['design'](x)
+    m = design.shape[-1]
+    outer = (design[:, :, None] * design[:, None, :]).reshape(len(design), m*m)
+    xtx = (weights @ outer).reshape(-1, m, m)
+    xty = weights @ (design * y[:, None])
+    try:
+        coefs = np.linalg.solve(xtx, xty[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        coefs = (np.linalg.pinv(xtx) @ xty[..., None])[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        params, _ = model['linear']['to_params'](coefs)
+    return params
+
+
+def _curve_fit_resamples(model, x, y, p0, weights):
+    # one fit per row of weights, rows repeated by their weight
+    ret = np.full((len(weights), len(model['params'])), np.nan)
+    for i, w in enumerate(weights):
+        idx = np.repeat(np.arange(len(w)), w.astype(int))
+        try:
+            ret[i] = fit_model(model, x[idx], y[idx], p0=p0, solver='curve_fit')[0]
+        except (RuntimeError, ValueError, TypeError):
+            pass
+    return ret
+
+
+def fit_resamples(model, x, y, weight_blocks, p0=None, solver='auto', executor=None, n_jobs=1):
+    """
+    (n_resamples, n_params) parameters of model refit on each resample
+    """
+    if solver == 'auto' and 'linear' in model:
+        return np.concatenate([weighted_linear_fits(model, x, y, w) for w in weight_blocks])
+
+    weights = np.concatenate(list(weight_blocks))
+    if executor is None:
+        return _curve_fit_resamples(model, x, y, p0, weights)
+    chunks = chunked(weights, default_chunksize(len(weights), n_jobs))
+    results = executor.map(_curve_fit_resamples, repeat(model), repeat(x), repeat(y), repeat(p0), map(np.array, chunks))
+    return np.concatenate(list(results))
+
+
+def bootstrapCalibration(
+        areas: list,
+        true_concentrations: list[list[float]],
+        n_resamples: int = 1000,
+        method: str = 'bootstrap',
+        confidence: float = 0.95,
+        seed=None,
+        Si1_method: str = 'original',
+        Si1_p0=None,
+        Si2C1_method: str = 'original',
+        Si2C1_p0=None,
+        solver: str = 'auto',
+        n_jobs=None,
+        **kwargs):
+    """
+    calibrate plus the distribution of its weights over resampled calibration sets
+
+    method: 'bootstrap' (n_resamples draws of the rows with replacement) or
+        'jackknife' (every row left out once, n_resamples is ignored)
+    confidence: level of the intervals, percentile intervals for the bootstrap
+        and normal ones from the jackknife standard error
+    solver: see calibrate, models solved directly are refit as one vectorized
+        stack, the rest with curve_fit, spread over n_jobs processes when set
+
+    returns the calibration with, for Si1 and Si2C1, the resampled 'samples',
+    'stderr' and 'intervals' (low, high) of each weight
+    """
+    areas = np.asarray(areas, dtype=float)
+    true_concentrations = np.asarray(true_concentrations, dtype=float)
+    calibration = calibrate(
+        areas, true_concentrations,
+        Si1_method=Si1_method, Si1_p0=Si1_p0,
+        Si2C1_method=Si2C1_method, Si2C1_p0=Si2C1_p0,
+        solver=solver)
+
+    targets = {
+        'Si1': (single_variable_calibrations_indexing[Si1_method], areas[:, 0], true_concentrations[:, 0], Si1_p0),
+        'Si2C1': (two_variable_calibrations_indexing[Si2C1_method], areas, true_concentrations[:, 1], Si2C1_p0),
+    }
+
+    n = len(areas)
+    n_jobs = resolve_n_jobs(n_jobs)
+    executor = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    samples = {}
+    try:
+        for label, (model, x, y, p0) in targets.items():
+            # the same seed resamples the same rows for both targets
+            rng = np.random.default_rng(seed)
+            weight_blocks = resample_weights(n, n_resamples, method, rng)
+            samples[label] = fit_resamples(model, x, y, weight_blocks, p0=p0, solver=solver, executor=executor, n_jobs=n_jobs)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    alpha = 1 - confidence
+    calibration['resampling'] = {'method': method, 'n_resamples': len(samples['Si1']), 'confidence': confidence}
+    for key in ('samples', 'stderr', 'intervals'):
+        calibration[key] = {}
+    for label, (model, _, _, _) in targets.items():
+        values = samples[label]
+        estimate = np.array([calibration['weights'][label][p] for p in model['params']])
+        if method == 'jackknife':
+            stderr = np.sqrt((n - 1) / n * np.nansum((values - np.nanmean(values, axis=0))**2, axis=0))
+            z = norm.ppf(1 - alpha/2)
+            low, high = estimate - z*stderr, estimate + z*stderr
+        else:
+            stderr = np.nanstd(values, axis=0, ddof=1)
+            low, high = np.nanpercentile(values, [100*alpha/2, 100*(1 - alpha/2)], axis=0)
+        calibration['samples'][label] = {p: values[:, i] for i, p in enumerate(model['params'])}
+        calibration['stderr'][label] = {p: stderr[i] for i, p in enumerate(model['params'])}
+        calibration['intervals'][label] = {p: (low[i], high[i]) for i, p in enumerate(model['params'])}
+    return calibration
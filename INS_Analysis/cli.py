@@ -0,0 +1,224 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .Spectrum.readMCA import expand_paths
+from .calibration import loadCalibration
+from .sinks import CsvSink, make_sink
+from .tools.parallel import resolve_n_jobs
+from .watcher import analyzeFile, watchDirectory
+
+file_patterns = ('*.mca', '*.mctal')
+# failed files listed in the summary, the rest only counted
+summary_failures = 10
+
+
+def collect_paths(paths, patterns=file_patterns):
+    """
+    paths: files, globs or directories (searched for patterns)
+    """
+    ret = []
+    for path in paths:
+        if os.path.isdir(path):
+            ret += sorted(p for pattern in patterns for p in expand_paths(path, pattern))
+        else:
+            ret += expand_paths(path)
+    return ret
+
+
+def timedAnalyzeFile(filename, calibration, readKwargs, kwargs):
+    """
+    analyzeFile with the seconds it took in the record
+    """
+    start = time.perf_counter()
+    record = analyzeFile(filename, calibration=calibration, readKwargs=readKwargs, **kwargs)
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def runFiles(paths, sink, calibration=None, n_jobs=1, executor=None, maxPending=None, readKwargs=None, **kwargs):
+    """
+    analyzeFile on every path, writing each record to sink as it finishes
+    (in the order they finish), at most maxPending files (4 per job by
+    default) in flight so memory stays flat however many paths there are
+    returns a summary of the files analyzed and failed, the seconds taken,
+    files per second and the (file, error) of the failures
+    n_jobs: None or 1 runs in this process (given no executor), -1 every core
+    kwargs: passed on to calcPeakAreas
+    """
+    sink = make_sink(sink)
+    n_jobs = resolve_n_jobs(n_jobs)
+    summary = {'files': 0, 'analyzed': 0, 'failed': 0, 'seconds': 0.0, 'files_per_second': 0.0, 'failures': []}
+
+    def record_done(record):
+        summary['files'] += 1
+        if record['area_calc_failed']:
+            summary['failed'] += 1
+            summary['failures'].append((record['file'], record['error']))
+        else:
+            summary['analyzed'] += 1
+        sink.write(record)
+
+    start = time.perf_counter()
+    if executor is None and n_jobs == 1:
+        for path in paths:
+            record_done(timedAnalyzeFile(path, calibration, readKwargs, kwargs))
+    else:
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=n_jobs)
+        if maxPending is None:
+            maxPending = 4*n_jobs
+        pending = set()
+        try:
+            for path in paths:
+                if len(pending) >= maxPending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record_done(future.result())
+                pending.add(executor.submit(timedAnalyzeFile, path, calibration, readKwargs, kwargs))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record_done(future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+            if own_executor:
+                executor.shutdown()
+    summary['seconds'] = time.perf_counter() - start
+    if summary['seconds'] > 0:
+        summary['files_per_second'] = summary['files'] / summary['seconds']
+    return summary
+
+
+def format_summary(summary, n_jobs):
+    lines = [
+        f"{summary['files']} files in {summary['seconds']:.2f} s "
+        f"({summary['files_per_second']:.1f} files/s, {n_jobs} jobs): "
+        f"{summary['analyzed']} analyzed, {summary['failed']} failed"
+    ]
+    for filename, error in summary['failures'][:summary_failures]:
+        lines.append(f'  {filename}: {error}')
+    if summary['failed'] > summary_failures:
+        lines.append(f"  ... and {summary['failed'] - summary_failures} more")
+    return '\n'.join(lines)
+
+
+def fit_settings(args):
+    """
+    calcPeakAreas kwargs of the fit options
+    """
+    kwargs = {}
+    if args.geb is not None:
+        kwargs['geb'] = args.geb
+    if args.fix_widths:
+        kwargs['fixWidths'] = True
+    if args.fix_centers:
+        kwargs['fixCenters'] = True
+    if args.peak_search:
+        kwargs['peakSearch'] = True
+    if args.solver is not None:
+        kwargs['solver'] = args.solver
+    if args.maxfev is not None:
+        kwargs['maxfev'] = args.maxfev
+    return kwargs
+
+
+def read_settings(args):
+    """
+    Spectrum.read kwargs of the read options
+    """
+    return {'tally': args.tally} if args.tally is not None else None
+
+
+def open_sink(out):
+    if out == '-':
+        return CsvSink(sys.stdout)
+    return make_sink(out)
+
+
+def run_command(args):
+    paths = collect_paths(args.paths)
+    if not paths:
+        print('ins-analysis: no files found', file=sys.stderr)
+        return 1
+    calibration = loadCalibration(args.calib) if args.calib else None
+    n_jobs = resolve_n_jobs(args.jobs)
+    sink = open_sink(args.out)
+    try:
+        summary = runFiles(
+            paths, sink, calibration=calibration, n_jobs=n_jobs,
+            readKwargs=read_settings(args), **fit_settings(args))
+    finally:
+        sink.close()
+    if not args.quiet:
+        print(format_summary(summary, n_jobs), file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+
+def watch_command(args):
+    calibration = loadCalibration(args.calib) if args.calib else None
+    n_jobs = resolve_n_jobs(args.jobs)
+    start = time.perf_counter()
+    counts = watchDirectory(
+        args.directory, open_sink(args.out), calibration=calibration, duration=args.duration,
+        interval=args.interval, settle=args.settle, n_jobs=n_jobs, maxPending=args.max_pending,
+        maxWait=args.max_wait, existing=args.existing, readKwargs=read_settings(args),
+        **fit_settings(args))
+    if not args.quiet:
+        seconds = time.perf_counter() - start
+        print(f"watched {seconds:.1f} s: {counts['analyzed']} analyzed, "
+              f"{counts['failed']} failed, {counts['skipped']} skipped", file=sys.stderr)
+    return 0
+
+
+def make_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--calib', help='calibration JSON (see saveCalibration) for predicted concentrations')
+    common.add_argument('--jobs', type=int, default=1, help='worker processes, -1 for every core')
+    common.add_argument('--out', default='-',
+                        help='results file, .csv, .parquet (needs pyarrow) or .jsonl; CSV to stdout by default')
+    common.add_argument('--geb', type=float, nargs=3, metavar=('A', 'B', 'C'),
+                        help='gaussian energy broadening, FWHM = A + B*sqrt(E + C*E**2)')
+    common.add_argument('--fix-widths', action='store_true', help='hold peak widths at --geb')
+    common.add_argument('--fix-centers', action='store_true', help='hold peak centers at their targets')
+    common.add_argument('--peak-search', action='store_true', help='move the windows onto the peaks found')
+    common.add_argument('--solver', choices=['auto', 'varpro', 'curve_fit'])
+    common.add_argument('--maxfev', type=int)
+    common.add_argument('--tally', type=int, help='MCTAL tally to read')
+    common.add_argument('--quiet', action='store_true', help='no summary on stderr')
+
+    parser = argparse.ArgumentParser(
+        prog='ins-analysis',
+        description='Peak areas and predicted concentrations of INS spectrum files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser(
+        'run', parents=[common],
+        help='analyze files, streaming a result per file as it finishes',
+        description='Analyzes MCA/MCTAL files in parallel, streaming a result per file as '
+                    'it finishes; exits 1 if any file failed.')
+    run.add_argument('paths', nargs='+', help='files, globs or directories (searched for .mca and .mctal)')
+    run.set_defaults(func=run_command)
+
+    watch = commands.add_parser(
+        'watch', parents=[common],
+        help='analyze the files written to a directory as they are completed',
+        description='Analyzes the MCA/MCTAL files written to a directory as they are completed, until interrupted.')
+    watch.add_argument('directory')
+    watch.add_argument('--interval', type=float, default=1.0, help='seconds between scans')
+    watch.add_argument('--settle', type=float, help='seconds a file must stay unchanged, the interval by default')
+    watch.add_argument('--existing', action='store_true', help='also analyze the files already there')
+    watch.add_argument('--duration', type=float, help='seconds to watch for, until interrupted by default')
+    watch.add_argument('--max-pending', type=int, default=64, help='complete files waiting for a worker at most')
+    watch.add_argument('--max-wait', type=float, help='seconds a file may wait before it is skipped')
+    watch.set_defaults(func=watch_command)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    return args.func(args)
@@ -5,25 +5,36 @@ from .calibration import applyCalibrationAreas
 
 def apply(
         bins,
-        vals,  
+        vals,
         calibration: dict, **kwargs) -> list[float]:
-    
+    """
+    predicted [Si1, Si2C1] concentrations of one spectrum (and its fits with returnFits)
+    kwargs: passed on to calcPeakAreas
+    """
+
     # calculate the areas
     areas = calcPeakAreas(bins, vals, **kwargs)
     fits = None
-    
+
     if isinstance(areas, tuple):
         areas, fits = areas
 
     # apply the calibration
+    predictions = applyCalibrationAreas([[areas['Si1'], areas['Si2C1']]], calibration)
+    predictions = [predictions[0][0], predictions[1][0]]
     if fits:
-        return applyCalibrationAreas(areas, calibration), fits
+        return predictions, fits
     else:
-        return applyCalibrationAreas(areas, calibration)
+        return predictions
 
-def applyFromFile(filename: str, **kwargs) -> list[float]:
+def applyFromFile(filename: str, calibration: dict, readKwargs: dict = None, **kwargs) -> list[float]:
+    """
+    apply on the spectrum in filename
+    readKwargs: passed on to Spectrum.read (e.g. an MCA energy calibration or a MCTAL tally)
+    kwargs: passed on to calcPeakAreas
+    """
     # load the file
-    bins, vals = Spectrum.read(filename, **kwargs)
+    bins, vals = Spectrum.read(filename, **(readKwargs or {}))
 
     # apply the calibration
-    return apply(bins, vals, **kwargs)
\ No newline at end of file
+    return apply(bins, vals, calibration, **kwargs)
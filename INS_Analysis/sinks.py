@@ -0,0 +1,190 @@
+import csv
+import json
+import os
+import socket
+
+import numpy as np
+
+
+def flatten_record(record):
+    """
+    one level {name: value} of a result record, nested dicts joined as
+    {key}_{inner key} (e.g. areas_Si1), numpy scalars and arrays made plain
+    """
+    ret = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            for inner, v in flatten_record(value).items():
+                ret[f'{key}_{inner}'] = v
+        elif isinstance(value, np.generic):
+            ret[key] = value.item()
+        elif isinstance(value, np.ndarray):
+            ret[key] = value.tolist()
+        else:
+            ret[key] = value
+    return ret
+
+
+class JsonlSink():
+    """
+    writes each record as a line of JSON to path (appended), flushed per record
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a')
+
+    def write(self, record):
+        self.file.write(json.dumps(flatten_record(record)) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink():
+    """
+    writes each record as a row of path (or an open text file, left open),
+    flushed per record; the columns are those of the first record (or
+    fields), a file that already has rows is appended to under its own header
+    """
+    def __init__(self, path, fields=None):
+        self.path = path
+        self.fields = fields
+        self.own_file = not hasattr(path, 'write')
+        if self.own_file:
+            exists = os.path.exists(path) and os.path.getsize(path) > 0
+            if self.fields is None and exists:
+                with open(path, newline='') as f:
+                    self.fields = next(csv.reader(f))
+            self.header = not exists
+            self.file = open(path, 'a', newline='')
+        else:
+            self.header = True
+            self.file = path
+        self.writer = None
+
+    def write(self, record):
+        record = flatten_record(record)
+        if self.writer is None:
+            if self.fields is None:
+                self.fields = list(record)
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fields, extrasaction='ignore')
+            if self.header:
+                self.writer.writeheader()
+        self.writer.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        if self.own_file:
+            self.file.close()
+
+
+# parquet column types of the record fields that are not numbers
+record_types = {'file': 'string', 'error': 'string', 'area_calc_failed': 'bool', 'skipped': 'bool'}
+
+
+class ParquetSink():
+    """
+    writes the records to a parquet file at path (needs pyarrow), a row group
+    of rowGroupSize records at a time, so at most that many are held
+    the columns are those of the first record, typed by types (record_types
+    by default), bool or string values, and float64 otherwise
+    """
+    def __init__(self, path, types=None, rowGroupSize=1024):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('writing parquet needs pyarrow (pip install pyarrow)') from None
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.types = dict(record_types if types is None else types)
+        self.rowGroupSize = rowGroupSize
+        self.rows = []
+        self.schema = None
+        self.writer = None
+
+    def _schema(self, record):
+        fields = []
+        for key, value in record.items():
+            kind = self.types.get(key)
+            if kind is None:
+                kind = 'bool' if isinstance(value, bool) else 'string' if isinstance(value, str) else 'float64'
+            fields.append((key, self.pa.type_for_alias(kind)))
+        return self.pa.schema(fields)
+
+    def write(self, record):
+        record = flatten_record(record)
+        if self.schema is None:
+            self.schema = self._schema(record)
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.rows.append(record)
+        if len(self.rows) >= self.rowGroupSize:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        if self.writer is not None:
+            self.flush()
+            self.writer.close()
+
+
+class SocketSink():
+    """
+    sends each record as a line of JSON over a TCP connection to (host, port),
+    or a unix socket at path
+    """
+    def __init__(self, address):
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect(address)
+
+    def write(self, record):
+        self.socket.sendall((json.dumps(flatten_record(record)) + '\n').encode())
+
+    def close(self):
+        self.socket.close()
+
+
+class CallbackSink():
+    """
+    calls fn with each record
+    """
+    def __init__(self, fn):
+        self.fn = fn
+
+    def write(self, record):
+        self.fn(record)
+
+    def close(self):
+        pass
+
+
+def make_sink(sink):
+    """
+    sink: an object with write(record) and close(), a function of the record,
+        a .csv, .jsonl or .parquet path, ('host', port) or 'unix:path' for SocketSink
+    """
+    if hasattr(sink, 'write') and hasattr(sink, 'close'):
+        return sink
+    if callable(sink):
+        return CallbackSink(sink)
+    if isinstance(sink, tuple):
+        return SocketSink(sink)
+    if isinstance(sink, str):
+        if sink.startswith('unix:'):
+            return SocketSink(sink[len('unix:'):])
+        if sink.endswith('.csv'):
+            return CsvSink(sink)
+        if sink.endswith('.jsonl') or sink.endswith('.json'):
+            return JsonlSink(sink)
+        if sink.endswith('.parquet'):
+            return ParquetSink(sink)
+    raise ValueError(f'no sink for {sink!r}, give a .csv, .jsonl or .parquet path, an address or a function')
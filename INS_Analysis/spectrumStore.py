@@ -0,0 +1,459 @@
+import os
+import pickle
+from collections.abc import MutableMapping
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from .areas.configs import windowlabellist
+
+# column groups of one float per spectrum and key (window or target)
+column_groups = ('areas', 'true_comp', 'pred_comp')
+flag_columns = ('for_calib', 'area_calc_failed')
+fit_keys = ('bins', 'baseline', 'peak')
+# counts start as the readers' int32, widened only for values that do not fit
+default_counts_dtype = np.int32
+
+
+def _empty_fits():
+    return {window: {k: None for k in fit_keys} for window in windowlabellist}
+
+
+class SpectrumStore():
+    """
+    columnar store of an Analyzer's spectra: every distinct energy grid kept
+    once, the counts of every spectrum one after another in one flat array
+    (each row's from its offset, as long as its grid, no padding), a float
+    column per area and concentration (NaN until set) and a bool column per
+    flag, rows found by label
+    counts keep the integer type they come in (int32 by default), widened to
+    a larger integer or float64 only when a spectrum needs it
+    fits and final weights, of no fixed size, are kept per row in dicts
+    arrays grow by doubling, everything read back is a view of the first len(self) rows
+    """
+    def __init__(self):
+        self.labels = []
+        self.index = {}
+        self.grids = []
+        self.capacity = 0
+        self.grid = self._allocate((0,), int, 0, 'grid')
+        self.counts = self._allocate((0,), default_counts_dtype, 0, 'counts')
+        # counts values in use, past the end of the last spectrum stored
+        self.used = 0
+        self.offsets = self._allocate((0,), np.int64, 0, 'offsets')
+        self.columns = {}
+        self.flags = {name: self._allocate((0,), bool, False, name) for name in flag_columns}
+        # per named run of calcPeakAreasInChunks, what it ran over and the chunks done
+        self.checkpoints = {}
+        self.fits = {}
+        self.weights = {}
+        for group in column_groups:
+            for key in windowlabellist:
+                self.column(group, key)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self.index
+
+    def _allocate(self, shape, dtype, fill, name=None):
+        # name: what the array holds, for stores keeping arrays in files
+        return np.full(shape, fill, dtype=dtype)
+
+    def _grow(self, array, shape, fill, name=None, dtype=None):
+        # dtype: a wider type to copy array into, its own by default
+        grown = self._allocate(shape, array.dtype if dtype is None else dtype, fill, name)
+        grown[tuple(slice(0, n) for n in array.shape)] = array
+        return grown
+
+    def _column_name(self, key):
+        keys = list(self.columns)
+        return f'column{keys.index(key) if key in keys else len(keys)}'
+
+    def flush(self):
+        """
+        writes the store out, nothing to do in memory
+        """
+
+    def reserve(self, n, channels=0):
+        """
+        room for n spectra and channels more counts
+        """
+        size = self.used + channels
+        if size > len(self.counts):
+            self.counts = self._grow(self.counts, (max(size, 2 * len(self.counts), 1024),), 0, 'counts')
+        if n <= self.capacity:
+            return
+        capacity = max(n, 2 * self.capacity, 16)
+        self.offsets = self._grow(self.offsets, (capacity,), 0, 'offsets')
+        self.grid = self._grow(self.grid, (capacity,), 0, 'grid')
+        for key, column in self.columns.items():
+            self.columns[key] = self._grow(column, (capacity,), np.nan, self._column_name(key))
+        for name, flag in self.flags.items():
+            self.flags[name] = self._grow(flag, (capacity,), False, name)
+        self.capacity = capacity
+
+    def _widen(self, vals):
+        # counts of a type holding vals: integers that fit keep the current type
+        dtype = self.counts.dtype
+        if np.can_cast(vals.dtype, dtype, casting='safe'):
+            return
+        if vals.dtype.kind in 'biu' and dtype.kind in 'iu' and vals.size:
+            info = np.iinfo(dtype)
+            if info.min <= vals.min() and vals.max() <= info.max:
+                return
+        wider = np.promote_types(dtype, vals.dtype)
+        if wider != dtype:
+            self.counts = self._grow(self.counts, self.counts.shape, 0, 'counts', wider)
+
+    def _grid_id(self, bins):
+        bins = np.asarray(bins, dtype=float)
+        # spectra mostly come in runs sharing a grid, the last one is checked first
+        for i in range(len(self.grids) - 1, -1, -1):
+            if self.grids[i].shape == bins.shape and np.array_equal(self.grids[i], bins):
+                return i
+        bins = bins.copy()
+        bins.setflags(write=False)
+        self.grids.append(bins)
+        return len(self.grids) - 1
+
+    def add(self, label, bins, vals):
+        """
+        row of label holding the spectrum (bins, vals), a label already
+        stored has its row cleared and reused (its counts rewritten in place
+        when as long as before, else after the last spectrum's)
+        """
+        vals = np.asarray(vals)
+        n_bins = len(np.asarray(bins))
+        if n_bins != len(vals):
+            raise ValueError(f'{label}: {len(vals)} values on {n_bins} bins')
+        grid = self._grid_id(bins)
+        row = self.index.get(label)
+        if row is None:
+            row = len(self.labels)
+            self.reserve(row + 1, len(vals))
+            self.labels.append(label)
+            self.index[label] = row
+            self.offsets[row] = self.used
+            self.used += len(vals)
+        else:
+            self.clear(row)
+            if len(self.bins(row)) != len(vals):
+                self.reserve(len(self.labels), len(vals))
+                self.offsets[row] = self.used
+                self.used += len(vals)
+        self.grid[row] = grid
+        self.set_vals(row, vals)
+        return row
+
+    def set_vals(self, row, vals):
+        """
+        overwrites the counts of row (as many as its bins)
+        """
+        vals = np.asarray(vals)
+        if vals.shape != self.bins(row).shape:
+            raise ValueError(f'{self.labels[row]}: {len(vals)} values on {len(self.bins(row))} bins')
+        self._widen(vals)
+        self.counts[self.offsets[row]:self.offsets[row] + len(vals)] = vals
+
+    def clear(self, row):
+        """
+        drops the results of row
+        """
+        for column in self.columns.values():
+            column[row] = np.nan
+        for flag in self.flags.values():
+            flag[row] = False
+        self.fits.pop(row, None)
+        self.weights.pop(row, None)
+
+    def rows(self, labels):
+        return np.array([self.index[label] for label in labels], dtype=int)
+
+    def bins(self, row):
+        return self.grids[self.grid[row]]
+
+    def vals(self, row):
+        start = self.offsets[row]
+        return self.counts[start:start + len(self.bins(row))]
+
+    def column(self, group, key):
+        """
+        the column of key in group (first len(self) rows), made when missing
+        """
+        column = self.columns.get((group, key))
+        if column is None:
+            column = self._allocate((self.capacity,), float, np.nan, self._column_name((group, key)))
+            self.columns[(group, key)] = column
+        return column[:len(self)]
+
+    def keys(self, group):
+        return [key for g, key in self.columns if g == group]
+
+    def flag(self, name):
+        return self.flags[name][:len(self)]
+
+    def matrix(self, group, keys, rows=None):
+        """
+        (n_rows, len(keys)) values of group, every row when rows is None
+        """
+        if rows is None:
+            rows = slice(None)
+        return np.stack([self.column(group, key)[rows] for key in keys], axis=-1)
+
+    def frame(self):
+        """
+        {name: column} of every float and flag column, views of the store
+        """
+        ret = {}
+        for group, key in self.columns:
+            ret[f'{group}_{key}'] = self.column(group, key)
+        for name in flag_columns:
+            ret[name] = self.flag(name)
+        return ret
+
+
+class MappedSpectrumStore(SpectrumStore):
+    """
+    SpectrumStore kept in directory: counts, offsets, grid ids, columns and flags in
+    .npy files mapped into memory (pages read as they are touched, written
+    back in place), labels, grids, final weights and checkpoints pickled to
+    meta.pkl by flush, which is what opening the directory again picks up
+    fits stay in memory
+    """
+    def __init__(self, directory):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._path('meta', '.pkl')):
+            self._load()
+        else:
+            super().__init__()
+            self.flush()
+
+    def _path(self, name, suffix='.npy'):
+        return os.path.join(self.directory, name + suffix)
+
+    def _allocate(self, shape, dtype, fill, name=None):
+        if name is None or 0 in shape:
+            return super()._allocate(shape, dtype, fill, name)
+        array = open_memmap(self._path(name), mode='w+', dtype=dtype, shape=shape)
+        array[...] = fill
+        return array
+
+    def _grow(self, array, shape, fill, name=None, dtype=None):
+        if name is None or 0 in shape:
+            return super()._grow(array, shape, fill, name, dtype)
+        # filled beside the old file, then moved over it
+        path = self._path(name, '.grow.npy')
+        grown = open_memmap(path, mode='w+', dtype=array.dtype if dtype is None else dtype, shape=shape)
+        grown[...] = fill
+        grown[tuple(slice(0, n) for n in array.shape)] = array
+        grown.flush()
+        os.replace(path, self._path(name))
+        grown.filename = self._path(name)
+        return grown
+
+    def _arrays(self):
+        yield 'counts', self.counts, 0
+        yield 'offsets', self.offsets, 0
+        yield 'grid', self.grid, 0
+        for key, column in self.columns.items():
+            yield self._column_name(key), column, np.nan
+        for name, flag in self.flags.items():
+            yield name, flag, False
+
+    def flush(self):
+        """
+        writes the arrays out, then the rest in one step, so a store
+        opened after a crash holds everything up to the last flush
+        """
+        for _, array, _ in self._arrays():
+            if isinstance(array, np.memmap):
+                array.flush()
+        meta = {
+            'labels': self.labels,
+            'grids': self.grids,
+            'capacity': self.capacity,
+            'used': self.used,
+            'counts_size': len(self.counts),
+            'counts_dtype': self.counts.dtype.str,
+            'columns': list(self.columns),
+            'weights': self.weights,
+            'checkpoints': self.checkpoints,
+        }
+        path = self._path('meta', '.pkl.tmp')
+        with open(path, 'wb') as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path, self._path('meta', '.pkl'))
+
+    def _open(self, name, shape, dtype, fill):
+        if 0 in shape or not os.path.exists(self._path(name)):
+            return np.full(shape, fill, dtype=dtype)
+        return open_memmap(self._path(name), mode='r+')
+
+    def _load(self):
+        with open(self._path('meta', '.pkl'), 'rb') as f:
+            meta = pickle.load(f)
+        self.labels = meta['labels']
+        self.index = {label: row for row, label in enumerate(self.labels)}
+        self.grids = meta['grids']
+        self.weights = meta['weights']
+        self.checkpoints = meta['checkpoints']
+        self.fits = {}
+        capacity = meta['capacity']
+        self.used = meta['used']
+        # a file, unlike meta, is already as grown (or widened) as it got
+        self.counts = self._open('counts', (meta['counts_size'],), meta['counts_dtype'], 0)
+        self.offsets = self._open('offsets', (capacity,), np.int64, 0)
+        self.grid = self._open('grid', (capacity,), int, 0)
+        self.columns = {
+            key: self._open(f'column{i}', (capacity,), float, np.nan)
+            for i, key in enumerate(meta['columns'])
+        }
+        self.flags = {name: self._open(name, (capacity,), bool, False) for name in flag_columns}
+        # arrays of a row per spectrum grown after the last flush are
+        # longer, the rest catch up to them
+        rowArrays = [(name, array, fill) for name, array, fill in self._arrays() if name != 'counts']
+        self.capacity = max(array.shape[0] for _, array, _ in rowArrays)
+        for name, array, fill in rowArrays:
+            if array.shape != (self.capacity,):
+                self._replace(name, self._grow(array, (self.capacity,), fill, name))
+
+    def _replace(self, name, array):
+        if name == 'offsets':
+            self.offsets = array
+        elif name == 'grid':
+            self.grid = array
+        elif name in self.flags:
+            self.flags[name] = array
+        else:
+            for key in self.columns:
+                if self._column_name(key) == name:
+                    self.columns[key] = array
+
+
+def _value(value):
+    return None if np.isnan(value) else float(value)
+
+
+class ColumnView(MutableMapping):
+    """
+    the values of one row of a column group, as the {key: value} dict it replaces
+    """
+    def __init__(self, store, group, row):
+        self.store = store
+        self.group = group
+        self.row = row
+
+    def __getitem__(self, key):
+        if (self.group, key) not in self.store.columns:
+            raise KeyError(key)
+        return _value(self.store.column(self.group, key)[self.row])
+
+    def __setitem__(self, key, value):
+        self.store.column(self.group, key)[self.row] = np.nan if value is None else value
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def __iter__(self):
+        return iter(self.store.keys(self.group))
+
+    def __len__(self):
+        return len(self.store.keys(self.group))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class SpectrumView(MutableMapping):
+    """
+    one stored spectrum, as the per spectrum dict it replaces
+    (bins, vals, areas, fits, true_comp, pred_comp, weights and flags)
+    """
+    fields = ('bins', 'vals') + column_groups + ('fits', 'weights') + flag_columns
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, field):
+        store, row = self.store, self.row
+        if field == 'bins':
+            return store.bins(row)
+        if field == 'vals':
+            return store.vals(row)
+        if field in column_groups:
+            return ColumnView(store, field, row)
+        if field == 'fits':
+            return store.fits.setdefault(row, _empty_fits())
+        if field == 'weights':
+            return store.weights.setdefault(row, {})
+        if field in flag_columns:
+            return bool(store.flags[field][row])
+        raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        store, row = self.store, self.row
+        if field == 'bins':
+            store.add(store.labels[row], value, store.vals(row))
+        elif field == 'vals':
+            store.set_vals(row, value)
+        elif field in column_groups:
+            view = ColumnView(store, field, row)
+            for key in list(view):
+                view[key] = None
+            view.update(value)
+        elif field == 'fits':
+            store.fits[row] = value
+        elif field == 'weights':
+            store.weights[row] = value
+        elif field in flag_columns:
+            store.flags[field][row] = value
+        else:
+            raise KeyError(field)
+
+    def __delitem__(self, field):
+        raise TypeError('stored spectra have fixed fields')
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class SpectrumsView(MutableMapping):
+    """
+    label: SpectrumView of every spectrum in a SpectrumStore, Analyzer.spectrums
+    spectra are set as the dicts it held ({'bins', 'vals'} and any other
+    SpectrumView field), stored by SpectrumStore.add, but not removed
+    """
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, label):
+        return SpectrumView(self.store, self.store.index[label])
+
+    def __setitem__(self, label, spectrum):
+        row = self.store.add(label, spectrum['bins'], spectrum['vals'])
+        view = SpectrumView(self.store, row)
+        for field, value in spectrum.items():
+            if field not in ('bins', 'vals'):
+                view[field] = value
+
+    def __delitem__(self, label):
+        raise TypeError('spectra are not removed from a SpectrumStore')
+
+    def __iter__(self):
+        return iter(self.store.labels)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, label):
+        return label in self.store.index
@@ -0,0 +1,117 @@
+from collections import deque
+
+import numpy as np
+
+from .areas import calcPeakAreas
+from .areas.fitPlan import settings_plan
+from .calibration import applyCalibrationAreas
+from .calibration.calibrate import check_calibration_windows
+from .Spectrum.readMCTAL import parseMCTAL
+
+
+def rolling_sums(rows, width=1, step=1):
+    """
+    sums of width consecutive rows, one every step rows, taken as differences
+    of running prefix sums so no window is summed twice
+    rows: iterable of equal length arrays, read one at a time
+    width: rows per sum, None for every row so far
+    yields (start, stop, sum), stop exclusive
+    """
+    if width is not None and width < 1 or step < 1:
+        raise ValueError('width and step must be at least 1')
+    # prefix sums of the last width rows, prefix[0] ends where the window starts
+    prefix = deque(maxlen=(width or 0) + 1)
+    total = None
+    for stop, row in enumerate(rows, 1):
+        row = np.asarray(row, dtype=float)
+        if total is None:
+            total = np.zeros_like(row)
+            prefix.append(total)
+        total = total + row
+        prefix.append(total)
+        if width is None:
+            if stop % step == 0:
+                yield 0, stop, total
+        elif stop >= width and (stop - width) % step == 0:
+            yield stop - width, stop, total - prefix[0]
+
+
+def iterTimeSpectra(file, tally=8, width=1, step=1, start_time_bin=0, end_time_bin=None, nps=1e9):
+    """
+    yields one spectrum per window of time bins of a MCTAL tally,
+    as a dict of start and stop (time bin indices, stop exclusive),
+    time (the upper edges of the first and last time bin), bins and vals
+
+    width: time bins per spectrum, None for everything since start_time_bin
+    step: time bins between the starts of consecutive spectra
+    """
+    t = parseMCTAL(file)[tally]
+    time_energy = t.time_energy()
+    tbins = t.tbins
+    if end_time_bin is None:
+        end_time_bin = len(time_energy) - 1
+    rows = (time_energy[i] * nps for i in range(start_time_bin, end_time_bin + 1))
+
+    for start, stop, vals in rolling_sums(rows, width=width, step=step):
+        start += start_time_bin
+        stop += start_time_bin
+        yield {
+            'start': start,
+            'stop': stop,
+            'time': (tbins[start], tbins[stop-1]) if len(tbins) else None,
+            'bins': t.ebins,
+            'vals': vals,
+        }
+
+
+def analyzeTimeSpectra(spectra, calibration=None, returnFits=False, **kwargs):
+    """
+    runs each spectrum dict of spectra (see iterTimeSpectra) through calcPeakAreas
+    and, given a calibration, applyCalibrationAreas, one at a time
+
+    yields the spectrum's dict without vals, with areas, pred_comp
+    (None without a calibration), area_calc_failed and fits when returnFits
+    kwargs: passed on to calcPeakAreas
+    raises ValueError given a calibration and fit settings without its windows
+    """
+    if calibration is not None:
+        check_calibration_windows(settings_plan(**kwargs).labels)
+    for spectrum in spectra:
+        record = {k: v for k, v in spectrum.items() if k not in ('bins', 'vals')}
+        record['areas'] = None
+        record['pred_comp'] = None
+        try:
+            res = calcPeakAreas(spectrum['bins'], spectrum['vals'], returnFits=returnFits, **kwargs)
+        except Exception:
+            record['area_calc_failed'] = True
+            yield record
+            continue
+        record['area_calc_failed'] = False
+        if returnFits:
+            res, record['fits'] = res
+        record['areas'] = res
+        if calibration is not None:
+            pred = applyCalibrationAreas([[res['Si1'], res['Si2C1']]], calibration)
+            record['pred_comp'] = {'Si1': pred[0][0], 'Si2C1': pred[1][0]}
+        yield record
+
+
+def analyzeTimeSeries(
+        file,
+        calibration=None,
+        tally=8,
+        width=1,
+        step=1,
+        start_time_bin=0,
+        end_time_bin=None,
+        nps=1e9,
+        returnFits=False,
+        **kwargs):
+    """
+    area and concentration time series of a MCTAL tally, computed lazily
+    window by window, see iterTimeSpectra and analyzeTimeSpectra
+    """
+    spectra = iterTimeSpectra(
+        file, tally=tally, width=width, step=step,
+        start_time_bin=start_time_bin, end_time_bin=end_time_bin, nps=nps)
+    return analyzeTimeSpectra(spectra, calibration=calibration, returnFits=returnFits, **kwargs)
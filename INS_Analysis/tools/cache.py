@@ -0,0 +1,152 @@
+import hashlib
+import os
+import threading
+import types
+import uuid
+
+import numpy as np
+
+
+def _code_repr(code):
+    consts = ','.join(_code_repr(c) if isinstance(c, types.CodeType) else repr(c) for c in code.co_consts)
+    return f'{hashlib.sha1(code.co_code).hexdigest()}({consts})({",".join(code.co_names)})'
+
+
+def _function_repr(fn, seen):
+    name = f'{fn.__module__}.{fn.__qualname__}'
+    if id(fn) in seen:
+        return name
+    seen = seen | {id(fn)}
+    cells = []
+    for cell in fn.__closure__ or ():
+        try:
+            cells.append(cell.cell_contents)
+        except ValueError:
+            cells.append(None)
+    return (f'{name}:{_code_repr(fn.__code__)}'
+            f':{stable_repr(fn.__defaults__, seen)}:{stable_repr(cells, seen)}')
+
+
+def stable_repr(value, _seen=frozenset()):
+    """
+    repr of value that is the same across processes and runs,
+    arrays are reduced to a digest of their bytes and python functions
+    to their name, code, defaults and closure
+    """
+    if isinstance(value, dict):
+        return '{' + ','.join(f'{stable_repr(k, _seen)}:{stable_repr(value[k], _seen)}' for k in sorted(value, key=repr)) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(stable_repr(v, _seen) for v in value) + ']'
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        return f'ndarray({value.dtype.str},{value.shape},{hashlib.sha1(value.tobytes()).hexdigest()})'
+    if isinstance(value, np.generic):
+        return repr(value.item())
+    if isinstance(value, types.FunctionType):
+        return _function_repr(value, _seen)
+    if callable(value) and hasattr(value, '__qualname__'):
+        return f'{getattr(value, "__module__", "")}.{value.__qualname__}'
+    return repr(value)
+
+
+def hash_key(*parts):
+    return hashlib.sha1(stable_repr(parts).encode()).hexdigest()
+
+
+class DiskCache():
+    """
+    Directory of cache entries, one file per key, capped at max_bytes.
+    A file's modification time marks its last use and the least recently
+    used entries are evicted first. Writes go to a temporary file that is
+    renamed into place, so concurrent readers never see a partial entry.
+    """
+    def __init__(self, directory, max_bytes=2**30, suffix=''):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def load(self, key, loader):
+        """
+        loader(path) for a cached key, None on a miss or an unreadable entry
+        """
+        path = self.path(key)
+        try:
+            value = loader(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def store(self, key, writer):
+        """
+        writer(file) writes the entry for key into an open binary file
+        """
+        path = self.path(key)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                writer(f)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def entries(self):
+        """
+        (mtime, size, path) of every entry, oldest first
+        """
+        ret = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(self.suffix) or entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                ret.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        ret.sort()
+        return ret
+
+    def evict(self):
+        entries = self.entries()
+        size = sum(e[1] for e in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            self._remove(path)
+            size -= entry_size
+        with self._lock:
+            self._size = size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self._remove(path)
+        with self._lock:
+            self._size = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
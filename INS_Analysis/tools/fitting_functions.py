@@ -1,4 +1,8 @@
+import weakref
+
 import numpy as np
+from scipy.integrate import quad
+from scipy.special import erf
 
 def geb(x, a, b, c):
     return (a+b*np.sqrt(x+c*(x*x)))*0.60056120439322
@@ -45,28 +49,202 @@ def const(x, x0):
 def k1(x, k1):
     return np.multiply(x, k1)
 
+# calibrations take x of shape (..., 2), Si1 and Si2C1 areas in the last axis
 def original_calibration(x, k1, k2):
-    def f(x):
-        return (x[1]-k1*x[0])/k2
-    ret = np.apply_along_axis(f, -1, x)
-    return ret
+    x = np.asarray(x, dtype=float)
+    return (x[..., 1]-k1*x[..., 0])/k2
 
 def proposed_calibration_a(x, k1, k2, k3):
-    def f(x):
-        return (x[1]-k1*x[0])/k2+k3
-    ret = np.apply_along_axis(f, -1, x)
-    return ret
+    x = np.asarray(x, dtype=float)
+    return (x[..., 1]-k1*x[..., 0])/k2+k3
 
-def generate_compound_sum(fitting_functions, weight_lens):
+# analytic forms, keyed by fitting function
+# integral(lo, hi, *weights) -> area between lo and hi
+# jacobian(x, *weights) -> array of shape x.shape + (len(weights),)
+# (x.shape[:-1] + (len(weights),) for the calibrations, whose x has a trailing area axis)
+# weak keys so the compound sums built for every fit do not pile up
+analytic_integrals = weakref.WeakKeyDictionary()
+analytic_jacobians = weakref.WeakKeyDictionary()
+
+# weights each fitting function is linear in (by index): the function is the sum
+# of those weights times its jacobian columns for them, which do not depend on them
+linear_weights = weakref.WeakKeyDictionary()
+
+def register_integral(fn, integral):
+    analytic_integrals[fn] = integral
+
+def register_jacobian(fn, jacobian):
+    analytic_jacobians[fn] = jacobian
+
+def register_linear_weights(fn, indices):
+    linear_weights[fn] = tuple(indices)
+
+def get_linear_weights(fn):
+    return linear_weights.get(fn)
+
+def get_integral(fn):
+    return analytic_integrals.get(fn)
+
+def get_jacobian(fn):
+    return analytic_jacobians.get(fn)
+
+def stack_jacobian(*columns):
+    return np.stack(np.broadcast_arrays(*columns), axis=-1)
+
+def integrate(fn, lo, hi, weights):
     """
-    fitting_functions: list of fitting functions
-    weight_lens: list of lengths of weights
+    area of fn between lo and hi, closed form when fn has a registered integral
     """
-    
+    integral = get_integral(fn)
+    if integral is not None:
+        return integral(lo, hi, *weights)
+    return quad(fn, lo, hi, args=tuple(weights))[0]
+
+def gaus_integral(lo, hi, x0, a, sigma):
+    return a*sigma*np.sqrt(np.pi)/2*(erf((hi-x0)/sigma)-erf((lo-x0)/sigma))
+
+def gaus_jacobian(x, x0, a, sigma):
+    e = np.exp(-(x-x0)**2/(sigma**2))
+    return stack_jacobian(a*e*2*(x-x0)/sigma**2, e, a*e*2*(x-x0)**2/sigma**3)
+
+def lorentz_integral(lo, hi, x0, a, gamma):
+    return a*gamma*(np.arctan((hi-x0)/gamma)-np.arctan((lo-x0)/gamma))
+
+def lorentz_jacobian(x, x0, a, gamma):
+    u = (x-x0)/gamma
+    d = 1/(1+u**2)
+    return stack_jacobian(2*a*u*d**2/gamma, d, 2*a*u**2*d**2/gamma)
+
+def point_slope_integral(lo, hi, a, b):
+    return a*(hi**2-lo**2)/2+b*(hi-lo)
+
+def point_slope_jacobian(x, a, b):
+    return stack_jacobian(x, np.ones_like(x))
+
+def point_slope_super_integral(lo, hi, a, b, x0):
+    return a*((hi-x0)**2-(lo-x0)**2)/2+b*(hi-lo)
+
+def point_slope_super_jacobian(x, a, b, x0):
+    return stack_jacobian(x-x0, np.ones_like(x), -a*np.ones_like(x))
+
+def exp_falloff_integral(lo, hi, x0, a, p, b):
+    decay = np.exp(-p*(lo-x0))-np.exp(-p*(hi-x0))
+    # p -> 0 limit is a flat line
+    with np.errstate(divide='ignore', invalid='ignore'):
+        area = np.where(p == 0, a*(hi-lo), a*decay/np.where(p == 0, 1, p))
+    return area+b*(hi-lo)
+
+def exp_falloff_jacobian(x, x0, a, p, b):
+    e = np.exp(-p*(x-x0))
+    return stack_jacobian(a*p*e, e, -a*(x-x0)*e, np.ones_like(x))
+
+def x_integral(lo, hi, x0):
+    return x0*(hi**2-lo**2)/2
+
+def x_jacobian(x, x0):
+    return stack_jacobian(x)
+
+def const_integral(lo, hi, x0):
+    return x0*(hi-lo)
+
+def const_jacobian(x, x0):
+    return stack_jacobian(np.ones_like(x))
+
+def k1_jacobian(x, k1):
+    return stack_jacobian(np.asarray(x, dtype=float))
+
+def original_calibration_jacobian(x, k1, k2):
+    x = np.asarray(x, dtype=float)
+    return stack_jacobian(-x[..., 0]/k2, -(x[..., 1]-k1*x[..., 0])/k2**2)
+
+def proposed_calibration_a_jacobian(x, k1, k2, k3):
+    x = np.asarray(x, dtype=float)
+    return stack_jacobian(-x[..., 0]/k2, -(x[..., 1]-k1*x[..., 0])/k2**2, np.ones(x.shape[:-1]))
+
+for _fn, _jacobian in [
+        (k1, k1_jacobian),
+        (original_calibration, original_calibration_jacobian),
+        (proposed_calibration_a, proposed_calibration_a_jacobian),
+        ]:
+    register_jacobian(_fn, _jacobian)
+
+for _fn, _integral, _jacobian in [
+        (gaus, gaus_integral, gaus_jacobian),
+        (lorentz, lorentz_integral, lorentz_jacobian),
+        (point_slope, point_slope_integral, point_slope_jacobian),
+        (point_slope_super, point_slope_super_integral, point_slope_super_jacobian),
+        (exp_falloff, exp_falloff_integral, exp_falloff_jacobian),
+        (x, x_integral, x_jacobian),
+        (const, const_integral, const_jacobian),
+        ]:
+    register_integral(_fn, _integral)
+    register_jacobian(_fn, _jacobian)
+
+for _fn, _indices in [
+        (gaus, (1,)),
+        (lorentz, (1,)),
+        (point_slope, (0, 1)),
+        (point_slope_super, (0, 1)),
+        (exp_falloff, (1, 3)),
+        (x, (0,)),
+        (const, (0,)),
+        ]:
+    register_linear_weights(_fn, _indices)
+
+def weight_slices(weight_lens):
     # generate slice masks for each fitting function from weight_lens
     indexs = []
     for _ in range(len(weight_lens)):
         indexs.append((sum(weight_lens[:_]),sum(weight_lens[:_+1])))
+    return indexs
+
+def generate_compound_jacobian(fitting_functions, weight_lens):
+    """
+    jacobian of the compound sum of fitting_functions,
+    None unless every fitting function has a registered jacobian
+    """
+    jacobians = [get_jacobian(fn) for fn in fitting_functions]
+    if any(jac is None for jac in jacobians):
+        return None
+    indexs = weight_slices(weight_lens)
+
+    def compound_jacobian(x, *args):
+        columns = []
+        for _ in range(len(jacobians)):
+            weights = args[indexs[_][0]:indexs[_][1]]
+            columns.append(jacobians[_](x, *weights))
+        shape = np.broadcast_shapes(*[c.shape[:-1] for c in columns])
+        return np.concatenate([np.broadcast_to(c, shape + c.shape[-1:]) for c in columns], axis=-1)
+    return compound_jacobian
+
+def generate_compound_integral(fitting_functions, weight_lens):
+    """
+    integral of the compound sum of fitting_functions,
+    None unless every fitting function has a registered integral
+    """
+    integrals = [get_integral(fn) for fn in fitting_functions]
+    if any(integral is None for integral in integrals):
+        return None
+    indexs = weight_slices(weight_lens)
+
+    def compound_integral(lo, hi, *args):
+        area = 0
+        for _ in range(len(integrals)):
+            weights = args[indexs[_][0]:indexs[_][1]]
+            area += integrals[_](lo, hi, *weights)
+        return area
+    return compound_integral
+
+def generate_compound_sum(fitting_functions, weight_lens):
+    """
+    fitting_functions: list of fitting functions
+    weight_lens: list of lengths of weights
+
+    the compound sum gets a jacobian, integral and linear weights registered
+    when all of fitting_functions have them
+    """
+    
+    indexs = weight_slices(weight_lens)
 
     def compound_sum(x, *args):
         """
@@ -78,16 +256,52 @@ def generate_compound_sum(fitting_functions, weight_lens):
             weights = args[indexs[_][0]:indexs[_][1]]
             compound_sum += fitting_functions[_](x, *weights)
         return compound_sum
+
+    jacobian = generate_compound_jacobian(fitting_functions, weight_lens)
+    if jacobian is not None:
+        register_jacobian(compound_sum, jacobian)
+    integral = generate_compound_integral(fitting_functions, weight_lens)
+    if integral is not None:
+        register_integral(compound_sum, integral)
+    linear = [get_linear_weights(fn) for fn in fitting_functions]
+    if all(indices is not None for indices in linear):
+        register_linear_weights(compound_sum, [
+            start + i for (start, _), indices in zip(indexs, linear) for i in indices
+        ])
     return compound_sum
 
 def fixed_weight_function(fit_function, weights, fixed_weights_mask):
-    new_weights_index = np.argwhere(fixed_weights_mask == False)
-    new_weights_index = new_weights_index.flatten()
+    """
+    fit_function with the weights under fixed_weights_mask held at their values in weights
+    returns that function of the other weights and their values in weights
+
+    weights is copied, the function takes broadcasting weights like fit_function
+    and gets its jacobian and linear weights registered when fit_function has them
+    (linear weights only when none of them is held)
+    """
+    weights = np.array(weights, dtype=float)
+    new_weights_index = np.flatnonzero(~np.asarray(fixed_weights_mask, dtype=bool))
     new_weights = weights[new_weights_index]
-    
+    held = weights.tolist()
+
+    def full_weights(newargs):
+        args = list(held)
+        for i, arg in zip(new_weights_index, newargs):
+            args[i] = arg
+        return args
+
     def fixed_weight_fn(x, *newargs):
+        return fit_function(x, *full_weights(newargs))
 
-        weights[new_weights_index] = newargs    
-        return fit_function(x, *weights)
-    
-    return fixed_weight_fn, new_weights
\ No newline at end of file
+    jacobian = get_jacobian(fit_function)
+    if jacobian is not None:
+        def fixed_weight_jacobian(x, *newargs):
+            return jacobian(x, *full_weights(newargs))[..., new_weights_index]
+        register_jacobian(fixed_weight_fn, fixed_weight_jacobian)
+    linear = get_linear_weights(fit_function)
+    # a held linear weight leaves an offset, the function is no longer linear in the rest
+    if linear is not None and not np.asarray(fixed_weights_mask, dtype=bool)[list(linear)].any():
+        position = {weight: i for i, weight in enumerate(new_weights_index.tolist())}
+        register_linear_weights(fixed_weight_fn, [position[i] for i in linear if i in position])
+
+    return fixed_weight_fn, new_weights
@@ -0,0 +1,195 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# the active Recorder, None when nothing is recorded
+_recorder = None
+_tags = contextvars.ContextVar('instrument_tags', default={})
+
+# callables given every record of every Recorder, see add_hook
+registered_hooks = []
+
+
+class Recorder():
+    """
+    Collects one record (a dict) per timed stage: the stage name, the tags
+    in effect (spectrum, window, ...), seconds and whatever the stage set
+    (nfev, converged, status, hit, ...).
+    """
+    def __init__(self, hooks=()):
+        self.records = []
+        self.hooks = list(hooks)
+
+    def add(self, record):
+        self.records.append(record)
+        for hook in self.hooks:
+            hook(record)
+        for hook in registered_hooks:
+            hook(record)
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    def table(self):
+        import pandas as pd
+        return pd.DataFrame(self.records)
+
+    def summary(self, by='stage'):
+        """
+        per stage (or by other record columns): calls, total, mean and max seconds,
+        nfev and the number of calls that did not converge
+        """
+        df = self.table()
+        if df.empty:
+            return df
+        for column in ('nfev', 'converged'):
+            if column not in df:
+                df[column] = None
+        df['not_converged'] = df['converged'].eq(False)
+        return df.groupby(by).agg(
+            calls=('seconds', 'size'),
+            seconds=('seconds', 'sum'),
+            mean_seconds=('seconds', 'mean'),
+            max_seconds=('seconds', 'max'),
+            nfev=('nfev', 'sum'),
+            not_converged=('not_converged', 'sum'),
+        )
+
+    def per_spectrum(self):
+        """
+        one row per spectrum label: seconds in each stage, total nfev and
+        whether the fit of every window converged, decided by the last
+        attempt in the window (a failed warm start or varpro fit taken over
+        by the usual fit counts as that fit), a stage that raised as not
+        converged
+        """
+        import pandas as pd
+        df = self.table()
+        if df.empty or 'spectrum' not in df:
+            return pd.DataFrame()
+        df = df[df['spectrum'].notna()]
+        ret = df.pivot_table(index='spectrum', columns='stage', values='seconds', aggfunc='sum')
+        ret.columns = [f'seconds_{stage}' for stage in ret.columns]
+        if 'nfev' in df:
+            ret['nfev'] = df.groupby('spectrum')['nfev'].sum()
+        if 'converged' in df:
+            converged = df['converged'].astype(object)
+            if 'error' in df:
+                converged = converged.where(df['error'].isna(), False)
+            attempts = df.assign(converged=converged)[converged.notna()]
+            if 'window' not in attempts:
+                attempts = attempts.assign(window=None)
+            # records are added as stages end, in the order the attempts ran
+            last = attempts.groupby(['spectrum', 'window'], dropna=False, sort=False)['converged'].last()
+            converged = last.groupby(level='spectrum').agg(lambda c: bool(c.all()))
+            ret['converged'] = [bool(converged.get(label, True)) for label in ret.index]
+        return ret
+
+
+class _NullStage():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **info):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+class _Stage():
+    __slots__ = ('recorder', 'record', 'start')
+
+    def __init__(self, recorder, record):
+        self.recorder = recorder
+        self.record = record
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record['seconds'] = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.record['error'] = exc_type.__name__
+        self.recorder.add(self.record)
+        return False
+
+    def set(self, **info):
+        self.record.update(info)
+
+
+def add_hook(hook):
+    registered_hooks.append(hook)
+
+
+def remove_hook(hook):
+    registered_hooks.remove(hook)
+
+
+def enabled():
+    return _recorder is not None
+
+
+def active_recorder():
+    return _recorder
+
+
+def stage(name, **info):
+    """
+    context manager timing stage name, .set(**info) on it adds to its record
+    does nothing unless a Recorder is active
+    """
+    if _recorder is None:
+        return _null_stage
+    return _Stage(_recorder, {'stage': name, **_tags.get(), **info})
+
+
+@contextmanager
+def _tagged(tags):
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def tags(**tags):
+    """
+    context manager adding tags (spectrum=..., window=...) to the records made inside it
+    """
+    if _recorder is None:
+        return _null_stage
+    return _tagged(tags)
+
+
+def enable(hooks=()):
+    """
+    records every stage from now on, returns the Recorder
+    """
+    global _recorder
+    _recorder = Recorder(hooks)
+    return _recorder
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+@contextmanager
+def record(hooks=()):
+    """
+    with record() as recorder: records the stages run inside the block
+    """
+    global _recorder
+    previous = _recorder
+    _recorder = Recorder(hooks)
+    try:
+        yield _recorder
+    finally:
+        _recorder = previous
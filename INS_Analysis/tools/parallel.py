@@ -0,0 +1,22 @@
+import math
+import os
+
+
+def resolve_n_jobs(n_jobs):
+    """
+    n_jobs: None or 1 for serial, -1 for every core, otherwise a worker count
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def default_chunksize(n_items, n_jobs, chunks_per_job=4):
+    return max(1, math.ceil(n_items / (n_jobs * chunks_per_job)))
+
+
+def chunked(items, chunksize):
+    items = list(items)
+    return [items[i:i+chunksize] for i in range(0, len(items), chunksize)]
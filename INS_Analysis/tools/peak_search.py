@@ -0,0 +1,97 @@
+import numpy as np
+from scipy.ndimage import convolve1d
+
+
+def second_derivative_kernel(width):
+    """
+    negative second derivative of a gaussian of standard deviation width
+    (channels), cut at 4 widths and shifted to sum to zero so straight
+    baselines give no response
+    """
+    half = max(int(np.ceil(4 * width)), 1)
+    x = np.arange(-half, half + 1, dtype=float)
+    kernel = (1 - (x / width)**2) * np.exp(-x**2 / (2 * width**2)) / width**2
+    return kernel - kernel.mean()
+
+
+def _crossing(response, start, step):
+    # fractional channel where response first drops to zero walking from start by step
+    i = start
+    while 0 <= i + step < len(response) and response[i + step] > 0:
+        i += step
+    if not 0 <= i + step < len(response):
+        return None
+    return i + step * response[i] / (response[i] - response[i + step])
+
+
+def _channel_peaks(response, significance, width, min_significance):
+    # maxima of one spectrum's response, at fractional channels, with their standard deviations in channels
+    inner = response[1:-1]
+    maxima = np.flatnonzero(
+        (inner > response[:-2]) & (inner >= response[2:]) & (significance[1:-1] >= min_significance)) + 1
+    channels = []
+    stds = []
+    for i in maxima:
+        left, mid, right = response[i - 1], response[i], response[i + 1]
+        curvature = left - 2 * mid + right
+        channels.append(i + (0.5 * (left - right) / curvature if curvature < 0 else 0))
+        # a gaussian of std s smoothed by width responds between zeros at +-sqrt(s**2 + width**2)
+        lo = _crossing(response, i, -1)
+        hi = _crossing(response, i, 1)
+        if lo is None or hi is None:
+            stds.append(np.nan)
+        else:
+            spread = (hi - lo) / 2
+            stds.append(np.sqrt(max(spread**2 - width**2, 0)))
+    return np.array(channels, dtype=float), np.array(stds, dtype=float), maxima
+
+
+def find_peaks(bins, vals, width=4, min_significance=5):
+    """
+    peaks of vals (one spectrum, or one per row) located by the smoothed
+    second derivative, a single pass of convolutions over the spectrum
+
+    width: standard deviation of the smoothing (channels), about the peaks'
+        own is best
+    min_significance: response over its Poisson standard deviation a peak needs
+
+    returns per spectrum a dict of arrays, by position (energy of the maximum,
+    interpolated), sigma (width as the sigma of fitting_functions.gaus,
+    nan when not resolved from the background), height (smoothed second
+    derivative at the maximum) and significance
+    """
+    bins = np.asarray(bins, dtype=float)
+    vals = np.asarray(vals, dtype=float)
+    kernel = second_derivative_kernel(width)
+    response = convolve1d(vals, kernel, axis=-1, mode='nearest')
+    variance = convolve1d(np.clip(vals, 0, None), kernel**2, axis=-1, mode='nearest')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        significance = np.where(variance > 0, response / np.sqrt(variance), 0)
+
+    channel = np.arange(len(bins), dtype=float)
+    bin_width = np.gradient(bins)
+    ret = []
+    for row_response, row_significance in zip(np.atleast_2d(response), np.atleast_2d(significance)):
+        channels, stds, maxima = _channel_peaks(row_response, row_significance, width, min_significance)
+        ret.append({
+            'position': np.interp(channels, channel, bins),
+            'sigma': stds * np.interp(channels, channel, bin_width) * np.sqrt(2),
+            'height': row_response[maxima],
+            'significance': row_significance[maxima],
+        })
+    if vals.ndim == 1:
+        return ret[0]
+    return ret
+
+
+def match_peaks(positions, targets, tolerance):
+    """
+    index in positions of the peak nearest each target, -1 for none within tolerance
+    """
+    positions = np.asarray(positions, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    if len(positions) == 0:
+        return np.full(len(targets), -1)
+    distance = np.abs(positions[None, :] - targets[:, None])
+    nearest = np.argmin(distance, axis=1)
+    return np.where(distance[np.arange(len(targets)), nearest] <= tolerance, nearest, -1)
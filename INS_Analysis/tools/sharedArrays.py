@@ -0,0 +1,76 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _attach(name):
+    try:
+        # the creating process owns (and unlinks) the block
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedArrays():
+    """
+    named arrays in multiprocessing.shared_memory blocks, made by one process
+    (create) and seen by others from its spec (attach), so workers read and
+    write them in place rather than pickling them
+    the creating process unlinks the blocks, every process closes them
+    """
+    def __init__(self, blocks, spec, owner=False):
+        self.blocks = blocks
+        self.spec = spec
+        self.owner = owner
+        self.arrays = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[name].buf)
+            for name, (_, shape, dtype) in spec.items()
+        }
+
+    @classmethod
+    def create(cls, layout):
+        """
+        layout: {name: (shape, dtype, fill)}
+        """
+        blocks = {}
+        spec = {}
+        try:
+            for name, (shape, dtype, fill) in layout.items():
+                dtype = np.dtype(dtype)
+                size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+                blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+                spec[name] = (blocks[name].name, tuple(shape), dtype.str)
+            ret = cls(blocks, spec, owner=True)
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        for name, (_, _, fill) in layout.items():
+            ret.arrays[name][...] = fill
+        return ret
+
+    @classmethod
+    def attach(cls, spec):
+        return cls({name: _attach(block) for name, (block, _, _) in spec.items()}, spec)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+        if self.owner:
+            for block in self.blocks.values():
+                block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,8 +1,70 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
 def make_window(wave, window_min, window_max):
     """
     Make a window from a wave and a window dict.
     """
-    window_wave = wave[:, 
+    window_wave = wave[:,
         (wave[0] >= window_min) & (wave[0] <= window_max)
         ]
-    return window_wave
\ No newline at end of file
+    return window_wave
+
+
+def window_slices(bins, windows):
+    """
+    slice of the bins inside each (min, max) window (bounds included),
+    None when bins is not ascending
+    """
+    bins = np.asarray(bins)
+    if len(bins) > 1 and np.any(bins[1:] < bins[:-1]):
+        return None
+    lo = np.searchsorted(bins, [w[0] for w in windows], side='left')
+    hi = np.searchsorted(bins, [w[1] for w in windows], side='right')
+    return tuple(slice(int(a), int(max(a, b))) for a, b in zip(lo, hi))
+
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+index_cache_size = 64
+
+
+def window_index(bins, windows):
+    """
+    window_slices, memoized by energy grid and windows so spectra
+    sharing a grid resolve their windows once (keyed on the grid's bytes,
+    compared in full on a hit, so grids colliding in hash stay apart)
+    """
+    bins = np.ascontiguousarray(bins)
+    key = (bins.dtype.str, bins.shape, bins.tobytes(), tuple(windows))
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+
+    slices = window_slices(bins, windows)
+
+    with _index_cache_lock:
+        _index_cache[key] = slices
+        while len(_index_cache) > index_cache_size:
+            _index_cache.popitem(last=False)
+    return slices
+
+
+def cut_windows(bins, vals, windows):
+    """
+    yields the (bins, vals) of each (min, max) window,
+    vals may hold one spectrum per row
+    """
+    slices = window_index(bins, windows)
+    if slices is None:
+        bins = np.asarray(bins)
+        for window in windows:
+            mask = (bins >= window[0]) & (bins <= window[1])
+            yield bins[mask], vals[..., mask]
+        return
+    for s in slices:
+        yield bins[s], vals[..., s]
@@ -0,0 +1,244 @@
+import asyncio
+import fnmatch
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .Spectrum import read
+from .areas import calcPeakAreas
+from .areas.fitPlan import settings_plan
+from .calibration import applyCalibrationAreas
+from .calibration.calibrate import check_calibration_windows
+from .sinks import make_sink
+
+def emptyRecord(filename, calibration=None, **kwargs):
+    """
+    the record analyzeFile starts from, every field there whatever the outcome
+    (so the columns of a run stay the same), areas by window of the fit
+    settings in kwargs, pred_comp only given a calibration
+    """
+    labels = settings_plan(**kwargs).labels
+    return {
+        'file': filename,
+        'areas': dict.fromkeys(labels),
+        'pred_comp': None if calibration is None else dict.fromkeys(('Si1', 'Si2C1')),
+        'area_calc_failed': False,
+        'skipped': False,
+        'error': None,
+    }
+
+
+def analyzeFile(filename, calibration=None, readKwargs=None, **kwargs):
+    """
+    read, calcPeakAreas and (given a calibration) applyCalibrationAreas of
+    one file, as a record of file, areas, pred_comp, area_calc_failed,
+    skipped and error (the message of what failed, None if nothing did)
+    kwargs: passed on to calcPeakAreas
+    raises ValueError given a calibration and fit settings without its windows
+    """
+    record = emptyRecord(filename, calibration, **kwargs)
+    if calibration is not None:
+        check_calibration_windows(record['areas'])
+    try:
+        bins, vals = read(filename, **(readKwargs or {}))
+        areas = calcPeakAreas(bins, vals, **kwargs)
+    except Exception as e:
+        record['area_calc_failed'] = True
+        record['error'] = f'{type(e).__name__}: {e}'
+        return record
+    record['areas'].update(areas)
+    if calibration is not None:
+        pred = applyCalibrationAreas([[areas['Si1'], areas['Si2C1']]], calibration)
+        record['pred_comp'] = {'Si1': pred[0][0], 'Si2C1': pred[1][0]}
+    return record
+
+
+class DirectoryWatcher():
+    """
+    analyzes the spectrum files written to directory as they are completed
+    (see analyzeFile) and writes their records to sink, with the times the
+    file was last modified, found complete and its record ready (modified,
+    detected, finished, seconds since the epoch) and the latency from
+    detected to finished
+
+    a file is complete once its size and modification time held over a scan
+    interval (or settle seconds), a file changed after is analyzed again;
+    files already there at start are skipped unless existing
+    at most maxPending complete files wait for a worker: with the queue full
+    scanning pauses (files stay on disk and are picked up later), so the
+    latency stays within about (maxPending / n_jobs + 1) fits of a scan;
+    with maxWait set, a file that waited longer is written out skipped
+    instead of fit, to catch up
+
+    sink: see sinks.make_sink, an error writing to it stops the watcher
+    executor: runs the fits, a process pool of n_jobs by default
+    kwargs: passed on to calcPeakAreas
+    """
+    def __init__(
+            self,
+            directory,
+            sink,
+            calibration=None,
+            patterns=('*.mca', '*.mctal'),
+            interval=1.0,
+            settle=None,
+            n_jobs=1,
+            executor=None,
+            maxPending=64,
+            maxWait=None,
+            existing=False,
+            readKwargs=None,
+            **kwargs):
+        if calibration is not None:
+            check_calibration_windows(settings_plan(**kwargs).labels)
+        self.directory = directory
+        self.sink = make_sink(sink)
+        self.calibration = calibration
+        self.patterns = tuple(patterns)
+        self.interval = interval
+        self.settle = interval if settle is None else settle
+        self.n_jobs = n_jobs
+        self.executor = executor
+        self.maxPending = maxPending
+        self.maxWait = maxWait
+        self.existing = existing
+        self.readKwargs = readKwargs
+        self.kwargs = kwargs
+        # path: (size, mtime_ns, since when unchanged), for files not yet complete
+        self.pending = {}
+        # path: (size, mtime_ns), for files analyzed (or skipped) as they are
+        self.done = {}
+        self.counts = {'analyzed': 0, 'failed': 0, 'skipped': 0}
+        self._stop = None
+        self._error = None
+
+    def _matches(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    def scan(self, now=None, limit=None):
+        """
+        (path, modified) of the files found complete since the last scan,
+        oldest first, at most limit of them: the rest stay pending, complete,
+        and are returned by a later scan
+        """
+        if now is None:
+            now = time.time()
+        complete = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or not self._matches(entry.name):
+                    continue
+                stat = entry.stat()
+                state = (stat.st_size, stat.st_mtime_ns)
+                if self.done.get(entry.path) == state:
+                    continue
+                last = self.pending.get(entry.path)
+                if last is None or last[:2] != state:
+                    self.pending[entry.path] = state + (now,)
+                elif now - last[2] >= self.settle and stat.st_size > 0:
+                    complete.append((stat.st_mtime_ns, entry.path))
+        complete = sorted(complete)[:limit]
+        for _, path in complete:
+            self.done[path] = self.pending.pop(path)[:2]
+        return [(path, mtime / 1e9) for mtime, path in complete]
+
+    def _skip_existing(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and self._matches(entry.name):
+                    stat = entry.stat()
+                    self.done[entry.path] = (stat.st_size, stat.st_mtime_ns)
+
+    async def _scanner(self, queue):
+        while not self._stop.is_set():
+            # only what the queue has room for, the rest is found on a later scan
+            room = queue.maxsize - queue.qsize() if queue.maxsize > 0 else None
+            if room != 0:
+                detected = time.time()
+                for path, modified in self.scan(now=detected, limit=room):
+                    queue.put_nowait((path, modified, detected))
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, queue, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            path, modified, detected = await queue.get()
+            try:
+                if self.maxWait is not None and time.time() - detected > self.maxWait:
+                    record = emptyRecord(path, self.calibration, **self.kwargs)
+                    record['skipped'] = True
+                    self.counts['skipped'] += 1
+                else:
+                    record = await loop.run_in_executor(
+                        executor, _analyzeFileKwargs, path, self.calibration, self.readKwargs, self.kwargs)
+                    self.counts['failed' if record['area_calc_failed'] else 'analyzed'] += 1
+                finished = time.time()
+                record.update(modified=modified, detected=detected, finished=finished, latency=finished - detected)
+                self.sink.write(record)
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+                self._stop.set()
+            finally:
+                queue.task_done()
+
+    async def run(self, duration=None):
+        """
+        watches until stop() (or for duration seconds), then finishes the
+        files already found complete; returns the counts of files analyzed,
+        failed and skipped
+        """
+        self._stop = asyncio.Event()
+        if not self.existing:
+            self._skip_existing()
+        executor = self.executor
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=self.n_jobs)
+        queue = asyncio.Queue(maxsize=self.maxPending)
+        workers = [asyncio.create_task(self._worker(queue, executor)) for _ in range(self.n_jobs)]
+        try:
+            scanner = asyncio.create_task(self._scanner(queue))
+            if duration is not None:
+                asyncio.get_running_loop().call_later(duration, self._stop.set)
+            await scanner
+            await queue.join()
+            if self._error is not None:
+                raise self._error
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if own_executor:
+                executor.shutdown()
+        return dict(self.counts)
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def close(self):
+        self.sink.close()
+
+
+def _analyzeFileKwargs(filename, calibration, readKwargs, kwargs):
+    # analyzeFile with its calcPeakAreas kwargs as one argument, for run_in_executor
+    return analyzeFile(filename, calibration=calibration, readKwargs=readKwargs, **kwargs)
+
+
+def watchDirectory(directory, sink, calibration=None, duration=None, **kwargs):
+    """
+    runs a DirectoryWatcher (see its settings in kwargs) until interrupted or
+    for duration seconds, closing the sink after; returns the counts of files
+    analyzed, failed and skipped
+    """
+    watcher = DirectoryWatcher(directory, sink, calibration=calibration, **kwargs)
+    try:
+        return asyncio.run(watcher.run(duration=duration))
+    except KeyboardInterrupt:
+        return dict(watcher.counts)
+    finally:
+        watcher.close()
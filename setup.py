@@ -1,10 +1,12 @@
-from setuptools import setup
+from setuptools import find_packages, setup
 setup(
    name='INS_Analysis',
    version='1.0',
    description='Python package for Inelastic Neutron Scattering data analysis',
    author='Jose Andres Cortes',
    author_email='jose.cortes@uta.edu',
-   packages=['INS_Analysis'],  #same as name
+   packages=find_packages(include=['INS_Analysis', 'INS_Analysis.*']),
    install_requires=['pandas', 'numpy', 'scipy'], #external packages as dependencies,
-)
\ No newline at end of file
+   extras_require={'parquet': ['pyarrow']},
+   entry_points={'console_scripts': ['ins-analysis=INS_Analysis.cli:main']},
+)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from scipy.optimize import least_squares
+
+from INS_Analysis import calcPeakAreas, calcPeakAreasBatch
+from INS_Analysis.areas import batchPeakAreas
+from INS_Analysis.benchmarks.synthetic import default_geb, make_spectra
+from INS_Analysis.tools import fitting_functions as ff
+
+geb = [default_geb['a'], default_geb['b'], default_geb['c']]
+
+
+def test_batch_matches_serial_on_linear_windows():
+    # widths and centers held leave one minimum, batch and serial both find it
+    bins, vals, _ = make_spectra(20, seed=1)
+    settings = {'geb': geb, 'fixWidths': True, 'fixCenters': True}
+    areas, _, failed = calcPeakAreasBatch(bins, vals, **settings)
+    assert not failed.any()
+    for i, v in enumerate(vals):
+        serial = calcPeakAreas(bins, v, cache=False, **settings)
+        for label, area in serial.items():
+            assert areas[label][i] == pytest.approx(area, rel=1e-4)
+
+
+def test_batch_matches_serial_on_doublets():
+    # the batch takes curve_fit's steps on every spectrum, the areas agree
+    # to rounding (1e-4 leaves room for where a slowly converging fit stops)
+    bins, vals, _ = make_spectra(24, seed=3)
+    areas, weights, failed, info = calcPeakAreasBatch(bins, vals, geb=geb, returnInfo=True)
+    assert not failed.any()
+    for label in areas:
+        assert (info[label]['status'] > 0).all()
+    for i, v in enumerate(vals):
+        serial, serial_weights = calcPeakAreas(bins, v, cache=False, geb=geb, returnWeights=True)
+        for label, area in serial.items():
+            assert areas[label][i] == pytest.approx(area, rel=1e-4)
+            np.testing.assert_allclose(weights[label]['peak'][i], serial_weights[label]['peak'], rtol=1e-3)
+
+
+def test_batch_trust_region_matches_least_squares_at_bounds():
+    # amplitudes capped below the data's peak end the fit on a bound
+    x = np.linspace(-1, 1, 81)
+    rng = np.random.default_rng(0)
+    true = np.array([[0.1, 5., 0.3], [-0.2, 8., 0.2], [0.3, 3., 0.4]])
+    y = np.array([ff.gaus(x, *w) for w in true]) + rng.normal(0, 0.05, (3, len(x)))
+    p0 = np.array([[0., 1., 0.5]] * 3)
+    lower = np.array([[-1., 0., 0.05]] * 3)
+    upper = np.array([[1., 4., 1.]] * 3)
+    weights, status, nfev = batchPeakAreas.batch_trust_region(
+        ff.gaus, x, y, p0, lower, upper, jac=ff.get_jacobian(ff.gaus))
+    assert (status > 0).all()
+    for i in range(3):
+        res = least_squares(
+            lambda w: ff.gaus(x, *w) - y[i], p0[i], jac=lambda w: ff.gaus_jacobian(x, *w),
+            bounds=(lower[i], upper[i]))
+        np.testing.assert_allclose(weights[i], res.x, rtol=1e-6, atol=1e-9)
+        assert nfev[i] == res.nfev
+    assert weights[1, 1] == pytest.approx(4.)
+
+
+def test_unconverged_spectra_fail():
+    bins, vals, _ = make_spectra(batchPeakAreas.default_min_batch, seed=3)
+    areas, _, failed, info = calcPeakAreasBatch(bins, vals, geb=geb, maxfev=3, returnInfo=True)
+    assert failed.all()
+    assert (info['Si2C1']['status'] == 0).all()
+    assert (info['Si2C1']['nfev'] == 3).all()
+
+
+def test_small_batches_fit_serially():
+    bins, vals, _ = make_spectra(3, seed=6)
+    areas, _, failed, info = calcPeakAreasBatch(bins, vals, returnInfo=True)
+    assert not failed.any()
+    for i, v in enumerate(vals):
+        serial = calcPeakAreas(bins, v, cache=False)
+        for label, area in serial.items():
+            assert info[label]['nfev'][i] == 0
+            assert areas[label][i] == area
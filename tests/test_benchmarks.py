@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+
+from INS_Analysis import calcPeakAreas
+from INS_Analysis.benchmarks.__main__ import main
+from INS_Analysis.benchmarks.runner import compare, run
+from INS_Analysis.benchmarks.scenarios import scenarios
+from INS_Analysis.benchmarks.synthetic import line_areas, make_spectra
+
+geb = [-0.0073, 0.078, 0]
+
+
+def test_spectra_are_seeded():
+    bins, counts, concentrations = make_spectra(4, n_channels=512, seed=7)
+    assert bins.shape == (512,) and counts.shape == (4, 512) and concentrations.shape == (4, 2)
+    assert counts.dtype == np.int32
+    np.testing.assert_array_equal(make_spectra(4, n_channels=512, seed=7)[1], counts)
+    assert not np.array_equal(make_spectra(4, n_channels=512, seed=8)[1], counts)
+
+
+def test_fitted_areas_find_the_lines():
+    bins, counts, concentrations = make_spectra(10, seed=1)
+    truth = line_areas(concentrations, noise=0)
+    areas = [calcPeakAreas(bins, c, geb=geb, fixWidths=True, cache=False) for c in counts]
+    fitted = np.array([[a['Si1'], a['Si2C1']] for a in areas])
+    assert np.median(np.abs(fitted / truth - 1)) < 0.1
+
+
+def test_every_scenario_runs(tmp_path):
+    out = str(tmp_path / 'old.json')
+    report = run(sizes=[3], n_channels=256, memory=False, out=out, log=None)
+    assert [r['scenario'] for r in report['results']] == list(scenarios)
+    assert all(r['seconds'] >= 0 for r in report['results'])
+    with open(out) as f:
+        assert json.load(f)['results'][0]['n_spectra'] == 3
+
+    rows = compare(out, report)
+    assert [row['scenario'] for row in rows] == list(scenarios)
+
+
+def test_command_line(tmp_path, capsys):
+    out = str(tmp_path / 'new.json')
+    main(['readMCA', 'calibrate', '--sizes', '3', '--channels', '256', '--no-memory', '--out', out])
+    with open(out) as f:
+        assert [r['scenario'] for r in json.load(f)['results']] == ['readMCA', 'calibrate']
+    assert 'readMCA' in capsys.readouterr().out
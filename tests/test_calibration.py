@@ -0,0 +1,224 @@
+import sys
+
+import numpy as np
+import pytest
+
+from INS_Analysis import Analyzer
+from INS_Analysis.benchmarks.synthetic import line_areas, make_spectra
+from INS_Analysis.calibration import (
+    IncrementalCalibration,
+    applyCalibrationAreas,
+    bootstrapCalibration,
+    calibrate,
+    crossValidateCalibration,
+)
+from INS_Analysis.calibration.crossval import make_folds
+from INS_Analysis.calibration.resample import fit_resamples, resample_weights, weighted_linear_fits
+from INS_Analysis.tools import fitting_functions as ff
+
+# the module, its name is taken by the function in the package
+calibrate_module = sys.modules['INS_Analysis.calibration.calibrate']
+
+
+@pytest.fixture
+def analyzer():
+    bins, vals, concentrations = make_spectra(12, n_channels=8, seed=2)
+    analyzer = Analyzer()
+    labels = list(range(12))
+    analyzer.addSpectrums([(bins, v) for v in vals], labels)
+    areas = line_areas(concentrations, seed=2)
+    rows = analyzer.store.rows(labels)
+    for i, window in enumerate(('Si1', 'Si2C1')):
+        analyzer.store.column('areas', window)[rows] = areas[:, i]
+    return analyzer, concentrations
+
+
+def test_failed_update_changes_nothing(analyzer):
+    analyzer, concentrations = analyzer
+    with pytest.raises(ValueError):
+        # one sample does not determine the calibration
+        analyzer.updateCalibration([0], concentrations[:1])
+    assert not analyzer.store.flag('for_calib').any()
+    assert analyzer.incrementalCalibration is None
+
+    calibration = analyzer.updateCalibration([0, 1, 2], concentrations[:3])
+    inc = analyzer.incrementalCalibration
+    with pytest.raises(ValueError):
+        analyzer.removeCalibrationLabels([0, 1])
+    assert analyzer.store.flag('for_calib')[:3].all()
+    assert len(inc) == 3
+    np.testing.assert_allclose(inc.calibration()['weights']['Si1']['k1'], calibration['weights']['Si1']['k1'])
+
+
+def old_calibration(x, k1, k2, k3=0):
+    # the row by row form the vectorized models replaced
+    return np.apply_along_axis(lambda row: (row[1]-k1*row[0])/k2+k3, -1, x)
+
+
+def test_models_match_the_row_by_row_form():
+    areas = np.random.default_rng(0).uniform(100, 1000, (3, 5, 2))
+    np.testing.assert_allclose(ff.original_calibration(areas, 0.4, 12.), old_calibration(areas, 0.4, 12.))
+    np.testing.assert_allclose(ff.proposed_calibration_a(areas, 0.4, 12., 0.1), old_calibration(areas, 0.4, 12., 0.1))
+    for fn, weights in ((ff.original_calibration, [0.4, 12.]), (ff.proposed_calibration_a, [0.4, 12., 0.1])):
+        jacobian = ff.get_jacobian(fn)(areas, *weights)
+        for i in range(len(weights)):
+            up, down = list(weights), list(weights)
+            up[i] += 1e-6
+            down[i] -= 1e-6
+            np.testing.assert_allclose(jacobian[..., i], (fn(areas, *up) - fn(areas, *down)) / 2e-6, rtol=1e-6)
+
+
+def test_array_path_matches_the_lists(analyzer, monkeypatch):
+    analyzer, concentrations = analyzer
+    areas = analyzer.store.matrix('areas', ['Si1', 'Si2C1'])
+    calibration = calibrate(areas, concentrations)
+    lists = applyCalibrationAreas(areas, calibration)
+    # blocks smaller than the rows, the last one partial
+    monkeypatch.setattr(calibrate_module, 'apply_block_rows', 5)
+    out = np.empty((len(areas), 2))
+    assert applyCalibrationAreas(areas, calibration, asArray=True, out=out) is out
+    np.testing.assert_allclose(out, np.array(lists).T)
+    with pytest.raises(ValueError):
+        applyCalibrationAreas(areas, calibration, asArray=True, out=np.empty((len(areas), 3)))
+
+
+@pytest.fixture
+def areas():
+    _, _, concentrations = make_spectra(30, n_channels=8, seed=5)
+    return line_areas(concentrations, seed=5), concentrations
+
+
+@pytest.mark.parametrize('Si2C1_method', ['original', 'proposed_a'])
+def test_direct_solve_matches_curve_fit(areas, Si2C1_method):
+    areas, concentrations = areas
+    direct = calibrate(areas, concentrations, Si2C1_method=Si2C1_method)
+    fitted = calibrate(areas, concentrations, Si2C1_method=Si2C1_method, solver='curve_fit')
+    for label in ('Si1', 'Si2C1'):
+        for param, value in direct['weights'][label].items():
+            assert value == pytest.approx(fitted['weights'][label][param], rel=1e-5, abs=1e-8)
+        np.testing.assert_allclose(direct['covariances'][label], fitted['covariances'][label], rtol=1e-3, atol=1e-12)
+
+
+def test_stacked_resamples_match_refitting_each(areas):
+    areas, concentrations = areas
+    model = calibrate_module.two_variable_calibrations_indexing['original']
+    weights = next(resample_weights(len(areas), 20, 'bootstrap', np.random.default_rng(0)))
+    stacked = weighted_linear_fits(model, areas, concentrations[:, 1], weights)
+    one_by_one = fit_resamples(model, areas, concentrations[:, 1], [weights], solver='curve_fit')
+    np.testing.assert_allclose(stacked, one_by_one, rtol=1e-5)
+
+
+def test_bootstrap_and_jackknife(areas):
+    areas, concentrations = areas
+    boot = bootstrapCalibration(areas, concentrations, n_resamples=200, seed=1)
+    again = bootstrapCalibration(areas, concentrations, n_resamples=200, seed=1)
+    np.testing.assert_array_equal(boot['samples']['Si2C1']['k1'], again['samples']['Si2C1']['k1'])
+    assert boot['resampling']['n_resamples'] == 200
+    for label in ('Si1', 'Si2C1'):
+        for param, (low, high) in boot['intervals'][label].items():
+            assert low < boot['weights'][label][param] < high
+            assert boot['stderr'][label][param] > 0
+
+    jack = bootstrapCalibration(areas, concentrations, method='jackknife')
+    assert jack['resampling']['n_resamples'] == len(areas)
+    # the jackknife standard error of a linear fit is close to its covariance
+    assert jack['stderr']['Si1']['k1'] == pytest.approx(np.sqrt(jack['covariances']['Si1'][0, 0]), rel=0.5)
+
+
+def test_curve_fit_resamples_spread_over_processes(areas):
+    areas, concentrations = areas
+    kwargs = dict(n_resamples=8, seed=2, solver='curve_fit')
+    serial = bootstrapCalibration(areas, concentrations, **kwargs)
+    pooled = bootstrapCalibration(areas, concentrations, n_jobs=2, **kwargs)
+    np.testing.assert_allclose(pooled['samples']['Si2C1']['k2'], serial['samples']['Si2C1']['k2'])
+
+
+def refit_residuals(areas, concentrations, folds, Si2C1_method):
+    # Si1 and Si2C1 residuals of calibrate refit without each fold
+    ret = np.empty((len(areas), 2))
+    for fold in folds:
+        keep = np.setdiff1d(np.arange(len(areas)), fold)
+        calibration = calibrate(areas[keep], concentrations[keep], Si2C1_method=Si2C1_method)
+        ret[fold] = concentrations[fold] - applyCalibrationAreas(areas[fold], calibration, asArray=True)
+    return ret
+
+
+@pytest.mark.parametrize('k', [None, 4])
+@pytest.mark.parametrize('Si2C1_method', ['original', 'proposed_a'])
+def test_closed_form_folds_match_refitting(areas, k, Si2C1_method):
+    areas, concentrations = areas
+    table, residuals = crossValidateCalibration(
+        areas, concentrations, Si2C1_methods=[Si2C1_method], k=k, seed=3, returnResiduals=True)
+    expected = refit_residuals(areas, concentrations, make_folds(len(areas), k, seed=3), Si2C1_method)
+    np.testing.assert_allclose(residuals[('Si1', 'original')], expected[:, 0], rtol=1e-6, atol=1e-12)
+    np.testing.assert_allclose(residuals[('Si2C1', Si2C1_method)], expected[:, 1], rtol=1e-6, atol=1e-12)
+    assert table.loc[('Si1', 'original'), 'folds'] == (len(areas) if k is None else k)
+    assert table.loc[('Si2C1', Si2C1_method), 'rmse'] == pytest.approx(np.sqrt(np.mean(expected[:, 1]**2)))
+
+
+def test_folds_partition_the_rows():
+    folds = make_folds(10, 3, seed=0)
+    assert sorted(np.concatenate(folds).tolist()) == list(range(10))
+    assert [len(fold) for fold in folds] == [4, 3, 3]
+    with pytest.raises(ValueError):
+        make_folds(10, 1)
+
+
+def test_refit_folds_spread_over_processes(areas):
+    areas, concentrations = areas
+    kwargs = dict(k=5, seed=0, solver='curve_fit', returnResiduals=True)
+    _, serial = crossValidateCalibration(areas, concentrations, **kwargs)
+    _, pooled = crossValidateCalibration(areas, concentrations, n_jobs=2, **kwargs)
+    for key in serial:
+        np.testing.assert_allclose(pooled[key], serial[key])
+
+
+def assert_same_calibration(calibration, expected, rtol=1e-8):
+    for label in ('Si1', 'Si2C1'):
+        for param, value in expected['weights'][label].items():
+            assert calibration['weights'][label][param] == pytest.approx(value, rel=rtol)
+        np.testing.assert_allclose(calibration['covariances'][label], expected['covariances'][label], rtol=1e-6)
+
+
+@pytest.mark.parametrize('Si2C1_method', ['original', 'proposed_a'])
+def test_incremental_matches_calibrate(areas, Si2C1_method):
+    areas, concentrations = areas
+    inc = IncrementalCalibration(Si2C1_method=Si2C1_method)
+    for a, c in zip(areas[:20], concentrations[:20]):
+        inc.add(a, c)
+    keys = inc.add(areas[20:], concentrations[20:])
+    assert_same_calibration(inc.calibration(), calibrate(areas, concentrations, Si2C1_method=Si2C1_method))
+
+    inc.remove(keys[:4] + [0, 7])
+    keep = np.setdiff1d(np.arange(len(areas)), [20, 21, 22, 23, 0, 7])
+    assert_same_calibration(inc.calibration(), calibrate(areas[keep], concentrations[keep], Si2C1_method=Si2C1_method))
+    with pytest.raises(KeyError):
+        inc.add(areas[1], concentrations[1], keys=[1])
+
+
+def test_forgetting_weighs_recent_samples_more(areas):
+    areas, concentrations = areas
+    inc = IncrementalCalibration(forgetting=0.9)
+    inc.add(areas, concentrations)
+    # the same as least squares with the i-th sample of n weighted 0.9**(n-1-i)
+    weights = 0.9**np.arange(len(areas))[::-1]
+    model = calibrate_module.two_variable_calibrations_indexing['original']
+    expected = weighted_linear_fits(model, areas, concentrations[:, 1], weights[None])[0]
+    np.testing.assert_allclose(list(inc.calibration()['weights']['Si2C1'].values()), expected, rtol=1e-8)
+
+    # and taking the oldest back out leaves the rest weighted as before
+    inc.remove([0])
+    expected = weighted_linear_fits(model, areas[1:], concentrations[1:, 1], weights[None, 1:])[0]
+    np.testing.assert_allclose(list(inc.calibration()['weights']['Si2C1'].values()), expected, rtol=1e-8)
+
+
+def test_analyzer_updates_match_calibrate(analyzer):
+    analyzer, concentrations = analyzer
+    areas = analyzer.store.matrix('areas', ['Si1', 'Si2C1'])
+    analyzer.updateCalibration(list(range(6)), concentrations[:6])
+    analyzer.updateCalibration(list(range(6, 12)), concentrations[6:])
+    assert_same_calibration(analyzer.calibration, calibrate(areas, concentrations))
+    analyzer.removeCalibrationLabels([2, 3])
+    keep = [0, 1] + list(range(4, 12))
+    assert_same_calibration(analyzer.calibration, calibrate(areas[keep], concentrations[keep]))
+    assert analyzer.store.flag('for_calib').tolist() == [i in keep for i in range(12)]
@@ -0,0 +1,25 @@
+from INS_Analysis import Analyzer
+from INS_Analysis.benchmarks.synthetic import make_spectra
+
+settings = {'geb': [-0.0073, 0.078, 0], 'fixWidths': True, 'fixCenters': True, 'cache': False}
+
+
+def stopped_after_first_chunk(**kwargs):
+    bins, vals, _ = make_spectra(4, seed=4)
+    analyzer = Analyzer()
+    analyzer.addSpectrums([(bins, v) for v in vals], list(range(4)))
+    assert analyzer.calcPeakAreasInChunks(chunksize=2, **kwargs) == 4
+    analyzer.store.checkpoints['calcPeakAreas']['done'] = 1
+    return analyzer
+
+
+def test_resumes_with_the_same_settings():
+    analyzer = stopped_after_first_chunk(**settings)
+    assert analyzer.calcPeakAreasInChunks(chunksize=2, **settings) == 2
+
+
+def test_starts_over_with_other_fit_settings():
+    analyzer = stopped_after_first_chunk(**settings)
+    assert analyzer.calcPeakAreasInChunks(chunksize=2, **dict(settings, maxfev=100)) == 4
+    analyzer.store.checkpoints['calcPeakAreas']['done'] = 1
+    assert analyzer.calcPeakAreasInChunks(chunksize=2, **dict(settings, fixCenters=False)) == 4
@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+import os
+
+import pytest
+
+from INS_Analysis import calcPeakAreas
+from INS_Analysis.benchmarks.synthetic import line_areas, make_spectra, write_mca
+from INS_Analysis.calibration import applyCalibrationAreas, calibrate, saveCalibration
+from INS_Analysis.cli import main
+
+fit_args = ['--geb', '-0.0073', '0.078', '0', '--fix-widths', '--quiet']
+settings = {'geb': [-0.0073, 0.078, 0], 'fixWidths': True, 'cache': False}
+
+
+@pytest.fixture
+def spectra(tmp_path):
+    directory = tmp_path / 'spectra'
+    os.mkdir(directory)
+    bins, vals, concentrations = make_spectra(4, seed=4)
+    counts = vals.round().astype(int)
+    for i, c in enumerate(counts):
+        write_mca(str(directory / f'{i}.mca'), c, gain=bins[1])
+    expected = {f'{i}.mca': calcPeakAreas(bins, c, **settings) for i, c in enumerate(counts)}
+    return str(directory), expected, concentrations
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return {os.path.basename(r['file']): r for r in map(json.loads, f)}
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_run_streams_a_record_per_file(tmp_path, spectra, jobs):
+    directory, expected, _ = spectra
+    out = str(tmp_path / 'out.jsonl')
+    assert main(['run', directory, '--out', out, '--jobs', jobs] + fit_args) == 0
+    records = read_jsonl(out)
+    assert set(records) == set(expected)
+    for name, areas in expected.items():
+        assert records[name]['areas_Si1'] == pytest.approx(areas['Si1'])
+        assert records[name]['areas_Si2C1'] == pytest.approx(areas['Si2C1'])
+        assert not records[name]['area_calc_failed']
+
+
+def test_run_with_a_calibration_and_a_failure(tmp_path, spectra, capsys):
+    directory, expected, concentrations = spectra
+    calib = str(tmp_path / 'calib.json')
+    calibration = calibrate(line_areas(concentrations, noise=0), concentrations)
+    saveCalibration(calibration, calib)
+    with open(os.path.join(directory, 'bad.mca'), 'w') as f:
+        f.write('<<DATA>>\nnot counts\n<<END>>\n')
+
+    assert main(['run', directory, '--calib', calib, '--geb', '-0.0073', '0.078', '0', '--fix-widths']) == 1
+    captured = capsys.readouterr()
+    rows = {os.path.basename(r['file']): r for r in csv.DictReader(io.StringIO(captured.out))}
+    assert set(rows) == set(expected) | {'bad.mca'}
+    assert rows['bad.mca']['area_calc_failed'] == 'True'
+    for name, areas in expected.items():
+        pred = applyCalibrationAreas([[areas['Si1'], areas['Si2C1']]], calibration)
+        assert float(rows[name]['pred_comp_Si1']) == pytest.approx(pred[0][0])
+        assert float(rows[name]['pred_comp_Si2C1']) == pytest.approx(pred[1][0])
+    assert '4 analyzed, 1 failed' in captured.err
+    assert 'bad.mca' in captured.err
+
+
+def test_run_without_files(tmp_path, capsys):
+    assert main(['run', str(tmp_path / '*.mca')]) == 1
+    assert 'no files found' in capsys.readouterr().err
+
+
+def test_watch_analyzes_the_files_there(tmp_path, spectra):
+    directory, expected, _ = spectra
+    out = str(tmp_path / 'out.jsonl')
+    assert main(['watch', directory, '--existing', '--duration', '3', '--interval', '0.1',
+                 '--out', out] + fit_args) == 0
+    records = read_jsonl(out)
+    assert set(records) == set(expected)
+    for name, areas in expected.items():
+        assert records[name]['areas_Si1'] == pytest.approx(areas['Si1'])
@@ -0,0 +1,47 @@
+import pickle
+
+import numpy as np
+
+from INS_Analysis import calcPeakAreas
+from INS_Analysis.areas import FitResultCache
+from INS_Analysis.benchmarks.synthetic import make_spectra
+
+geb = [-0.0073, 0.078, 0]
+
+
+def cached_only(bins, vals, cache, **kwargs):
+    # areas from the cache alone, None if any window has to be fitted
+    return calcPeakAreas(bins, vals, cache=cache, cachedOnly=True, **kwargs)
+
+
+def test_hits_match_fresh_fits():
+    bins, vals, _ = make_spectra(2, seed=4)
+    cache = FitResultCache()
+    assert cached_only(bins, vals[0], cache) is None
+    areas, fits = calcPeakAreas(bins.copy(), vals[0], cache=cache, returnFits=True)
+    assert areas == calcPeakAreas(bins, vals[0], cache=False)
+    assert cached_only(bins, vals[0], cache) == areas
+
+    # other data or other settings miss
+    assert cached_only(bins, vals[1], cache) is None
+    assert cached_only(bins, vals[0], cache, geb=geb) is None
+    assert cached_only(bins, vals[0], cache, solver='curve_fit') is None
+
+    # what is handed out is a copy
+    peak = list(fits['Si1']['peak'])
+    fits['Si1']['peak'].clear()
+    fits['Si1']['bins'][:] = 0
+    _, hit = calcPeakAreas(bins, vals[0], cache=cache, returnFits=True)
+    assert hit['Si1']['peak'] == peak
+    assert np.all(hit['Si1']['bins'] > 0)
+
+
+def test_disk_tier_outlives_the_memory_tier(tmp_path):
+    bins, vals, _ = make_spectra(3, seed=4)
+    cache = FitResultCache(memory_size=2, directory=str(tmp_path))
+    areas = [calcPeakAreas(bins, v, cache=cache) for v in vals]
+    assert len(cache._memory) == 2
+
+    # a fresh or unpickled cache finds the results on disk
+    for other in (FitResultCache(directory=str(tmp_path)), pickle.loads(pickle.dumps(cache))):
+        assert [cached_only(bins, v, other) for v in vals] == areas
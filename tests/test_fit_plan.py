@@ -0,0 +1,38 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from INS_Analysis import calcPeakAreas
+from INS_Analysis.areas import compile_fit_plan
+from INS_Analysis.areas.configs import default_peak_area_config
+from INS_Analysis.benchmarks.synthetic import make_spectra
+
+geb = [-0.0073, 0.078, 0]
+
+
+def test_plans_are_memoized_by_their_settings():
+    plan = compile_fit_plan(geb=geb, fixWidths=True)
+    assert compile_fit_plan(geb=list(geb), fixWidths=True) is plan
+    assert compile_fit_plan(geb=np.array(geb), fixWidths=True) is plan
+    assert compile_fit_plan(geb=geb) is not plan
+    assert compile_fit_plan(geb=geb).fingerprint != plan.fingerprint
+
+
+def test_settings_do_not_leak_into_the_defaults_or_later_calls():
+    bins, vals, _ = make_spectra(1, seed=4)
+    defaults = copy.deepcopy(default_peak_area_config)
+    before = calcPeakAreas(bins, vals[0], cache=False)
+    calcPeakAreas(bins, vals[0], peakWindows=[[1.6, 1.9], [4.2, 4.7]], baselineFunction='exp_falloff', geb=geb, cache=False)
+    assert default_peak_area_config == defaults
+    assert calcPeakAreas(bins, vals[0], cache=False) == before
+
+
+def test_threads_fit_with_their_own_settings():
+    bins, vals, _ = make_spectra(8, seed=4)
+    settings = [{'cache': False}, {'geb': geb, 'fixWidths': True, 'cache': False}]
+    serial = [[calcPeakAreas(bins, v, **s) for v in vals] for s in settings]
+    # both settings interleaved across the threads
+    with ThreadPoolExecutor(4) as executor:
+        futures = [[executor.submit(calcPeakAreas, bins, v, **s) for s in settings] for v in vals]
+    assert [[f.result() for f in row] for row in zip(*futures)] == serial
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from scipy.integrate import quad
+
+from INS_Analysis.tools import fitting_functions as ff
+
+x = np.linspace(3.9, 5.1, 61)
+cases = [
+    (ff.gaus, [4.44, 120., 0.09]),
+    (ff.lorentz, [4.5, 80., 0.05]),
+    (ff.point_slope, [-12., 90.]),
+    (ff.point_slope_super, [-12., 40., 4.5]),
+    (ff.exp_falloff, [4.2, 60., 1.3, 5.]),
+    (ff.exp_falloff, [4.2, 60., 0., 5.]),
+    (ff.x, [2.5]),
+    (ff.const, [7.]),
+]
+
+
+def numerical_jacobian(fn, weights):
+    # central differences, one column per weight
+    columns = []
+    for i, weight in enumerate(weights):
+        h = 1e-6 * max(1, abs(weight))
+        up, down = list(weights), list(weights)
+        up[i] += h
+        down[i] -= h
+        columns.append((fn(x, *up) - fn(x, *down)) / (2 * h) * np.ones_like(x))
+    return np.stack(columns, axis=-1)
+
+
+@pytest.mark.parametrize('fn, weights', cases)
+def test_integral_matches_quad(fn, weights):
+    assert ff.get_integral(fn)(x[0], x[-1], *weights) == pytest.approx(quad(fn, x[0], x[-1], args=tuple(weights))[0], rel=1e-8)
+
+
+@pytest.mark.parametrize('fn, weights', cases)
+def test_jacobian_matches_finite_differences(fn, weights):
+    np.testing.assert_allclose(ff.get_jacobian(fn)(x, *weights), numerical_jacobian(fn, weights), rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize('fn, weights', cases)
+def test_linear_weights_span_the_function(fn, weights):
+    linear = list(ff.get_linear_weights(fn))
+    columns = ff.get_jacobian(fn)(x, *weights)[..., linear]
+    np.testing.assert_allclose(columns @ np.array(weights)[linear], fn(x, *weights))
+
+
+def test_compound_and_held_weight_functions():
+    fn = ff.generate_compound_sum([ff.point_slope, ff.gaus, ff.gaus], [2, 3, 3])
+    weights = [-12., 90., 4.44, 120., 0.09, 4.5, 30., 0.1]
+    np.testing.assert_allclose(ff.get_jacobian(fn)(x, *weights), numerical_jacobian(fn, weights), rtol=1e-6, atol=1e-6)
+    assert ff.integrate(fn, x[0], x[-1], weights) == pytest.approx(quad(fn, x[0], x[-1], args=tuple(weights))[0], rel=1e-8)
+    assert ff.get_linear_weights(fn) == (0, 1, 3, 6)
+
+    held = np.array([False, False, True, False, True, True, False, True])
+    free_fn, free_weights = ff.fixed_weight_function(fn, weights, held)
+    np.testing.assert_allclose(free_fn(x, *free_weights), fn(x, *weights))
+    np.testing.assert_allclose(
+        ff.get_jacobian(free_fn)(x, *free_weights), numerical_jacobian(free_fn, free_weights), rtol=1e-6, atol=1e-6)
@@ -0,0 +1,21 @@
+from INS_Analysis.tools.instrument import Recorder
+
+
+def test_per_spectrum_converged_by_each_windows_last_attempt():
+    recorder = Recorder()
+    recorder.extend([
+        # varpro failing over to curve_fit, which converges
+        {'stage': 'varpro', 'spectrum': 'a', 'window': 'Si1', 'seconds': 1, 'converged': False},
+        {'stage': 'curve_fit', 'spectrum': 'a', 'window': 'Si1', 'seconds': 1, 'converged': True},
+        {'stage': 'curve_fit', 'spectrum': 'a', 'window': 'Si2C1', 'seconds': 1, 'converged': True},
+        # a failed warm start whose fallback raises
+        {'stage': 'warm_start', 'spectrum': 'b', 'window': 'Si1', 'seconds': 1, 'converged': False},
+        {'stage': 'curve_fit', 'spectrum': 'b', 'window': 'Si1', 'seconds': 1, 'error': 'RuntimeError'},
+        # a converged warm start, its inner attempts end first
+        {'stage': 'varpro', 'spectrum': 'c', 'window': 'Si1', 'seconds': 1, 'converged': False},
+        {'stage': 'warm_start', 'spectrum': 'c', 'window': 'Si1', 'seconds': 1, 'converged': True},
+        {'stage': 'curve_fit', 'spectrum': 'c', 'window': 'Si2C1', 'seconds': 1, 'converged': False},
+        {'stage': 'store', 'spectrum': 'd', 'seconds': 1},
+    ])
+    converged = recorder.per_spectrum()['converged']
+    assert converged.to_dict() == {'a': True, 'b': False, 'c': False, 'd': True}
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from INS_Analysis import Analyzer
+from INS_Analysis.benchmarks.synthetic import make_spectra
+
+settings = {'geb': [-0.0073, 0.078, 0], 'fixWidths': True, 'fixCenters': True, 'cache': False}
+
+
+class Stop(Exception):
+    pass
+
+
+@pytest.fixture
+def spectra():
+    bins, vals, _ = make_spectra(40, seed=4)
+    return [(bins, v) for v in vals], [f's{i}' for i in range(40)]
+
+
+def test_checkpoint_resumes_after_reopen(tmp_path, monkeypatch, spectra):
+    specs, labels = spectra
+    analyzer = Analyzer.open(tmp_path)
+    analyzer.addSpectrums(specs, labels)
+    analyzer.flush()
+
+    # stops on the third chunk, as a killed run would
+    calcPeakAreas = Analyzer.calcPeakAreas
+    calls = []
+    def stopping(self, labels, **kwargs):
+        calls.append(labels)
+        if len(calls) == 3:
+            raise Stop
+        return calcPeakAreas(self, labels, **kwargs)
+    monkeypatch.setattr(Analyzer, 'calcPeakAreas', stopping)
+    with pytest.raises(Stop):
+        analyzer.calcPeakAreasInChunks(chunksize=8, **settings)
+    monkeypatch.setattr(Analyzer, 'calcPeakAreas', calcPeakAreas)
+    del analyzer
+
+    reopened = Analyzer.open(tmp_path)
+    assert len(reopened.spectrums) == 40
+    assert reopened.store.checkpoints['calcPeakAreas']['done'] == 2
+    assert reopened.calcPeakAreasInChunks(chunksize=8, **settings) == 24
+    assert reopened.calcPeakAreasInChunks(chunksize=8, **settings) == 0
+
+    in_memory = Analyzer()
+    in_memory.addSpectrums(specs, labels)
+    in_memory.calcPeakAreas(labels, **settings)
+    np.testing.assert_allclose(
+        reopened.store.matrix('areas', ['Si1', 'Si2C1']), in_memory.store.matrix('areas', ['Si1', 'Si2C1']))
+    assert not reopened.store.flag('area_calc_failed').any()
+
+
+def test_results_kept_across_sessions(tmp_path, spectra):
+    specs, labels = spectra
+    analyzer = Analyzer.open(tmp_path)
+    analyzer.addSpectrums(specs[:10], labels[:10])
+    analyzer.calcPeakAreas(labels[:10], **settings)
+    analyzer.flush()
+    areas = analyzer.store.matrix('areas', ['Si1', 'Si2C1'])
+
+    reopened = Analyzer.open(tmp_path)
+    np.testing.assert_array_equal(reopened.store.matrix('areas', ['Si1', 'Si2C1']), areas)
+    assert set(reopened.spectrums['s3']['weights']) == {'Si1', 'Si2C1'}
+    np.testing.assert_array_equal(reopened.spectrums['s3']['vals'], specs[3][1])
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from INS_Analysis.benchmarks.synthetic import make_spectra, write_mca
+from INS_Analysis.Spectrum.readMCA import read_many, readMCA
+
+
+def old_readMCA(file_path):
+    # the reader readMCA replaced: counts after the line holding 2048
+    with open(file_path, 'r') as file:
+        spectrum = [line.strip() for line in file]
+    return list(map(int, spectrum[spectrum.index("2048")+1:]))
+
+
+def write_header_file(path, counts):
+    header = ['SPECTRUM', 'DATE 01/01/2020', 'LIVE 300', str(len(counts))]
+    with open(path, 'w') as f:
+        f.write('\n'.join(header + [str(c) for c in counts]) + '\n')
+
+
+def test_matches_the_old_reader(tmp_path):
+    counts = np.random.default_rng(0).poisson(50, 2048)
+    path = str(tmp_path / 'a.mca')
+    write_header_file(path, counts)
+    bins, vals = readMCA(path)
+    assert vals.tolist() == old_readMCA(path)
+    np.testing.assert_array_equal(bins, np.arange(2048))
+
+
+def test_pmca_data_and_calibration(tmp_path):
+    bins, vals, _ = make_spectra(1, seed=1)
+    counts = vals[0].round().astype(int)
+    path = str(tmp_path / 'a.mca')
+    write_mca(path, counts, gain=bins[1])
+    read_bins, read_vals = readMCA(path)
+    assert read_vals.tolist() == counts.tolist()
+    np.testing.assert_allclose(read_bins, bins, atol=1e-9)
+    np.testing.assert_allclose(readMCA(path, calibration=[1, 2])[0], 1 + 2 * np.arange(len(counts)))
+
+
+def test_plain_column_and_bad_files(tmp_path):
+    path = tmp_path / 'a.mca'
+    path.write_text('31\n41\n59\n26\n53\n')
+    assert readMCA(str(path))[1].tolist() == [31, 41, 59, 26, 53]
+    path.write_text('<<DATA>>\n1\nx\n<<END>>\n')
+    with pytest.raises(ValueError):
+        readMCA(str(path))
+
+
+def test_read_many_stacks_a_directory(tmp_path):
+    _, vals, _ = make_spectra(4, seed=1)
+    counts = vals.round().astype(int)
+    for i, c in enumerate(counts):
+        write_header_file(str(tmp_path / f'{i}.mca'), c)
+    bins, stacked, paths = read_many(str(tmp_path), workers=2)
+    assert [p[-5:] for p in paths] == ['0.mca', '1.mca', '2.mca', '3.mca']
+    np.testing.assert_array_equal(stacked, counts)
+    np.testing.assert_array_equal(bins, np.arange(counts.shape[1]))
+
+    write_header_file(str(tmp_path / '4.mca'), counts[0][:-1])
+    with pytest.raises(ValueError):
+        read_many(str(tmp_path / '*.mca'))
@@ -0,0 +1,33 @@
+import numpy as np
+
+from INS_Analysis import Analyzer
+from INS_Analysis.benchmarks.synthetic import make_spectra
+from INS_Analysis.tools.parallel import chunked, resolve_n_jobs
+
+settings = {'geb': [-0.0073, 0.078, 0], 'fixWidths': True, 'fixCenters': True, 'cache': False}
+
+
+def fit(**kwargs):
+    bins, vals, _ = make_spectra(10, seed=4)
+    analyzer = Analyzer()
+    labels = list(range(10))
+    # one spectrum whose fit raises, flagged in either case
+    analyzer.addSpectrums([(bins, v) for v in vals] + [(bins[:20], vals[0][:20])], labels + ['short'])
+    analyzer.calcPeakAreas(labels + ['short'], **settings, **kwargs)
+    return analyzer
+
+
+def test_process_pool_matches_serial():
+    serial = fit()
+    pooled = fit(n_jobs=2, chunksize=3)
+    for window in ('Si1', 'Si2C1'):
+        np.testing.assert_allclose(
+            pooled.store.matrix('areas', [window]), serial.store.matrix('areas', [window]), equal_nan=True)
+    assert pooled.store.flag('area_calc_failed').tolist() == serial.store.flag('area_calc_failed').tolist()
+    assert serial.store.flag('area_calc_failed')[-1]
+
+
+def test_job_counts_and_chunks():
+    assert resolve_n_jobs(None) == 1
+    assert resolve_n_jobs(-1) >= 1
+    assert chunked(range(5), 2) == [[0, 1], [2, 3], [4]]
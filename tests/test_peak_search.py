@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from INS_Analysis import calcPeakAreas
+from INS_Analysis.areas import compile_fit_plan
+from INS_Analysis.areas.fitPlan import locate_windows
+from INS_Analysis.benchmarks.synthetic import line_areas, make_spectra
+from INS_Analysis.tools import fitting_functions as ff
+from INS_Analysis.tools.peak_search import find_peaks, match_peaks
+
+geb = [-0.0073, 0.078, 0]
+
+
+def test_finds_gaussians_on_a_sloped_background():
+    bins = np.linspace(0, 8, 2048)
+    expected = 400 - 30 * bins + ff.gaus(bins, 2.5, 3000, 0.05) + ff.gaus(bins, 6.1, 2000, 0.08)
+    vals = np.random.default_rng(0).poisson(expected)
+    peaks = find_peaks(bins, vals, width=6)
+    assert len(peaks['position']) == 2
+    np.testing.assert_allclose(peaks['position'], [2.5, 6.1], atol=0.005)
+    np.testing.assert_allclose(peaks['sigma'], [0.05, 0.08], rtol=0.15)
+    assert (peaks['significance'] >= 5).all()
+
+    # a background alone has no peaks, and rows are searched one by one
+    background = np.random.default_rng(1).poisson(400 - 30 * bins)
+    assert len(find_peaks(bins, background, width=6)['position']) == 0
+    rows = find_peaks(bins, np.stack([vals, background]), width=6)
+    np.testing.assert_array_equal(rows[0]['position'], peaks['position'])
+    assert len(rows[1]['position']) == 0
+
+
+def test_match_peaks():
+    assert match_peaks([1.0, 2.0, 4.0], [1.1, 3.0, 3.9], 0.2).tolist() == [0, -1, 2]
+    assert match_peaks([], [1.0], 0.2).tolist() == [-1]
+
+
+def test_windows_follow_a_shifted_spectrum():
+    bins, vals, concentrations = make_spectra(6, seed=9)
+    truth = line_areas(concentrations, noise=0)
+    # the energy calibration off by 40 keV
+    shifted = bins + 0.04
+    plan = compile_fit_plan(geb=geb, peakSearch=True)
+    si1, _ = locate_windows(shifted, vals[0], plan)
+    assert si1.targets[0] == pytest.approx(plan.window('Si1').targets[0] + 0.04, abs=0.005)
+    assert si1.window[0] - plan.window('Si1').window[0] == pytest.approx(si1.targets[0] - plan.window('Si1').targets[0])
+
+    # peaks held at their targets miss the shifted lines unless the targets move
+    errors = {}
+    for peakSearch in (None, True):
+        areas = [
+            calcPeakAreas(shifted, v, geb=geb, fixWidths=True, fixCenters=True, peakSearch=peakSearch, cache=False)
+            for v in vals]
+        fitted = np.array([[a['Si1'], a['Si2C1']] for a in areas])
+        errors[peakSearch] = np.median(np.abs(fitted / truth - 1), axis=0)
+    assert (errors[True] < 0.05).all()
+    assert (errors[None] > 2 * errors[True]).all()
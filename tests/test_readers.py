@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import pytest
+
+from INS_Analysis.benchmarks.synthetic import make_spectra, write_mctal
+from INS_Analysis.Spectrum.readMCTAL import clear_mctal_cache, parseMCTAL, readMCTAL, readMCTALTally
+
+
+@pytest.fixture
+def mctal(tmp_path):
+    bins, counts, _ = make_spectra(3, n_channels=64, seed=0)
+    path = str(tmp_path / 'run.mctal')
+    write_mctal(path, bins, counts)
+    clear_mctal_cache()
+    return path, bins, counts
+
+
+def test_readers_return_their_own_bins(mctal):
+    path, bins, _ = mctal
+    ebins, _ = readMCTAL(path)
+    ebins[:] = 0
+    ebins, _, _ = readMCTALTally(path)
+    ebins[:] = 0
+    np.testing.assert_allclose(readMCTAL(path)[0], bins, atol=1e-5)
+    # the cached tally itself cannot be written to
+    with pytest.raises(ValueError):
+        parseMCTAL(path)[8].ebins[0] = 0
+
+
+def test_values_match_what_was_written(mctal):
+    # what mcnptools' GetValue gave per energy and time bin, times nps
+    path, bins, counts = mctal
+    ebins, vals = readMCTAL(path)
+    np.testing.assert_allclose(vals, counts[0], rtol=1e-5)
+    _, vals = readMCTAL(path, start_time_bin=1, end_time_bin=2)
+    np.testing.assert_allclose(vals, counts[1:], rtol=1e-5)
+    _, tbins, vals = readMCTALTally(path)
+    np.testing.assert_allclose(tbins, [100, 200, 300])
+    np.testing.assert_allclose(vals, counts, rtol=1e-5)
+
+
+def test_cache_follows_the_file(mctal):
+    path, bins, counts = mctal
+    first = parseMCTAL(path)
+    assert parseMCTAL(path) is first
+
+    write_mctal(path, bins, counts[::-1])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert parseMCTAL(path) is not first
+    np.testing.assert_allclose(readMCTAL(path)[1], counts[-1], rtol=1e-5)
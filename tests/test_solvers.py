@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from INS_Analysis import calcPeakAreas
+from INS_Analysis.benchmarks.synthetic import default_geb, lines, make_spectra
+from INS_Analysis.tools import fitting_functions as ff
+
+geb = [default_geb['a'], default_geb['b'], default_geb['c']]
+
+
+def doublet_area(concentrations):
+    # true Si2C1 area of make_spectra, both lines of the window
+    area = 0
+    for name in ('C 4.44', 'Si 4.50'):
+        line = lines[name]
+        sigma = ff.geb(line['energy'], **default_geb)
+        amplitude = line['amplitude'] * concentrations[0 if line['element'] == 'Si' else 1]
+        area += amplitude * sigma * np.sqrt(np.pi)
+    return area
+
+
+def doublet_fit(bins, vals, **kwargs):
+    # Si2C1 area and sum of squared residuals over its window
+    areas, fits = calcPeakAreas(bins, vals, returnFits=True, cache=False, **kwargs)
+    fit = fits['Si2C1']
+    window = (bins >= fit['bins'][0]) & (bins <= fit['bins'][-1])
+    return areas['Si2C1'], float(np.sum((np.array(fit['peak']) - vals[window])**2))
+
+
+@pytest.fixture(scope='module')
+def doublets():
+    bins, vals, concentrations = make_spectra(20, seed=3)
+    ret = {}
+    for solver in ('auto', 'varpro', 'curve_fit'):
+        ret[solver] = np.array([doublet_fit(bins, v, solver=solver) for v in vals])
+    ret['true'] = np.array([doublet_area(c) for c in concentrations])
+    return ret
+
+
+def test_auto_fits_doublets_by_curve_fit(doublets):
+    # widths and centers free leave the doublet nonlinear, auto leaves it to curve_fit
+    np.testing.assert_array_equal(doublets['auto'], doublets['curve_fit'])
+    # the minima variable projection alone settles in
+    assert np.any(doublets['varpro'][:, 1] > doublets['curve_fit'][:, 1] * (1 + 1e-6))
+
+
+def test_auto_doublet_area_error(doublets):
+    error = {
+        solver: np.mean(np.abs(doublets[solver][:, 0] - doublets['true']) / doublets['true'])
+        for solver in ('auto', 'varpro', 'curve_fit')
+    }
+    assert error['auto'] < error['varpro']
+
+
+def test_linear_windows_fit_exactly_by_varpro():
+    # widths and centers held leave a linear problem, variable projection alone solves it
+    bins, vals, _ = make_spectra(3, seed=1)
+    for v in vals:
+        auto = doublet_fit(bins, v, solver='auto', geb=geb, fixWidths=True, fixCenters=True)
+        varpro = doublet_fit(bins, v, solver='varpro', geb=geb, fixWidths=True, fixCenters=True)
+        curve_fit = doublet_fit(bins, v, solver='curve_fit', geb=geb, fixWidths=True, fixCenters=True)
+        assert auto == varpro
+        assert auto[1] <= curve_fit[1] * (1 + 1e-6)
+        assert auto[0] == pytest.approx(curve_fit[0], rel=1e-3)
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from INS_Analysis import Spectrum
+from INS_Analysis.Spectrum import SpectrumCache
+
+
+def write_counts(path, counts, mtime_ns):
+    with open(path, 'w') as f:
+        f.write('<<DATA>>\n' + '\n'.join(map(str, counts)) + '\n<<END>>\n')
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_entries_follow_the_file(tmp_path):
+    cache = SpectrumCache(str(tmp_path / 'cache'))
+    path = str(tmp_path / 'a.mca')
+    write_counts(path, [10, 20, 30], 10**9)
+    bins, vals = Spectrum.read(path, cache=cache)
+    assert vals.tolist() == [10, 20, 30]
+    assert len(cache.entries()) == 1
+
+    # same size and mtime: served from the cache without reading the file
+    write_counts(path, [40, 50, 60], 10**9)
+    cached_bins, cached_vals = Spectrum.read(path, cache=cache)
+    assert cached_vals.tolist() == [10, 20, 30]
+    np.testing.assert_array_equal(cached_bins, bins)
+
+    # a new mtime is a new key
+    write_counts(path, [40, 50, 60], 2 * 10**9)
+    assert Spectrum.read(path, cache=cache)[1].tolist() == [40, 50, 60]
+    # and so are other reader kwargs
+    assert Spectrum.read(path, cache=cache, calibration=[0, 2])[0].tolist() == [0, 2, 4]
+
+
+def test_unreadable_entries_are_read_again(tmp_path):
+    cache = SpectrumCache(str(tmp_path / 'cache'))
+    path = str(tmp_path / 'a.mca')
+    write_counts(path, [10, 20, 30], 10**9)
+    Spectrum.read(path, cache=cache)
+    (_, _, entry), = cache.entries()
+    with open(entry, 'wb') as f:
+        f.write(b'not an array')
+    assert Spectrum.read(path, cache=cache)[1].tolist() == [10, 20, 30]
+    assert Spectrum.read(path, cache=False)[1].tolist() == [10, 20, 30]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f'{i}.mca'))
+        write_counts(paths[-1], range(100), 10**9)
+    cache = SpectrumCache(str(tmp_path / 'cache'))
+    Spectrum.read(paths[0], cache=cache)
+    entry_size = cache.entries()[0][1]
+
+    cache = SpectrumCache(str(tmp_path / 'cache'), max_bytes=2 * entry_size)
+    for path in paths[1:]:
+        Spectrum.read(path, cache=cache)
+    assert len(cache.entries()) == 2
+    assert cache.get(cache.key(paths[0], 'mca', {})) is None
+    assert cache.get(cache.key(paths[2], 'mca', {})) is not None
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from INS_Analysis import Analyzer
+from INS_Analysis.spectrumStore import MappedSpectrumStore, SpectrumStore
+
+
+def test_counts_keep_their_integer_type_without_padding():
+    store = SpectrumStore()
+    long_bins, short_bins = np.linspace(0, 8, 2048), np.linspace(0, 8, 100)
+    store.add('long', long_bins, np.arange(2048, dtype=np.int32))
+    store.add('short', short_bins, np.arange(100, dtype=np.int32))
+    assert store.counts.dtype == np.int32
+    assert store.used == 2148
+    assert store.vals(store.index['short']).tolist() == list(range(100))
+    assert store.vals(store.index['long']).dtype == np.int32
+
+
+def test_counts_widen_only_when_needed():
+    store = SpectrumStore()
+    bins = np.linspace(0, 8, 10)
+    store.add('a', bins, np.arange(10))  # int64 values that fit int32
+    assert store.counts.dtype == np.int32
+    store.add('b', bins, np.full(10, 2**40))
+    assert store.counts.dtype == np.int64
+    store.add('c', bins, np.full(10, 0.5))
+    assert store.counts.dtype == np.float64
+    assert store.vals(store.index['a']).tolist() == list(range(10))
+    assert store.vals(store.index['b'])[0] == 2**40
+    assert store.vals(store.index['c'])[0] == 0.5
+
+
+def test_readding_a_label_of_another_length():
+    store = SpectrumStore()
+    store.add('a', np.arange(5.), np.arange(5))
+    store.add('b', np.arange(3.), np.arange(3))
+    store.add('a', np.arange(5.), np.arange(5) * 2)
+    assert store.used == 8
+    store.add('a', np.arange(7.), np.arange(7))
+    assert store.vals(store.index['a']).tolist() == list(range(7))
+    assert store.vals(store.index['b']).tolist() == [0, 1, 2]
+
+
+def test_rejected_spectrum_leaves_no_grid():
+    store = SpectrumStore()
+    store.add('a', np.linspace(0, 8, 100), np.zeros(100))
+    with pytest.raises(ValueError):
+        store.add('b', np.linspace(0, 9, 100), np.zeros(99))
+    assert len(store.grids) == 1
+    assert store.labels == ['a']
+
+
+def test_spectrums_accept_dicts():
+    analyzer = Analyzer()
+    bins = np.linspace(0, 8, 10)
+    analyzer.spectrums['s'] = {
+        'bins': bins,
+        'vals': np.arange(10),
+        'areas': {'Si1': 1.5, 'Si2C1': None},
+        'for_calib': True,
+    }
+    assert analyzer.spectrums['s']['areas']['Si1'] == 1.5
+    assert analyzer.spectrums['s']['areas']['Si2C1'] is None
+    assert analyzer.spectrums['s']['for_calib']
+    analyzer.spectrums['s']['vals'] = np.arange(10) + 0.25
+    assert analyzer.spectrums['s']['vals'][0] == 0.25
+    with pytest.raises(TypeError):
+        del analyzer.spectrums['s']
+
+
+def test_mapped_counts_reopen_widened(tmp_path):
+    store = MappedSpectrumStore(tmp_path)
+    bins = np.linspace(0, 8, 10)
+    store.add('a', bins, np.arange(10, dtype=np.int32))
+    store.flush()
+    store.add('b', bins, np.full(10, 0.5))
+    store.flush()
+    reopened = MappedSpectrumStore(tmp_path)
+    assert reopened.counts.dtype == np.float64
+    assert reopened.vals(reopened.index['a']).tolist() == list(range(10))
+    assert reopened.vals(reopened.index['b']).tolist() == [0.5] * 10
@@ -0,0 +1,44 @@
+import pytest
+
+from INS_Analysis.benchmarks.synthetic import line_areas, make_spectra, write_mca
+from INS_Analysis.calibration import calibrate
+from INS_Analysis.timeSeries import analyzeTimeSpectra
+from INS_Analysis.watcher import DirectoryWatcher, analyzeFile
+
+settings = {'geb': [-0.0073, 0.078, 0], 'fixWidths': True, 'fixCenters': True, 'cache': False}
+without_si1 = dict(settings, peakWindows={'Si1': None})
+
+
+@pytest.fixture(scope='module')
+def calibration():
+    _, _, concentrations = make_spectra(40, n_channels=8, seed=1)
+    return calibrate(line_areas(concentrations, seed=1), concentrations)
+
+
+@pytest.fixture(scope='module')
+def spectra():
+    bins, vals, _ = make_spectra(2, seed=4)
+    return [{'start': i, 'stop': i + 1, 'time': None, 'bins': bins, 'vals': v} for i, v in enumerate(vals)]
+
+
+def test_calibrated_spectra(spectra, calibration):
+    records = list(analyzeTimeSpectra(spectra, calibration, **settings))
+    assert len(records) == 2
+    for record in records:
+        assert not record['area_calc_failed']
+        assert set(record['pred_comp']) == {'Si1', 'Si2C1'}
+
+
+def test_calibration_needs_its_windows(spectra, calibration, tmp_path):
+    with pytest.raises(ValueError, match='Si1'):
+        next(analyzeTimeSpectra(spectra, calibration, **without_si1))
+    # without a calibration the windows left are fit
+    record = next(analyzeTimeSpectra(spectra, **without_si1))
+    assert set(record['areas']) == {'Si2C1'}
+
+    path = str(tmp_path / 'a.mca')
+    write_mca(path, spectra[0]['vals'].round().astype(int), gain=spectra[0]['bins'][1])
+    with pytest.raises(ValueError, match='Si1'):
+        analyzeFile(path, calibration, **without_si1)
+    with pytest.raises(ValueError, match='Si1'):
+        DirectoryWatcher(str(tmp_path), [].append, calibration=calibration, **without_si1)
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from INS_Analysis import Analyzer
+from INS_Analysis.areas.fitPlan import compile_fit_plan
+from INS_Analysis.benchmarks.synthetic import make_spectra
+
+settings = {'geb': [-0.0073, 0.078, 0], 'fixWidths': True, 'fixCenters': True, 'cache': False}
+
+
+def fit(transport, n_spectra=24, **kwargs):
+    bins, vals, _ = make_spectra(n_spectra, seed=4)
+    analyzer = Analyzer()
+    labels = list(range(n_spectra))
+    analyzer.addSpectrums([(bins, v) for v in vals], labels)
+    if 'executor' not in kwargs:
+        kwargs['n_jobs'] = 2
+    res = analyzer.calcPeakAreas(labels, transport=transport, **kwargs)
+    return analyzer, res
+
+
+def assert_same(pickled, shared, windows):
+    assert pickled.store.flag('area_calc_failed').tolist() == shared.store.flag('area_calc_failed').tolist()
+    np.testing.assert_allclose(
+        pickled.store.matrix('areas', windows), shared.store.matrix('areas', windows), equal_nan=True)
+    for label in (0, 7, 23):
+        for window in windows:
+            for part in ('baseline', 'peak'):
+                np.testing.assert_allclose(
+                    pickled.spectrums[label]['weights'][window][part],
+                    shared.spectrums[label]['weights'][window][part])
+
+
+def test_shared_memory_matches_pickle():
+    pickled, pickled_res = fit('pickle', **settings)
+    shared, shared_res = fit('shared_memory', **settings)
+    assert pickled_res.keys() == shared_res.keys()
+    assert_same(pickled, shared, ['Si1', 'Si2C1'])
+
+
+def test_shared_memory_matches_pickle_warm_started_with_fits():
+    kwargs = dict(settings, returnFits=True, warmStart='previous')
+    pickled, (_, pickled_fits) = fit('pickle', **kwargs)
+    shared, (_, shared_fits) = fit('shared_memory', **kwargs)
+    assert_same(pickled, shared, ['Si1', 'Si2C1'])
+    np.testing.assert_allclose(pickled_fits[5]['Si2C1']['peak'], shared_fits[5]['Si2C1']['peak'])
+
+
+def test_shared_memory_uses_the_callers_plan():
+    # a plan whose windows differ from the defaults: Si1 moved, Si2C1 left
+    # out and a window of the Si 4.50 line alone (threads, a FitPlan's
+    # compiled functions do not pickle)
+    plan = compile_fit_plan(
+        peakWindows={'Si1': [1.6, 1.95], 'Si2C1': None, 'Si45': [4.47, 4.58]},
+        peakTargets={'Si45': [4.497]},
+        geb=settings['geb'], fixWidths=True, fixCenters=True)
+    with ThreadPoolExecutor(2) as executor:
+        pickled, _ = fit('pickle', plan=plan, cache=False, executor=executor)
+        shared, _ = fit('shared_memory', plan=plan, cache=False, executor=executor)
+    assert not pickled.store.flag('area_calc_failed').any()
+    assert_same(pickled, shared, ['Si1', 'Si45'])
+    assert shared.spectrums[3]['areas'].get('Si2C1') is None
+    assert shared.spectrums[3]['areas']['Si1'] != pytest.approx(
+        fit('pickle', **settings)[0].spectrums[3]['areas']['Si1'])
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from INS_Analysis import Analyzer, calcPeakAreas
+from INS_Analysis.areas.warmStart import WarmStarts
+from INS_Analysis.benchmarks.synthetic import line_areas, make_spectra
+from INS_Analysis.tools import instrument
+
+settings = {'geb': [-0.0073, 0.078, 0], 'fixWidths': True, 'cache': False}
+
+
+def test_choices():
+    assert WarmStarts().choose('a', [1, 2]) is None
+    with pytest.raises(ValueError):
+        WarmStarts('first')
+
+    previous = WarmStarts()
+    previous.add('a', np.array([1., 2.]), {'Si1': 1})
+    previous.add('b', np.array([2., 1.]), {'Si1': 2})
+    previous.add('c', np.array([2., 1.]), None)
+    assert previous.choose('d', np.array([1., 2.])) == 'b'
+    assert previous.starting_weights('d', np.array([1., 2.])) == {'Si1': 2}
+
+    # nearest compares shapes, not counts, among spectra of as many bins
+    nearest = WarmStarts('nearest')
+    rng = np.random.default_rng(0)
+    shapes = rng.uniform(1, 2, (20, 5))
+    for i, shape in enumerate(shapes):
+        nearest.add(i, shape, {'i': i})
+    nearest.add('long', np.ones(6), {})
+    assert nearest.choose('x', 1000 * shapes[13]) == 13
+    assert nearest.choose('x', np.ones(7)) is None
+    assert list(nearest.subset([13, 'long', 'missing']).weights) == [13, 'long']
+    assert nearest.subset([13]).choose('x', shapes[0]) == 13
+
+    picked = WarmStarts(lambda label, fitted: fitted[0])
+    picked.add('a', np.ones(2), {})
+    picked.add('b', np.ones(2), {})
+    assert picked.choose('c', np.ones(2)) == 'a'
+
+
+def test_warm_fits_land_where_cold_ones_do():
+    bins, vals, _ = make_spectra(2, seed=6)
+    cold = calcPeakAreas(bins, vals[1], **settings)
+    _, weights = calcPeakAreas(bins, vals[0], returnWeights=True, **settings)
+    with instrument.record() as recorder:
+        warm = calcPeakAreas(bins, vals[1], startingWeights=weights, **settings)
+    assert warm == pytest.approx(cold, rel=1e-3)
+    assert all(r['converged'] for r in recorder.records if r['stage'] == 'warm_start')
+    assert {r['window'] for r in recorder.records if r['stage'] == 'warm_start'} == {'Si1', 'Si2C1'}
+
+    # weights that do not fit the window are a cold start
+    bad = {'Si1': {'baseline': [1.], 'peak': [1.]}}
+    assert calcPeakAreas(bins, vals[1], startingWeights=bad, **settings) == cold
+
+
+@pytest.mark.parametrize('warmStart', ['previous', 'nearest'])
+def test_analyzer_warm_starts(warmStart):
+    bins, vals, concentrations = make_spectra(8, seed=6)
+    truth = line_areas(concentrations, noise=0)
+    labels = list(range(8))
+    areas = {}
+    for mode in (None, warmStart):
+        analyzer = Analyzer()
+        analyzer.addSpectrums([(bins, v) for v in vals], labels)
+        analyzer.calcPeakAreas(labels, warmStart=mode, **settings)
+        assert not analyzer.store.flag('area_calc_failed').any()
+        areas[mode] = np.abs(analyzer.store.matrix('areas', ['Si1', 'Si2C1']) / truth - 1)
+    # the doublet's free centers can settle elsewhere from another start,
+    # warm starts land as close to the true areas as cold ones
+    assert np.median(areas[warmStart]) <= np.median(areas[None]) + 1e-3
+    assert areas[warmStart].max() <= areas[None].max() + 1e-3
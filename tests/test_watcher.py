@@ -0,0 +1,53 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from INS_Analysis.benchmarks.synthetic import make_spectra, write_mca
+from INS_Analysis.watcher import DirectoryWatcher
+
+settings = {'geb': [-0.0073, 0.078, 0], 'fixWidths': True, 'fixCenters': True, 'cache': False}
+
+
+def write_spectra(directory, n):
+    bins, vals, _ = make_spectra(n, seed=4)
+    paths = []
+    for i, v in enumerate(vals):
+        path = os.path.join(directory, f'{i}.mca')
+        write_mca(path, v.round().astype(int), gain=bins[1])
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+        paths.append(path)
+    return paths
+
+
+def test_scan_leaves_what_is_over_its_limit_pending(tmp_path):
+    paths = write_spectra(str(tmp_path), 3)
+    watcher = DirectoryWatcher(str(tmp_path), [].append, settle=1, existing=True)
+    assert watcher.scan(now=0) == []
+    assert [path for path, _ in watcher.scan(now=1, limit=2)] == paths[:2]
+    assert [path for path, _ in watcher.scan(now=1, limit=2)] == paths[2:]
+    assert watcher.scan(now=2) == []
+
+
+def test_watcher_analyzes_the_files_written(tmp_path):
+    directory = str(tmp_path / 'spectra')
+    os.mkdir(directory)
+    records = []
+    with ThreadPoolExecutor(1) as executor:
+        watcher = DirectoryWatcher(
+            directory, records.append, executor=executor, interval=0.05, maxPending=1, existing=True, **settings)
+
+        async def watch():
+            task = asyncio.create_task(watcher.run())
+            await asyncio.sleep(0.1)
+            write_spectra(directory, 3)
+            while len(records) < 3:
+                await asyncio.sleep(0.05)
+            watcher.stop()
+            return await task
+
+        counts = asyncio.run(asyncio.wait_for(watch(), 120))
+    assert counts == {'analyzed': 3, 'failed': 0, 'skipped': 0}
+    assert sorted(os.path.basename(r['file']) for r in records) == ['0.mca', '1.mca', '2.mca']
+    for record in records:
+        assert set(record['areas']) == {'Si1', 'Si2C1'}
+        assert record['detected'] <= record['finished']
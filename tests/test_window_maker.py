@@ -0,0 +1,41 @@
+import numpy as np
+
+from INS_Analysis.tools import window_maker as wm
+
+
+class Colliding:
+    # a cache key with another key's hash that never equals it
+    def __init__(self, key):
+        self.key = key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return False
+
+
+def test_window_index_tells_grids_of_one_shape_apart():
+    wm._index_cache.clear()
+    windows = ((1.0, 2.0), (4.0, 4.5))
+    grid = np.linspace(0, 10, 101)
+    shifted = grid + 0.55
+    for bins in (grid, shifted, grid):
+        assert wm.window_index(bins, windows) == wm.window_slices(bins, windows)
+    assert wm.window_index(grid, windows) != wm.window_index(shifted, windows)
+
+
+def test_window_index_keys_hold_the_grid():
+    wm._index_cache.clear()
+    windows = ((1.0, 2.0),)
+    grid = np.linspace(0, 10, 101)
+    wm.window_index(grid, windows)
+    key, = wm._index_cache
+    assert grid.tobytes() in key
+
+    # an entry colliding in hash with the shifted grid's key is not served for it
+    shifted = grid + 0.55
+    wm._index_cache.clear()
+    wm._index_cache[Colliding(key[:2] + (shifted.tobytes(), windows))] = wm.window_slices(grid, windows)
+    assert wm.window_index(shifted, windows) == wm.window_slices(shifted, windows)
+    assert len(wm._index_cache) == 2